@@ -1,9 +1,15 @@
 from django.contrib import admin
-from .models import Activity
+from .models import Activity, TimelineEntry
 
 @admin.register(Activity)
 class ActivityAdmin(admin.ModelAdmin):
-    list_display = ['user', 'group', 'activity_type', 'timestamp']
+    list_display = ['user', 'group', 'activity_type', 'count', 'timestamp']
     list_filter = ['activity_type', 'timestamp', 'group']
     search_fields = ['user__name', 'group__name', 'description']
     readonly_fields = ['timestamp']
+
+@admin.register(TimelineEntry)
+class TimelineEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'activity']
+    search_fields = ['user__name']
+    raw_id_fields = ['activity']
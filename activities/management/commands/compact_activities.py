@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from activities.services import compact_activities
+
+
+class Command(BaseCommand):
+    help = 'Merge old activities into one row per group, user, type and day'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Compact activities older than this many days (default: 90)'
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        removed = compact_activities(cutoff)
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Compacted activities older than {options["days"]} days, removed {removed} rows')
+        )
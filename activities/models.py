@@ -6,6 +6,7 @@ from groups.models import Group
 class Activity(models.Model):
     ACTIVITY_TYPES = [
         ('expense_added', 'Expense Added'),
+        ('expense_updated', 'Expense Updated'),
         ('expense_deleted', 'Expense Deleted'),
         ('settlement_created', 'Settlement Created'),
         ('settlement_completed', 'Settlement Completed'),
@@ -19,11 +20,35 @@ class Activity(models.Model):
     description = models.TextField()
     timestamp = models.DateTimeField(default=timezone.now)
     related_expense_id = models.IntegerField(null=True, blank=True)
+    # Number of actions this row stands for once a burst has been coalesced
+    count = models.PositiveIntegerField(default=1)
+    # Typed fields (amount_cents, user and expense ids) the feed is rendered from
+    payload = models.JSONField(default=dict, blank=True)
     
     class Meta:
         db_table = 'activities'
         ordering = ['-timestamp']
         verbose_name_plural = 'Activities'
+        indexes = [
+            models.Index(fields=['group', 'activity_type', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"{self.user.name} - {self.get_activity_type_display()}"
+
+
+class TimelineEntry(models.Model):
+    """Per-user copy of an activity, fanned out to every group member on write"""
+    entry_id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='timeline_entries')
+
+    class Meta:
+        db_table = 'activity_timeline'
+        ordering = ['-entry_id']
+        indexes = [
+            models.Index(fields=['user', '-entry_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.name} - {self.activity}"
@@ -0,0 +1,102 @@
+"""
+Structured activity payloads.
+
+Each activity stores a small JSON payload of typed fields (amounts in
+integer cents of the group's currency, user and expense ids) next to its
+description. Feeds are
+rendered from the payload so text can change without rewriting rows, and
+amounts can be aggregated in the database instead of parsed from strings.
+"""
+from users.models import User
+from expenses.money import to_cents, format_cents
+
+# Payload keys that are summed when activities are coalesced or compacted
+SUMMED_KEYS = ('amount_cents', 'replaced')
+
+# Keys naming users, resolved to names when a feed is rendered
+USER_KEYS = ('payer_id', 'payee_id', 'member_id')
+
+
+def expense_payload(expense):
+    return {
+        'expense_id': expense.expense_id,
+        # Converted, so feeds render and coalesced totals sum in one currency
+        'amount_cents': to_cents(expense.group_amount),
+        'title': expense.description,
+    }
+
+
+def settlement_payload(settlement):
+    return {
+        'settlement_id': settlement.settlement_id,
+        'amount_cents': to_cents(settlement.amount),
+        'payer_id': settlement.payer_id,
+        'payee_id': settlement.payee_id,
+    }
+
+
+def member_payload(user):
+    return {'member_id': user.user_id}
+
+
+def merge_payloads(old, new):
+    """Combine the payloads of two coalesced activities, keeping only totals"""
+    merged = {}
+    for key in SUMMED_KEYS:
+        if key in old or key in new:
+            merged[key] = old.get(key, 0) + new.get(key, 0)
+    return merged
+
+
+def _single_description(activity, amount, names):
+    payload = activity.payload
+    if activity.activity_type in ('expense_added', 'expense_updated', 'expense_deleted'):
+        verb = {
+            'expense_added': 'Added',
+            'expense_updated': 'Updated',
+            'expense_deleted': 'Deleted',
+        }[activity.activity_type]
+        return f"{verb} expense: {payload.get('title', '')} ({amount})"
+    if activity.activity_type == 'settlement_created':
+        return f"Created {activity.count} optimized settlements (replaced {payload.get('replaced', 0)} previous)"
+    if activity.activity_type == 'settlement_completed':
+        return f"{names.get(payload.get('payer_id'))} paid {amount} to {names.get(payload.get('payee_id'))}"
+    if activity.activity_type == 'member_joined':
+        return f"Added {names.get(payload.get('member_id'))} to the group"
+    if activity.activity_type == 'member_left':
+        return f"Removed {names.get(payload.get('member_id'))} from the group"
+    return activity.description
+
+
+def render_activities(activities):
+    """
+    Set `display` on each activity from its payload, resolving every
+    referenced user with a single query. Activities without a payload
+    fall back to their stored description.
+    """
+    from .services import aggregate_description
+
+    activities = list(activities)
+    user_ids = {
+        activity.payload[key]
+        for activity in activities
+        for key in USER_KEYS
+        if activity.payload and key in activity.payload
+    }
+    names = dict(User.objects.filter(user_id__in=user_ids).values_list('user_id', 'name')) if user_ids else {}
+
+    for activity in activities:
+        payload = activity.payload
+        if not payload:
+            activity.display = activity.description
+            continue
+        amount = None
+        if 'amount_cents' in payload:
+            amount = f"{format_cents(payload['amount_cents'])} {activity.group.currency}"
+        if activity.count > 1 and activity.activity_type != 'settlement_created':
+            activity.display = aggregate_description(activity.activity_type, activity.count)
+            if amount:
+                activity.display += f' totalling {amount}'
+        else:
+            activity.display = _single_description(activity, amount, names)
+    return activities
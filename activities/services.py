@@ -0,0 +1,200 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Count, Max, Sum, IntegerField
+from django.db.models.fields.json import KT
+from django.db.models.functions import TruncDate, Cast
+from django.utils import timezone
+from groups.models import GroupMember
+from .models import Activity, TimelineEntry
+from .payloads import SUMMED_KEYS, merge_payloads
+
+# Oldest entries beyond this are trimmed from each user's timeline
+TIMELINE_MAX_ENTRIES = 500
+TIMELINE_PAGE_SIZE = 30
+
+# Same-type activities by the same user in a group within this window are merged
+COALESCE_WINDOW = timedelta(minutes=10)
+
+AGGREGATE_DESCRIPTIONS = {
+    'expense_added': 'Added {count} expenses',
+    'expense_updated': 'Updated expenses {count} times',
+    'expense_deleted': 'Deleted {count} expenses',
+    'settlement_created': 'Created {count} optimized settlements',
+    'settlement_completed': 'Completed {count} settlements',
+    'member_joined': 'Added {count} members to the group',
+    'member_left': 'Removed {count} members from the group',
+}
+
+
+def aggregate_description(activity_type, count):
+    """Summary text for a row standing in for `count` actions"""
+    return AGGREGATE_DESCRIPTIONS[activity_type].format(count=count)
+
+
+def log_activity(user, group, activity_type, description, related_expense_id=None, count=1, payload=None):
+    """
+    Record an activity for a group and fan it out to the timeline of every
+    current member, so the cross-group feed is a single range scan per user.
+
+    If the user's latest activity in the group is of the same type and
+    recent enough, it is folded into that row instead of adding a new one,
+    and its timeline entries are re-inserted so it moves back to the top.
+    `payload` holds the typed fields the feed is rendered from.
+    """
+    payload = payload or {}
+    with transaction.atomic():
+        now = timezone.now()
+        latest = Activity.objects.select_for_update().filter(
+            group=group,
+            user=user,
+            timestamp__gte=now - COALESCE_WINDOW
+        ).order_by('-timestamp').first()
+
+        if latest and latest.activity_type == activity_type:
+            latest.count += count
+            latest.description = aggregate_description(activity_type, latest.count)
+            latest.payload = merge_payloads(latest.payload, payload)
+            latest.related_expense_id = None
+            latest.timestamp = now
+            latest.save(update_fields=['count', 'description', 'payload', 'related_expense_id', 'timestamp'])
+            # Timelines are ordered by entry_id, so the old entries would stay buried
+            latest.timeline_entries.all().delete()
+            _fan_out(latest)
+            return latest
+
+        activity = Activity.objects.create(
+            user=user,
+            group=group,
+            activity_type=activity_type,
+            description=description,
+            related_expense_id=related_expense_id,
+            count=count,
+            payload=payload,
+            timestamp=now
+        )
+        _fan_out(activity)
+    return activity
+
+
+def _fan_out(activity):
+    """Add a timeline entry for the activity to every current member of its group"""
+    fan_out_activities([activity])
+
+
+def fan_out_activities(activities):
+    """
+    Add timeline entries for many activities (e.g. a restored group's) to
+    every current member of their groups, oldest first, with one member
+    query and one insert.
+    """
+    activities = sorted(activities, key=lambda activity: (activity.timestamp, activity.pk))
+    members = {}
+    for group_id, user_id in GroupMember.objects.filter(
+        group_id__in={activity.group_id for activity in activities}
+    ).values_list('group_id', 'user_id'):
+        members.setdefault(group_id, []).append(user_id)
+    TimelineEntry.objects.bulk_create([
+        TimelineEntry(user_id=member_id, activity=activity)
+        for activity in activities
+        for member_id in members.get(activity.group_id, [])
+    ], batch_size=1000)
+    trim_timelines({member_id for member_ids in members.values() for member_id in member_ids})
+
+
+def trim_timelines(user_ids, max_entries=TIMELINE_MAX_ENTRIES):
+    """Delete timeline entries older than the newest `max_entries` per user"""
+    cutoff = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-entry_id').values('entry_id')[max_entries - 1:max_entries]
+    return TimelineEntry.objects.filter(
+        user_id__in=user_ids,
+        entry_id__lt=Subquery(cutoff)
+    ).delete()[0]
+
+
+def get_user_timeline(user, before=None, limit=TIMELINE_PAGE_SIZE):
+    """
+    Return up to `limit` timeline entries for a user, newest first.
+    `before` is the entry_id cursor returned with the previous page.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    if before:
+        entries = entries.filter(entry_id__lt=before)
+    entries = list(
+        entries.select_related('activity__user', 'activity__group')
+        .order_by('-entry_id')[:limit + 1]
+    )
+    next_cursor = entries[limit - 1].entry_id if len(entries) > limit else None
+    return entries[:limit], next_cursor
+
+
+def compact_activities(older_than, batch_size=500):
+    """
+    Merge activities older than `older_than` into one row per
+    (group, user, activity_type, day), summing their counts and every
+    payload key in SUMMED_KEYS. Returns the number of rows removed.
+    """
+    buckets = Activity.objects.filter(timestamp__lt=older_than).annotate(
+        day=TruncDate('timestamp')
+    ).values('group_id', 'user_id', 'activity_type', 'day').annotate(
+        rows=Count('id'),
+        total=Sum('count'),
+        keep_id=Max('id'),
+        **{f'sum_{key}': Sum(Cast(KT(f'payload__{key}'), IntegerField())) for key in SUMMED_KEYS}
+    ).filter(rows__gt=1)
+
+    removed = 0
+    keepers = []
+    for bucket in buckets.iterator():
+        keepers.append(bucket)
+        if len(keepers) >= batch_size:
+            removed += _merge_buckets(keepers, older_than)
+            keepers = []
+    if keepers:
+        removed += _merge_buckets(keepers, older_than)
+    return removed
+
+
+def _merge_buckets(buckets, older_than):
+    with transaction.atomic():
+        kept = Activity.objects.in_bulk([b['keep_id'] for b in buckets])
+        for bucket in buckets:
+            activity = kept[bucket['keep_id']]
+            activity.count = bucket['total']
+            activity.description = aggregate_description(activity.activity_type, bucket['total'])
+            activity.related_expense_id = None
+            activity.payload = {
+                key: bucket[f'sum_{key}'] for key in SUMMED_KEYS if bucket[f'sum_{key}'] is not None
+            }
+        Activity.objects.bulk_update(kept.values(), ['count', 'description', 'payload', 'related_expense_id'])
+
+        removed = 0
+        for bucket in buckets:
+            _, deleted = Activity.objects.filter(
+                group_id=bucket['group_id'],
+                user_id=bucket['user_id'],
+                activity_type=bucket['activity_type'],
+                timestamp__date=bucket['day'],
+                timestamp__lt=older_than,
+                id__lt=bucket['keep_id']
+            ).delete()
+            removed += deleted.get(Activity._meta.label, 0)
+    return removed
+
+
+def activity_totals(group, activity_type, since=None):
+    """
+    Count and summed amount (in cents) of one activity type in a group,
+    computed from payloads by the (group, activity_type, timestamp) index.
+    """
+    activities = Activity.objects.filter(group=group, activity_type=activity_type)
+    if since:
+        activities = activities.filter(timestamp__gte=since)
+    totals = activities.aggregate(
+        count=Sum('count'),
+        amount_cents=Sum(Cast(KT('payload__amount_cents'), IntegerField()))
+    )
+    return {
+        'count': totals['count'] or 0,
+        'amount_cents': totals['amount_cents'] or 0,
+    }
@@ -4,5 +4,6 @@ from . import views
 app_name = 'activities'
 
 urlpatterns = [
+    path('', views.timeline_view, name='timeline'),
     path('feed/<int:group_id>/', views.activity_feed_view, name='feed'),
 ]
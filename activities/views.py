@@ -1,17 +1,36 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from .models import Activity
-from groups.models import Group, GroupMember
+from .services import get_user_timeline
+from .payloads import render_activities
+from groups.models import Group
+from groups.membership import group_member_required
 
 @login_required
+@group_member_required(message=None, redirect_to='groups:detail')
 def activity_feed_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        return redirect('groups:detail', group_id=group_id)
-    activities = Activity.objects.filter(group=group).select_related('user').order_by('-timestamp')[:30]
+    activities = render_activities(
+        Activity.objects.filter(group=group).select_related('user', 'group').order_by('-timestamp')[:30]
+    )
     context = {
         'group': group,
         'activities': activities,
     }
     return render(request, 'activities/activity_feed.html', context)
+
+
+@login_required
+def timeline_view(request):
+    """Activity across all of the user's groups, paged by entry cursor"""
+    before = request.GET.get('before')
+    entries, next_cursor = get_user_timeline(
+        request.user,
+        before=int(before) if before and before.isdigit() else None
+    )
+    render_activities(entry.activity for entry in entries)
+    context = {
+        'entries': entries,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'activities/timeline.html', context)
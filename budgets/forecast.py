@@ -0,0 +1,183 @@
+"""
+Period-end spend forecasts for budget items.
+
+All items of all active budgets are forecast together. Their daily spend
+series are laid out as one (items x days) NumPy matrix and projected two
+ways:
+
+* linear   - the average daily spend so far, over the remaining days;
+* seasonal - a per-weekday average (shrunk towards the linear rate while
+             a weekday has few observations), over the remaining weekdays.
+
+The forecast is spend to date plus the mean of the two projections.
+Results are cached per group, ledger version, latest budget edit and day.
+"""
+from datetime import timedelta
+from decimal import Decimal
+import numpy as np
+from django.core.cache import cache
+from django.db.models import Max, Sum
+from django.utils import timezone
+from expenses.models import Expense
+from expenses.money import Money, to_cents
+from .models import BudgetPlan, BudgetItem, BudgetAlert
+
+FORECAST_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Pseudo-observations pulling a weekday's rate towards the overall rate
+WEEKDAY_SHRINKAGE = 2.0
+
+
+def _cache_key(group_id, ledger_version, budgets_edited, today):
+    edited = budgets_edited.isoformat() if budgets_edited else 'none'
+    return f'budget_forecast:{group_id}:{ledger_version}:{edited}:{today.isoformat()}'
+
+
+def budgets_edited(group_ids):
+    """{group_id: latest updated_at of its budgets and their items}; budget edits don't bump the ledger version"""
+    rows = BudgetPlan.objects.filter(group_id__in=group_ids).values('group_id').annotate(
+        plans=Max('updated_at'), items=Max('items__updated_at')
+    ).order_by()
+    return {
+        row['group_id']: max(stamp for stamp in (row['plans'], row['items']) if stamp)
+        for row in rows
+    }
+
+
+def active_items(today, group_ids=None):
+    items = BudgetItem.objects.filter(
+        budget__start_date__lte=today,
+        budget__end_date__gte=today
+    ).select_related('budget__group', 'category')
+    if group_ids is not None:
+        items = items.filter(budget__group_id__in=group_ids)
+    return list(items)
+
+
+def daily_spend_matrix(items, today):
+    """
+    (len(items), longest period) matrix of daily spend in cents, with day
+    0 being each item's budget start date, filled from one grouped query.
+    """
+    starts = [item.budget.start_date for item in items]
+    lengths = [(item.budget.end_date - item.budget.start_date).days + 1 for item in items]
+    matrix = np.zeros((len(items), max(lengths)), dtype=np.float64)
+
+    rows_by_key = {}
+    for row, item in enumerate(items):
+        rows_by_key.setdefault((item.budget.group_id, item.category_id), []).append(row)
+
+    spend = Expense.objects.filter(
+        group_id__in={item.budget.group_id for item in items},
+        category_id__in={item.category_id for item in items},
+        date__gte=min(starts),
+        date__lte=today
+    ).values('group_id', 'category_id', 'date').annotate(total=Sum('group_amount')).order_by()
+
+    for entry in spend:
+        for row in rows_by_key.get((entry['group_id'], entry['category_id']), ()):
+            offset = (entry['date'] - starts[row]).days
+            if 0 <= offset < lengths[row]:
+                matrix[row, offset] += to_cents(entry['total'])
+    return matrix
+
+
+def project(matrix, elapsed, lengths, start_weekdays):
+    """
+    Vectorized period-end projection in cents.
+
+    `elapsed` and `lengths` are per-row day counts (observed so far and
+    whole period); `start_weekdays` is each period's first weekday.
+    Returns (spent, linear, seasonal) arrays.
+    """
+    days = np.arange(matrix.shape[1])
+    observed = days[None, :] < elapsed[:, None]
+    remaining = (days[None, :] >= elapsed[:, None]) & (days[None, :] < lengths[:, None])
+    weekdays = (start_weekdays[:, None] + days[None, :]) % 7
+
+    spent = np.where(observed, matrix, 0.0).sum(axis=1)
+    daily_rate = spent / np.maximum(elapsed, 1)
+    linear = spent + daily_rate * remaining.sum(axis=1)
+
+    seasonal_rest = np.zeros(len(matrix))
+    for weekday in range(7):
+        on_weekday = weekdays == weekday
+        seen = (observed & on_weekday).sum(axis=1)
+        weekday_spend = np.where(observed & on_weekday, matrix, 0.0).sum(axis=1)
+        weekday_rate = (weekday_spend + WEEKDAY_SHRINKAGE * daily_rate) / (seen + WEEKDAY_SHRINKAGE)
+        seasonal_rest += weekday_rate * (remaining & on_weekday).sum(axis=1)
+    seasonal = spent + seasonal_rest
+    return spent, linear, seasonal
+
+
+def forecast_items(items, today):
+    """Map item_id -> forecast period-end spend (Money) for active items"""
+    if not items:
+        return {}
+    elapsed = np.array([(today - item.budget.start_date).days + 1 for item in items])
+    lengths = np.array([(item.budget.end_date - item.budget.start_date).days + 1 for item in items])
+    start_weekdays = np.array([item.budget.start_date.weekday() for item in items])
+
+    spent, linear, seasonal = project(daily_spend_matrix(items, today), elapsed, lengths, start_weekdays)
+    forecast = np.rint((linear + seasonal) / 2).astype(np.int64)
+    return {item.item_id: Money(cents) for item, cents in zip(items, forecast.tolist())}
+
+
+def predictive_alerts(items, forecasts):
+    """Alerts for items projected to exceed their budget that have not crossed it yet"""
+    already_alerted = set(BudgetAlert.objects.filter(
+        budget_item__in=items,
+        alert_type='forecast'
+    ).values_list('budget_item_id', flat=True))
+
+    alerts = []
+    for item in items:
+        projected = forecasts.get(item.item_id)
+        if projected is None or item.item_id in already_alerted:
+            continue
+        if item.spent_amount < item.budget_amount <= projected:
+            alerts.append(BudgetAlert(
+                budget_item=item,
+                alert_type='forecast',
+                message=(
+                    f'Budget for {item.category.name} is projected to reach '
+                    f'{projected} of {item.budget_amount} by {item.budget.end_date:%b %d}'
+                )
+            ))
+    return BudgetAlert.objects.bulk_create(alerts)
+
+
+def run_forecasts(today=None, group_ids=None):
+    """
+    Forecast every active budget item in one batch, cache the results per
+    group ledger version and budget edit, and raise predictive alerts. Returns
+    (items forecast, alerts created).
+    """
+    today = today or timezone.now().date()
+    items = active_items(today, group_ids)
+    forecasts = forecast_items(items, today)
+
+    by_group = {}
+    for item in items:
+        group = item.budget.group
+        by_group.setdefault((group.group_id, group.ledger_version), {})[item.item_id] = forecasts[item.item_id]
+    edited = budgets_edited([group_id for group_id, version in by_group])
+    cache.set_many(
+        {
+            _cache_key(group_id, version, edited.get(group_id), today): values
+            for (group_id, version), values in by_group.items()
+        },
+        FORECAST_CACHE_TIMEOUT
+    )
+    return len(items), len(predictive_alerts(items, forecasts))
+
+
+def group_forecasts(group, today=None):
+    """Cached item_id -> forecast map for a group's active budgets"""
+    today = today or timezone.now().date()
+    key = _cache_key(group.group_id, group.ledger_version, budgets_edited([group.group_id]).get(group.group_id), today)
+    forecasts = cache.get(key)
+    if forecasts is None:
+        forecasts = forecast_items(active_items(today, [group.group_id]), today)
+        cache.set(key, forecasts, FORECAST_CACHE_TIMEOUT)
+    return forecasts
@@ -0,0 +1,68 @@
+"""
+Per-group interval index of budget periods.
+
+A group's budget periods are split at every start and end boundary into
+elementary segments, each holding the budgets active throughout it.
+Finding the budgets covering a date is then a binary search over the
+segment starts, O(log n) however many periods the group has accumulated.
+The index is cached per group and dropped whenever a BudgetPlan changes,
+including by the rollover_budgets command (see spliteaseproject.caching).
+"""
+from bisect import bisect_right
+from datetime import timedelta
+from django.core.cache import cache
+from spliteaseproject.caching import cache_timeout
+from .models import BudgetPlan
+
+INTERVAL_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class BudgetIntervalIndex:
+    def __init__(self, periods):
+        """`periods` is an iterable of (budget_id, start_date, end_date)"""
+        events = {}
+        for budget_id, start, end in periods:
+            events.setdefault(start, []).append((budget_id, True))
+            events.setdefault(end + timedelta(days=1), []).append((budget_id, False))
+
+        self.starts = []
+        self.segments = []
+        active = set()
+        for boundary in sorted(events):
+            for budget_id, opening in events[boundary]:
+                if opening:
+                    active.add(budget_id)
+                else:
+                    active.discard(budget_id)
+            self.starts.append(boundary)
+            self.segments.append(tuple(sorted(active)))
+
+    def covering(self, day):
+        """Budget ids whose period includes `day`"""
+        position = bisect_right(self.starts, day) - 1
+        if position < 0:
+            return ()
+        return self.segments[position]
+
+
+def _cache_key(group_id):
+    return f'budget_intervals:{group_id}'
+
+
+def get_interval_index(group_id):
+    index = cache.get(_cache_key(group_id))
+    if index is None:
+        index = BudgetIntervalIndex(
+            BudgetPlan.objects.filter(group_id=group_id)
+            .values_list('budget_id', 'start_date', 'end_date')
+        )
+        cache.set(_cache_key(group_id), index, cache_timeout(INTERVAL_CACHE_TIMEOUT))
+    return index
+
+
+def active_budget_ids(group_id, day):
+    return get_interval_index(group_id).covering(day)
+
+
+def invalidate_interval_index(group_id):
+    cache.delete(_cache_key(group_id))
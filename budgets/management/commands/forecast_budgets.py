@@ -0,0 +1,20 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from budgets.forecast import run_forecasts
+
+
+class Command(BaseCommand):
+    help = 'Forecast period-end spending for all active budgets and raise predictive alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Forecast as of this date (default: today)'
+        )
+
+    def handle(self, *args, **options):
+        items, alerts = run_forecasts(options['date'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Forecast {items} budget items, created {alerts} predictive alerts')
+        )
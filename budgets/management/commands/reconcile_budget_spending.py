@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from budgets.spending import reconcile_budget_spending
+
+
+class Command(BaseCommand):
+    help = 'Recompute budget item spending from expenses and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group',
+            type=int,
+            action='append',
+            dest='group_ids',
+            help='Only reconcile budgets of this group (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_budget_spending(options['group_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Reconciled budget spending, {fixed} items corrected')
+        )
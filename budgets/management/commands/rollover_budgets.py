@@ -0,0 +1,37 @@
+from datetime import date
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from budgets.rollover import roll_over_budgets
+
+
+class Command(BaseCommand):
+    help = 'Create the next budget period for every group whose current period has ended'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=date.fromisoformat,
+            help='Roll over periods that ended before this date (default: today)'
+        )
+        parser.add_argument(
+            '--carry-over',
+            action='store_true',
+            help="Add each category's unspent amount to the next period's budget"
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of plans to roll over per batch (default: 500)'
+        )
+
+    def handle(self, *args, **options):
+        as_of = options['date'] or timezone.now().date()
+        created = roll_over_budgets(
+            as_of,
+            carry_over=options['carry_over'],
+            batch_size=options['batch_size']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Created {created} budget plans for periods starting by {as_of}')
+        )
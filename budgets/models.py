@@ -3,6 +3,7 @@ from django.utils import timezone
 from django.core.validators import MinValueValidator
 from groups.models import Group
 from expenses.models import Category
+from expenses.money import Money, MoneyField
 from decimal import Decimal
 
 
@@ -24,6 +25,9 @@ class BudgetPlan(models.Model):
     
     class Meta:
         db_table = 'budget_plans'
+        indexes = [
+            models.Index(fields=['group', 'start_date', 'end_date']),
+        ]
     
     def __str__(self):
         return f"{self.group.name} - {self.name}"
@@ -33,18 +37,10 @@ class BudgetItem(models.Model):
     item_id = models.AutoField(primary_key=True)
     budget = models.ForeignKey(BudgetPlan, on_delete=models.CASCADE, related_name='items')
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
-    budget_amount = models.DecimalField(
-        max_digits=10, 
-        decimal_places=2,
-        validators=[MinValueValidator(Decimal('0.01'))]
-    )
-    spent_amount = models.DecimalField(
-        max_digits=10,
-        decimal_places=2,
-        default=0,
-        validators=[MinValueValidator(Decimal('0'))]
-    )
+    budget_amount = MoneyField(validators=[MinValueValidator(Decimal('0.01'))])
+    spent_amount = MoneyField(default=0, validators=[MinValueValidator(Decimal('0'))])
     alert_percentage = models.IntegerField(default=80)  # Alert at 80% spent
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         db_table = 'budget_items'
@@ -61,7 +57,7 @@ class BudgetItem(models.Model):
         return self.get_percentage_spent() >= self.alert_percentage
     
     def remaining_budget(self):
-        return max(self.budget_amount - self.spent_amount, Decimal('0'))
+        return max(self.budget_amount - self.spent_amount, Money(0))
     
     def __str__(self):
         return f"{self.category.name} - {self.budget_amount}"
@@ -71,6 +67,7 @@ class BudgetAlert(models.Model):
     ALERT_TYPES = [
         ('threshold', 'Threshold Reached'),
         ('over', 'Over Budget'),
+        ('forecast', 'Projected Over Budget'),
     ]
     
     alert_id = models.AutoField(primary_key=True)
@@ -0,0 +1,144 @@
+"""
+Budget period rollover.
+
+For every (group, period) the most recent BudgetPlan acts as the template
+for the next one. Plans whose period has ended are rolled forward in
+batches: the new plans are bulk-created, then all of their items, with
+optional carry-over of each category's unspent amount. The new items start
+from the spending already dated in their period, read in one query per
+batch. Templates several periods behind are rolled until they catch up.
+"""
+from calendar import monthrange
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, F, Sum
+from expenses.models import Expense
+from expenses.money import Money, sum_money
+from .models import BudgetPlan, BudgetItem, BudgetAlert
+from .intervals import invalidate_interval_index
+from .spending import threshold_alerts
+
+PERIOD_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12,
+}
+
+
+def add_months(day, months):
+    month_index = day.month - 1 + months
+    year, month = day.year + month_index // 12, month_index % 12 + 1
+    return day.replace(year=year, month=month, day=min(day.day, monthrange(year, month)[1]))
+
+
+def next_period(plan):
+    """(start_date, end_date) of the period following `plan`"""
+    start = plan.end_date + timedelta(days=1)
+    return start, add_months(start, PERIOD_MONTHS[plan.period]) - timedelta(days=1)
+
+
+def due_templates(as_of):
+    """Latest plan of each (group, period) whose period ended before `as_of`"""
+    latest = BudgetPlan.objects.filter(
+        group=OuterRef('group'),
+        period=OuterRef('period')
+    ).order_by('-end_date', '-budget_id').values('budget_id')[:1]
+    return BudgetPlan.objects.annotate(
+        latest_id=Subquery(latest)
+    ).filter(budget_id=F('latest_id'), end_date__lt=as_of).order_by('budget_id')
+
+
+def roll_over_budgets(as_of, carry_over=False, batch_size=500):
+    """
+    Create the next periods for every due template plan, repeating until
+    each group and period has a plan covering `as_of`, so missed runs are
+    caught up in one go. Returns the number of plans created.
+    """
+    created = 0
+    while True:
+        rolled = 0
+        batch = []
+        for template in due_templates(as_of).iterator(chunk_size=batch_size):
+            batch.append(template)
+            if len(batch) >= batch_size:
+                rolled += _roll_over_batch(batch, carry_over)
+                batch = []
+        if batch:
+            rolled += _roll_over_batch(batch, carry_over)
+        if not rolled:
+            return created
+        created += rolled
+
+
+def _roll_over_batch(templates, carry_over):
+    items_by_budget = {}
+    for item in BudgetItem.objects.filter(budget_id__in=[t.budget_id for t in templates]):
+        items_by_budget.setdefault(item.budget_id, []).append(item)
+
+    with transaction.atomic():
+        new_plans = []
+        for template in templates:
+            start_date, end_date = next_period(template)
+            new_plans.append(BudgetPlan(
+                group_id=template.group_id,
+                name=template.name,
+                period=template.period,
+                start_date=start_date,
+                end_date=end_date
+            ))
+        new_plans = BudgetPlan.objects.bulk_create(new_plans)
+
+        new_items = []
+        for template, plan in zip(templates, new_plans):
+            for item in items_by_budget.get(template.budget_id, []):
+                amount = item.budget_amount
+                if carry_over:
+                    amount += item.remaining_budget()
+                new_items.append(BudgetItem(
+                    budget_id=plan.budget_id,
+                    category_id=item.category_id,
+                    budget_amount=amount,
+                    alert_percentage=item.alert_percentage
+                ))
+        new_items = BudgetItem.objects.bulk_create(new_items, batch_size=1000)
+        _seed_spending(new_plans, new_items)
+
+    # bulk_create skips the signals that normally drop the interval index
+    for group_id in {template.group_id for template in templates}:
+        invalidate_interval_index(group_id)
+    return len(new_plans)
+
+
+def _seed_spending(plans, items):
+    """Set spent_amount on new items from expenses already dated in their periods, in one read"""
+    if not items:
+        return
+    plans_by_id = {plan.budget_id: plan for plan in plans}
+    daily = defaultdict(list)
+    for row in Expense.objects.filter(
+        group_id__in={plan.group_id for plan in plans},
+        category_id__in={item.category_id for item in items},
+        date__gte=min(plan.start_date for plan in plans),
+        date__lte=max(plan.end_date for plan in plans)
+    ).values('group_id', 'category_id', 'date').annotate(total=Sum('group_amount')).order_by():
+        daily[(row['group_id'], row['category_id'])].append((row['date'], row['total']))
+
+    seeded = {}
+    for item in items:
+        plan = plans_by_id[item.budget_id]
+        spent = sum_money(
+            total for day, total in daily[(plan.group_id, item.category_id)]
+            if plan.start_date <= day <= plan.end_date
+        )
+        if spent:
+            seeded[item.item_id] = spent
+    if not seeded:
+        return
+    seeded_items = list(BudgetItem.objects.filter(item_id__in=seeded).select_related('category'))
+    for item in seeded_items:
+        item.spent_amount = seeded[item.item_id]
+    BudgetItem.objects.bulk_update(seeded_items, ['spent_amount'])
+    BudgetAlert.objects.bulk_create([
+        alert for item in seeded_items for alert in threshold_alerts(item, Money(0))
+    ])
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import BudgetPlan
+from .spending import apply_expense_delta
+from .intervals import invalidate_interval_index
+
+
+def _budget_key(expense):
+    return (expense.group_id, expense.category_id, expense.date)
+
+
+@receiver(post_save, sender='expenses.Expense')
+def track_budget_on_save(sender, instance, **kwargs):
+    # The stored version is captured by the expenses app's pre_save handler
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and _budget_key(previous) == _budget_key(instance):
+        apply_expense_delta(*_budget_key(instance), instance.group_amount - previous.group_amount)
+        return
+    if previous is not None:
+        apply_expense_delta(*_budget_key(previous), -previous.group_amount)
+    apply_expense_delta(*_budget_key(instance), instance.group_amount)
+
+
+@receiver(post_delete, sender='expenses.Expense')
+def track_budget_on_delete(sender, instance, **kwargs):
+    apply_expense_delta(*_budget_key(instance), -instance.group_amount)
+
+
+@receiver(post_save, sender=BudgetPlan)
+@receiver(post_delete, sender=BudgetPlan)
+def drop_interval_index(sender, instance, **kwargs):
+    invalidate_interval_index(instance.group_id)
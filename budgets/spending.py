@@ -0,0 +1,108 @@
+"""
+Budget spending computed per budget rather than per item.
+
+Spend for every category of a budget comes from one category-grouped
+read (see expenses.rollups.spending_by_category); items are then matched
+to it in memory. Only items whose spent_amount actually changed are
+written back, with a single bulk_update.
+
+Expense writes also adjust the matching items incrementally through
+apply_expense_delta, so budgets and alerts stay current without rescans.
+reconcile_budget_spending (and its management command) repairs any drift.
+"""
+from django.db import transaction
+from django.db.models import F
+from expenses.rollups import spending_by_category
+from expenses.money import Money, to_cents
+from .models import BudgetPlan, BudgetItem, BudgetAlert
+from .intervals import active_budget_ids
+
+
+def attach_spending(budget, items):
+    """Set spent_amount on `items` from current expenses without saving them"""
+    spent_by_category = spending_by_category(budget.group, budget.start_date, budget.end_date)
+    for item in items:
+        item.spent_amount = Money(spent_by_category.get(item.category_id, 0))
+    return items
+
+
+def threshold_alerts(item, old_spent):
+    """Alerts for an item whose spent_amount just moved from `old_spent` across a limit"""
+    alerts = []
+    if item.budget_amount <= 0 or item.spent_amount <= old_spent:
+        return alerts
+    old_percentage = (old_spent / item.budget_amount) * 100
+    # Create alert if threshold reached
+    if old_percentage < item.alert_percentage <= item.get_percentage_spent():
+        alerts.append(BudgetAlert(
+            budget_item=item,
+            alert_type='threshold',
+            message=f'Budget for {item.category.name} is {item.get_percentage_spent():.1f}% spent'
+        ))
+    # Create alert if over budget
+    if item.is_over_budget() and old_spent <= item.budget_amount:
+        alerts.append(BudgetAlert(
+            budget_item=item,
+            alert_type='over',
+            message=f'Budget for {item.category.name} exceeded!'
+        ))
+    return alerts
+
+
+def refresh_budget_spending(budget):
+    """
+    Recompute and persist spent_amount for every item of a budget, raising
+    alerts for items that went up. Returns the items that changed.
+    """
+    items = list(budget.items.select_related('category'))
+    old_spent = {item.item_id: item.spent_amount for item in items}
+    attach_spending(budget, items)
+
+    changed = [item for item in items if item.spent_amount != old_spent[item.item_id]]
+    if changed:
+        BudgetItem.objects.bulk_update(changed, ['spent_amount'])
+        alerts = []
+        for item in changed:
+            alerts.extend(threshold_alerts(item, old_spent[item.item_id]))
+        BudgetAlert.objects.bulk_create(alerts)
+    return changed
+
+
+def reconcile_budget_spending(group_ids=None):
+    """
+    Full recompute for every budget (or those of `group_ids`); returns the
+    number of items corrected. Archived groups' expenses are out of the hot
+    tables, so their budgets are skipped and recomputed on restore.
+    """
+    budgets = BudgetPlan.objects.filter(group__is_archived=False).select_related('group')
+    if group_ids:
+        budgets = budgets.filter(group_id__in=group_ids)
+    return sum(len(refresh_budget_spending(budget)) for budget in budgets.iterator())
+
+
+def apply_expense_delta(group_id, category_id, day, delta):
+    """
+    Add `delta` to spent_amount of every budget item in the group for
+    `category_id` whose budget period covers `day`, and raise alerts for
+    any item this pushes across its threshold or limit.
+    """
+    if not category_id or not delta:
+        return []
+    budget_ids = active_budget_ids(group_id, day)
+    if not budget_ids:
+        return []
+    item_ids = list(BudgetItem.objects.filter(
+        budget_id__in=budget_ids,
+        category_id=category_id
+    ).values_list('item_id', flat=True))
+    if not item_ids:
+        return []
+
+    with transaction.atomic():
+        BudgetItem.objects.filter(item_id__in=item_ids).update(spent_amount=F('spent_amount') + to_cents(delta))
+        items = list(BudgetItem.objects.filter(item_id__in=item_ids).select_related('category'))
+        alerts = []
+        for item in items:
+            alerts.extend(threshold_alerts(item, item.spent_amount - delta))
+        BudgetAlert.objects.bulk_create(alerts)
+    return items
@@ -1,23 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum
-from groups.models import Group, GroupMember
+from groups.models import Group
+from groups.membership import group_member_required, is_group_member
 from .models import BudgetPlan, BudgetItem, BudgetAlert
 from expenses.models import Expense, Category
+from .spending import attach_spending, refresh_budget_spending
+from .forecast import group_forecasts
 from decimal import Decimal
 from datetime import datetime
 
 
 @login_required
+@group_member_required
 def budget_list_view(request, group_id):
     """List all budgets for a group"""
     group = get_object_or_404(Group, group_id=group_id)
     
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     budgets = BudgetPlan.objects.filter(group=group)
     
     context = {
@@ -33,20 +32,15 @@ def budget_detail_view(request, budget_id):
     budget = get_object_or_404(BudgetPlan, budget_id=budget_id)
     group = budget.group
     
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
+    if not is_group_member(request, group.group_id):
         messages.error(request, 'You are not a member of this group.')
         return redirect('groups:list')
     
-    # Calculate spent amounts
-    for item in budget.items.all():
-        expenses = Expense.objects.filter(
-            group=group,
-            category=item.category,
-            date__range=[budget.start_date, budget.end_date]
-        )
-        spent = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-        item.spent_amount = spent
-        item.save()
+    # Calculate spent amounts for display only; this view does not write
+    items = attach_spending(budget, list(budget.items.select_related('category')))
+    forecasts = group_forecasts(group)
+    for item in items:
+        item.forecast_amount = forecasts.get(item.item_id)
     
     # Get alerts
     alerts = BudgetAlert.objects.filter(budget_item__budget=budget)
@@ -54,13 +48,14 @@ def budget_detail_view(request, budget_id):
     context = {
         'budget': budget,
         'group': group,
-        'items': budget.items.all(),
+        'items': items,
         'alerts': alerts,
     }
     return render(request, 'budgets/budget_detail.html', context)
 
 
 @login_required
+@group_member_required
 def create_budget_view(request, group_id):
     """Create new budget"""
     group = get_object_or_404(Group, group_id=group_id)
@@ -89,6 +84,10 @@ def create_budget_view(request, group_id):
                     category=category,
                     budget_amount=Decimal(amount)
                 )
+        # Expenses already dated in the period count from the start; reload
+        # so the period dates are dates rather than the posted strings
+        budget.refresh_from_db(fields=['start_date', 'end_date'])
+        refresh_budget_spending(budget)
         
         messages.success(request, 'Budget created successfully!')
         return redirect('budgets:detail', budget_id=budget.budget_id)
@@ -100,38 +99,3 @@ def create_budget_view(request, group_id):
     }
     return render(request, 'budgets/create_budget.html', context)
 
-
-def update_budget_spending(group_id):
-    """Background task to update budget spending"""
-    from expenses.models import Expense
-    
-    budgets = BudgetPlan.objects.filter(group_id=group_id)
-    
-    for budget in budgets:
-        for item in budget.items.all():
-            expenses = Expense.objects.filter(
-                group_id=group_id,
-                category=item.category,
-                date__range=[budget.start_date, budget.end_date]
-            )
-            spent = expenses.aggregate(Sum('amount'))['amount__sum'] or Decimal('0')
-            
-            old_spent = item.spent_amount
-            item.spent_amount = spent
-            item.save()
-            
-            # Create alert if threshold reached
-            if item.get_percentage_spent() >= item.alert_percentage and old_spent < spent:
-                BudgetAlert.objects.create(
-                    budget_item=item,
-                    alert_type='threshold',
-                    message=f'Budget for {item.category.name} is {item.get_percentage_spent():.1f}% spent'
-                )
-            
-            # Create alert if over budget
-            if item.is_over_budget() and old_spent <= item.budget_amount:
-                BudgetAlert.objects.create(
-                    budget_item=item,
-                    alert_type='over',
-                    message=f'Budget for {item.category.name} exceeded!'
-                )
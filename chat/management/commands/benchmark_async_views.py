@@ -0,0 +1,172 @@
+import argparse
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPConnection
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test import Client
+from users.models import User
+from groups.models import Group, GroupMember
+from chat.models import Message, UserActivity
+
+# (label, path template); the sync group balance page is the control
+ENDPOINTS = [
+    ('messages (async)', '/chat/messages/{group_id}/'),
+    ('online members (async)', '/chat/online/{group_id}/'),
+    ('balance history (async)', '/settlements/balance/{group_id}/history/'),
+    ('group balance (sync)', '/settlements/balance/{group_id}/'),
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_port(port, process, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError('Daphne exited during startup.')
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise CommandError(f'Daphne did not start listening on port {port}.')
+
+
+class Command(BaseCommand):
+    help = 'Load-test the async JSON endpoints under Daphne against a sync page'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Requests per endpoint and concurrency level (default: 200)'
+        )
+        parser.add_argument(
+            '--concurrency',
+            default='1,10,50',
+            help='Comma-separated numbers of concurrent clients (default: 1,10,50)'
+        )
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=50,
+            help='Chat messages in the throwaway benchmark group (default: 50)'
+        )
+        parser.add_argument(
+            '--query-latency',
+            type=float,
+            default=0.0,
+            help='Milliseconds added to every server-side query, to mimic a database over the network (default: 0)'
+        )
+        parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['serve']:
+            return self._serve(options['serve'], options['query_latency'])
+
+        try:
+            levels = sorted({int(level) for level in options['concurrency'].split(',')})
+        except ValueError:
+            raise CommandError('--concurrency takes comma-separated integers.')
+        if not levels or min(levels) < 1 or options['requests'] < 1:
+            raise CommandError('Concurrency and request counts must be positive.')
+
+        user, group = self._fixtures(options['messages'])
+        port = _free_port()
+        server = subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_async_views', '--serve', str(port),
+             '--query-latency', str(options['query_latency'])],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        try:
+            _wait_for_port(port, server)
+            client = Client()
+            client.force_login(user)
+            cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+            self.stdout.write(f'{"endpoint":<26}{"clients":>8}{"req/s":>10}{"p50 ms":>9}{"p95 ms":>9}{"scaling":>9}')
+            for label, template in ENDPOINTS:
+                path = template.format(group_id=group.group_id)
+                baseline = None
+                for level in levels:
+                    rate, p50, p95 = self._load(port, path, cookie, level, options['requests'])
+                    baseline = baseline or rate
+                    self.stdout.write(
+                        f'{label:<26}{level:>8}{rate:>10.1f}{p50:>9.1f}{p95:>9.1f}{rate / baseline:>8.2f}x'
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+            group.delete()
+            user.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            '✓ Benchmark finished; scaling is throughput relative to the lowest concurrency'
+        ))
+
+    def _serve(self, port, latency_ms):
+        """Run Daphne in this process, with every query delayed by `latency_ms`"""
+        from daphne.cli import CommandLineInterface
+
+        def delay(execute, sql, params, many, context):
+            time.sleep(latency_ms / 1000)
+            return execute(sql, params, many, context)
+
+        def add_delay(sender, connection, **kwargs):
+            connection.execute_wrappers.append(delay)
+
+        if latency_ms > 0:
+            connection_created.connect(add_delay, weak=False)
+        CommandLineInterface().run(['-b', '127.0.0.1', '-p', str(port), 'spliteaseproject.asgi:application'])
+
+    def _fixtures(self, message_count):
+        """A throwaway member, group and chat history, deleted afterwards"""
+        tag = uuid.uuid4().hex[:8]
+        user = User.objects.create_user(email=f'bench-{tag}@example.com', password=uuid.uuid4().hex, name=f'Bench {tag}')
+        group = Group.objects.create(name=f'Benchmark {tag}', owner=user)
+        GroupMember.objects.create(group=group, user=user, is_admin=True)
+        UserActivity.objects.create(user=user, group=group, is_online=True)
+        Message.objects.bulk_create([
+            Message(group=group, sender=user, message_type='text', content=f'Message {number}')
+            for number in range(message_count)
+        ])
+        return user, group
+
+    def _load(self, port, path, cookie, concurrency, total):
+        """(requests per second, p50 ms, p95 ms) for `total` GETs from `concurrency` keep-alive clients"""
+        def worker(count):
+            connection = HTTPConnection('127.0.0.1', port, timeout=30)
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                connection.request('GET', path, headers={'Cookie': cookie})
+                response = connection.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise CommandError(f'{path} returned {response.status}.')
+                timings.append(time.perf_counter() - started)
+            connection.close()
+            return timings
+
+        shares = [total // concurrency + (index < total % concurrency) for index in range(concurrency)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            timings = sorted(t for batch in pool.map(worker, [share for share in shares if share]) for t in batch)
+        elapsed = time.perf_counter() - started
+        return (
+            len(timings) / elapsed,
+            timings[len(timings) // 2] * 1000,
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))] * 1000,
+        )
@@ -1,24 +1,22 @@
-from django.shortcuts import render, get_object_or_404, redirect
+from django.shortcuts import render, get_object_or_404, aget_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.contrib import messages
+from django.db import IntegrityError
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from datetime import timedelta
-from groups.models import Group, GroupMember
+from groups.models import Group
+from groups.membership import group_member_required
 from .models import Message, UserActivity
 
 
 @login_required
+@group_member_required
 def group_chat_view(request, group_id):
     """Display group chat"""
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     # Update user activity - Mark as online
     UserActivity.objects.update_or_create(
         user=request.user,
@@ -47,15 +45,44 @@ def group_chat_view(request, group_id):
     return render(request, 'chat/group_chat.html', context)
 
 
+async def _mark_online(user, group_id):
+    """
+    Record that `user` is active in the group now. Every poll does this, so
+    it is a single UPDATE; update_or_create's read-then-write transaction
+    fails with "database is locked" on SQLite when polls overlap.
+    """
+    updated = await UserActivity.objects.filter(user=user, group_id=group_id).aupdate(
+        is_online=True,
+        last_seen=timezone.now()
+    )
+    if not updated:
+        try:
+            await UserActivity.objects.acreate(user=user, group_id=group_id, is_online=True)
+        except IntegrityError:
+            pass  # A concurrent poll created it
+
+
+def _message_json(message):
+    return {
+        'id': message.message_id,
+        'sender': message.sender.name,
+        'sender_id': message.sender.user_id,
+        'content': message.content,
+        'timestamp': message.created_at.isoformat(),
+        'type': message.message_type,
+    }
+
+
+# The polling endpoints below are async: under Daphne they wait on the
+# database without tying up the worker thread that sync views share.
+
 @login_required
 @require_http_methods(["POST"])
-def send_message_view(request, group_id):
+@group_member_required(json=True, writable=True)
+async def send_message_view(request, group_id):
     """Send a message"""
-    group = get_object_or_404(Group, group_id=group_id)
-    
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        return JsonResponse({'error': 'Not authorized'}, status=403)
+    group = await aget_object_or_404(Group, group_id=group_id)
+    user = await request.auser()
     
     content = request.POST.get('message', '').strip()
     
@@ -65,102 +92,54 @@ def send_message_view(request, group_id):
     if len(content) > 1000:
         return JsonResponse({'error': 'Message too long'}, status=400)
     
-    # Update user activity
-    UserActivity.objects.update_or_create(
-        user=request.user,
-        group=group,
-        defaults={
-            'is_online': True,
-            'last_seen': timezone.now()
-        }
-    )
+    await _mark_online(user, group.group_id)
     
     # Create message
-    message = Message.objects.create(
+    message = await Message.objects.acreate(
         group=group,
-        sender=request.user,
+        sender=user,
         message_type='text',
         content=content
     )
     
-    return JsonResponse({
-        'success': True,
-        'message': {
-            'id': message.message_id,
-            'sender': message.sender.name,
-            'sender_id': message.sender.user_id,
-            'content': message.content,
-            'timestamp': message.created_at.isoformat(),
-        }
-    })
+    return JsonResponse({'success': True, 'message': _message_json(message)})
 
 
 @login_required
-def get_messages_view(request, group_id):
+@group_member_required(json=True)
+async def get_messages_view(request, group_id):
     """Get messages as JSON"""
-    group = get_object_or_404(Group, group_id=group_id)
-    
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        return JsonResponse({'error': 'Not authorized'}, status=403)
-    
-    # Update user activity
-    UserActivity.objects.update_or_create(
-        user=request.user,
-        group=group,
-        defaults={
-            'is_online': True,
-            'last_seen': timezone.now()
-        }
-    )
+    # Membership was checked, so the group exists; polls skip fetching it
+    await _mark_online(await request.auser(), group_id)
     
     # Get messages since last_id
     last_id = request.GET.get('last_id', 0)
     messages_list = Message.objects.filter(
-        group=group,
+        group_id=group_id,
         message_id__gt=last_id
-    ).order_by('created_at')[:50]
+    ).select_related('sender').order_by('created_at')[:50]
     
-    data = {
-        'messages': [
-            {
-                'id': msg.message_id,
-                'sender': msg.sender.name,
-                'sender_id': msg.sender.user_id,
-                'content': msg.content,
-                'timestamp': msg.created_at.isoformat(),
-                'type': msg.message_type,
-            }
-            for msg in messages_list
-        ]
-    }
-    
-    return JsonResponse(data)
+    return JsonResponse({'messages': [_message_json(msg) async for msg in messages_list]})
 
 
 @login_required
-def get_online_members_view(request, group_id):
+@group_member_required(json=True)
+async def get_online_members_view(request, group_id):
     """Get online members - last active in 2 minutes AND is_online=True"""
-    group = get_object_or_404(Group, group_id=group_id)
-    
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        return JsonResponse({'error': 'Not authorized'}, status=403)
-    
     # Get online members (last seen in 2 minutes AND is_online=True)
     two_min_ago = timezone.now() - timedelta(minutes=2)
     online_activities = UserActivity.objects.filter(
-        group=group,
+        group_id=group_id,
         last_seen__gte=two_min_ago,
-        is_online=True  # ADD THIS LINE
-    ).select_related('user')
+        is_online=True
+    ).values_list('user__user_id', 'user__name')
     
     return JsonResponse({
         'members': [
             {
-                'user__user_id': activity.user.user_id,
-                'user__name': activity.user.name,
+                'user__user_id': user_id,
+                'user__name': name,
             }
-            for activity in online_activities
+            async for user_id, name in online_activities
         ]
     })
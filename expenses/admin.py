@@ -1,5 +1,17 @@
 from django.contrib import admin
-from .models import Category, Expense, ExpenseParticipant
+from django.db import transaction
+from jobs.queue import HIGH, enqueue
+from settlements.ledger import repost_expense, reverse_source
+from .models import Category, Expense, ExpenseParticipant, FxRate, RecurringExpense, RecurringParticipant
+
+# Fields the ledger records; they change only through the expense views, which repost the journal
+MONEY_FIELDS = ['group', 'payer', 'amount', 'currency', 'date', 'split_type']
+
+
+def _queue_balance_rebuilds(groups):
+    """Rebuild balances in the job worker once the admin's change commits, as the expense views do"""
+    for group in {group.group_id: group for group in groups}.values():
+        transaction.on_commit(lambda group=group: enqueue('recalculate_balances', group, priority=HIGH))
 
 
 @admin.register(Category)
@@ -9,21 +21,80 @@ class CategoryAdmin(admin.ModelAdmin):
 
 class ExpenseParticipantInline(admin.TabularInline):
     model = ExpenseParticipant
-    extra = 1
+    extra = 0
+    readonly_fields = ['user', 'amount', 'share_percentage']
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
-    list_display = ['description', 'amount', 'payer', 'group', 'date', 'category']
-    list_filter = ['split_type', 'category', 'date']
+    list_display = ['description', 'amount', 'currency', 'payer', 'group', 'date', 'category']
+    list_filter = ['split_type', 'currency', 'category', 'date']
     search_fields = ['description', 'payer__name']
     inlines = [ExpenseParticipantInline]
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = MONEY_FIELDS + ['created_at', 'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Expense.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        """Reverse each expense's journal with the delete, as the delete view does"""
+        with transaction.atomic():
+            groups = {}
+            for expense in queryset.select_related('group'):
+                reverse_source(expense.group_id, 'expense', expense.expense_id)
+                groups[expense.group_id] = expense.group
+            queryset.delete()
+            _queue_balance_rebuilds(groups.values())
 
 
 @admin.register(ExpenseParticipant)
 class ExpenseParticipantAdmin(admin.ModelAdmin):
     list_display = ['expense', 'user', 'amount', 'is_settled']
     list_filter = ['is_settled']
+    readonly_fields = ['expense', 'user', 'amount', 'share_percentage']
+
+    def has_add_permission(self, request):
+        return False
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, ExpenseParticipant.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        """Repost each affected expense's journal without the deleted shares"""
+        with transaction.atomic():
+            expenses = list(Expense.objects.filter(
+                expense_id__in=queryset.values('expense_id')
+            ).select_related('group'))
+            queryset.delete()
+            for expense in expenses:
+                repost_expense(expense)
+            _queue_balance_rebuilds(expense.group for expense in expenses)
+
+
+class RecurringParticipantInline(admin.TabularInline):
+    model = RecurringParticipant
+    extra = 1
+
+
+@admin.register(RecurringExpense)
+class RecurringExpenseAdmin(admin.ModelAdmin):
+    list_display = ['description', 'amount', 'payer', 'group', 'frequency', 'next_date', 'is_active']
+    list_filter = ['frequency', 'is_active']
+    search_fields = ['description', 'payer__name', 'group__name']
+    inlines = [RecurringParticipantInline]
 
 
+@admin.register(FxRate)
+class FxRateAdmin(admin.ModelAdmin):
+    list_display = ['currency', 'date', 'rate', 'imported_at']
+    list_filter = ['currency']
+    date_hierarchy = 'date'
@@ -24,7 +24,7 @@ def send_expense_notification(expense):
     <p><strong>{expense.payer.name}</strong> added a new expense to <strong>{expense.group.name}</strong></p>
     <p>
         <strong>Description:</strong> {expense.description}<br>
-        <strong>Amount:</strong> {expense.amount} {expense.group.currency}<br>
+        <strong>Amount:</strong> {expense.amount} {expense.currency}<br>
         <strong>Date:</strong> {expense.date}<br>
         <strong>Category:</strong> {expense.category.name if expense.category else 'Uncategorized'}
     </p>
@@ -1,4 +1,6 @@
 from django import forms
+from .fx import FxError, check_convertible
+from .splits import SplitError, split_expense
 from .models import Expense, Category
 from groups.models import GroupMember
 from users.models import User
@@ -14,7 +16,7 @@ class ExpenseForm(forms.ModelForm):
     
     class Meta:
         model = Expense
-        fields = ['amount', 'description', 'date', 'category', 'split_type']
+        fields = ['amount', 'currency', 'description', 'date', 'category', 'split_type']
         widgets = {
             'amount': forms.NumberInput(attrs={
                 'class': 'form-control', 
@@ -22,6 +24,11 @@ class ExpenseForm(forms.ModelForm):
                 'placeholder': 'Enter amount',
                 'min': '0.01'
             }),
+            'currency': forms.TextInput(attrs={
+                'class': 'form-control',
+                'maxlength': '3',
+                'placeholder': 'e.g., EUR'
+            }),
             'description': forms.TextInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'e.g., Dinner at restaurant'
@@ -41,6 +48,7 @@ class ExpenseForm(forms.ModelForm):
     def __init__(self, *args, **kwargs):
         group = kwargs.pop('group', None)
         super().__init__(*args, **kwargs)
+        self.group = group
         
         # Set category queryset to show all available categories
         self.fields['category'].queryset = Category.objects.all().order_by('name')
@@ -57,3 +65,81 @@ class ExpenseForm(forms.ModelForm):
             # Pre-select all members for new expense
             if not self.instance.pk:
                 self.fields['participants'].initial = members
+                self.fields['currency'].initial = group.currency
+            
+            # One share input per member: the amount for exact splits, the percentage for percentage splits
+            saved = {}
+            if self.instance.pk and self.instance.split_type != 'equal':
+                saved = {
+                    participant.user_id: (
+                        participant.share_percentage if self.instance.split_type == 'percentage' else participant.amount
+                    )
+                    for participant in self.instance.participants.all()
+                }
+            for member in members:
+                self.fields[self.share_field(member)] = forms.DecimalField(
+                    required=False,
+                    min_value=0,
+                    max_digits=12,
+                    decimal_places=2,
+                    initial=saved.get(member.user_id),
+                    label=member.user.name,
+                    widget=forms.NumberInput(attrs={
+                        'class': 'form-control form-control-sm',
+                        'step': '0.01',
+                        'placeholder': 'Amount or %'
+                    })
+                )
+
+    @staticmethod
+    def share_field(member):
+        return f'share_{member.member_id}'
+
+    def participant_rows(self):
+        """(checkbox, share input) pairs for the template"""
+        shares = {
+            str(member.member_id): self[self.share_field(member)]
+            for member in self.fields['participants'].queryset
+        }
+        return [
+            (checkbox, shares.get(str(checkbox.data['value'])))
+            for checkbox in self['participants']
+        ]
+
+    def clean(self):
+        cleaned_data = super().clean()
+        currency = (cleaned_data.get('currency') or '').upper()
+        if self.group and currency and cleaned_data.get('date'):
+            # The ledger needs a rate to convert this expense into the group's currency
+            try:
+                check_convertible(currency, self.group.currency, cleaned_data['date'])
+            except FxError as error:
+                self.add_error('currency', str(error))
+        cleaned_data['currency'] = currency
+        self._clean_shares(cleaned_data)
+        return cleaned_data
+
+    def _clean_shares(self, cleaned_data):
+        """Check the split adds up and keep [(user_id, value), ...] as cleaned_data['shares']"""
+        participants = cleaned_data.get('participants')
+        amount = cleaned_data.get('amount')
+        split_type = cleaned_data.get('split_type') or 'equal'
+        if not participants or amount is None:
+            return
+        shares = [
+            (member.user_id, None if split_type == 'equal' else cleaned_data.get(self.share_field(member)))
+            for member in participants
+        ]
+        if split_type != 'equal' and any(value is None for _, value in shares):
+            self.add_error('participants', f'Enter a share for every participant of a {split_type} split.')
+            return
+        try:
+            split_expense(amount, shares, split_type)
+        except SplitError:
+            if split_type == 'percentage':
+                message = 'Percentages must add up to 100.'
+            else:
+                message = f'Exact shares must add up to {amount}.'
+            self.add_error('participants', message)
+            return
+        cleaned_data['shares'] = shares
@@ -0,0 +1,223 @@
+"""
+Foreign exchange for multi-currency groups.
+
+An expense can be paid in any currency that has rates in FxRate; the
+ledger, and so every balance and settlement suggestion, is kept in the
+group's currency. Rates are quoted against settings.FX_BASE_CURRENCY and
+come from CSV files loaded by import_fx_rates, never from the network. An
+amount converts at the latest rate on or before the expense's date.
+
+Resolved (currency, date) rates are cached under a version that every
+import bumps, so balance runs and batch posting don't query the rates
+table again for dates they have already seen (see spliteaseproject.caching
+for how long they are kept). Conversion is exact: each rate pair becomes
+an integer ratio and rows are scaled by it in NumPy object arrays of
+Python ints, since cents times a ratio's numerator can exceed int64.
+Floats never touch cents.
+
+Expense.group_amount holds every expense converted once, on save, into its
+group's currency; rollups, budgets, group counters and forecasts all
+total that column.
+"""
+import csv
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from spliteaseproject.caching import cache_timeout
+from .models import Expense, FxRate
+from .money import Money, to_cents
+
+VERSION_KEY = 'fx_rates_version'
+RATE_TIMEOUT = 60 * 60 * 24
+
+
+class FxError(ValueError):
+    pass
+
+
+def base_currency():
+    return getattr(settings, 'FX_BASE_CURRENCY', 'USD')
+
+
+def _version():
+    return cache.get_or_set(VERSION_KEY, 0, None)
+
+
+def invalidate_rates():
+    """Make every cached rate stale; call after changing FxRate rows"""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def _lookup(pairs):
+    """Latest rate on or before each day, one query per currency"""
+    days_by_currency = defaultdict(list)
+    for currency, day in pairs:
+        days_by_currency[currency].append(day)
+
+    rates = {}
+    for currency, days in days_by_currency.items():
+        if currency == base_currency():
+            rates.update({(currency, day): Decimal(1) for day in days})
+            continue
+        history = list(
+            FxRate.objects.filter(currency=currency, date__lte=max(days))
+            .order_by('date').values_list('date', 'rate')
+        )
+        dates = [row[0] for row in history]
+        for day in days:
+            index = bisect_right(dates, day) - 1
+            if index < 0:
+                raise FxError(f'No {currency} exchange rate on or before {day}.')
+            rates[(currency, day)] = history[index][1]
+    return rates
+
+
+def base_rates(pairs):
+    """{(currency, day): value of one unit in the base currency} for the given pairs"""
+    version = _version()
+    keys = {pair: f'fx_rate:{version}:{pair[0]}:{pair[1].isoformat()}' for pair in set(pairs)}
+    cached = cache.get_many(keys.values())
+    rates = {pair: cached[key] for pair, key in keys.items() if key in cached}
+    missing = [pair for pair in keys if pair not in rates]
+    if missing:
+        loaded = _lookup(missing)
+        cache.set_many({keys[pair]: rate for pair, rate in loaded.items()}, cache_timeout(RATE_TIMEOUT))
+        rates.update(loaded)
+    return rates
+
+
+def convert_cents(cents, currencies, days, targets):
+    """
+    Convert integer cents. `currencies`, `days` and `targets` are parallel
+    to `cents`; rows already in their target currency (or with a blank
+    currency) pass through untouched. Rounds half away from zero and
+    returns an int64 array.
+    """
+    cents = np.asarray(cents, dtype=np.int64)
+    keys = {}
+    index = np.full(len(cents), -1, dtype=np.int64)
+    for row, (currency, day, target) in enumerate(zip(currencies, days, targets)):
+        if currency and currency != target:
+            index[row] = keys.setdefault((currency, day, target), len(keys))
+    if not keys:
+        return cents
+
+    rates = base_rates(
+        [(currency, day) for currency, day, target in keys]
+        + [(target, day) for currency, day, target in keys]
+    )
+    numerators = np.empty(len(keys), dtype=object)
+    denominators = np.empty(len(keys), dtype=object)
+    for position, (currency, day, target) in enumerate(keys):
+        source_numerator, source_denominator = rates[(currency, day)].as_integer_ratio()
+        target_numerator, target_denominator = rates[(target, day)].as_integer_ratio()
+        numerators[position] = source_numerator * target_denominator
+        denominators[position] = source_denominator * target_numerator
+
+    rows = np.flatnonzero(index >= 0)
+    values = cents[rows].astype(object)
+    denominator = denominators[index[rows]]
+    scaled = np.abs(values) * numerators[index[rows]]
+    quotient = scaled // denominator
+    quotient += 2 * (scaled - quotient * denominator) >= denominator
+    converted = cents.copy()
+    converted[rows] = np.where(values >= 0, quotient, -quotient).astype(np.int64)
+    return converted
+
+
+def convert_splits(expenses, splits):
+    """
+    `splits` ({user_id: cents} per expense, in the expense's currency)
+    restated in each expense's group currency, all expenses in one pass
+    """
+    rows = [
+        (position, expense, user_id, cents)
+        for position, (expense, split) in enumerate(zip(expenses, splits))
+        for user_id, cents in split.items()
+    ]
+    converted = convert_cents(
+        [row[3] for row in rows],
+        [row[1].currency for row in rows],
+        [row[1].date for row in rows],
+        [row[1].group.currency for row in rows]
+    )
+    result = [{} for _ in expenses]
+    for (position, expense, user_id, cents), value in zip(rows, converted.tolist()):
+        result[position][user_id] = value
+    return result
+
+
+def set_group_amounts(expenses):
+    """Set group_amount on (unsaved or edited) expenses, converting all of them in one pass"""
+    converted = convert_cents(
+        [to_cents(expense.amount) for expense in expenses],
+        [expense.currency for expense in expenses],
+        [expense.date for expense in expenses],
+        [expense.group.currency for expense in expenses]
+    )
+    for expense, cents in zip(expenses, converted.tolist()):
+        expense.group_amount = Money(cents)
+    return expenses
+
+
+def refresh_group_amounts(group_ids=None, batch_size=1000):
+    """Reconvert stored expenses (e.g. after a group changed currency); returns rows fixed"""
+    expenses = Expense.objects.select_related('group').only(
+        'expense_id', 'amount', 'currency', 'date', 'group_amount', 'group__currency'
+    ).order_by('expense_id')
+    if group_ids is not None:
+        expenses = expenses.filter(group_id__in=group_ids)
+    fixed = 0
+    last_id = 0
+    while True:
+        batch = list(expenses.filter(expense_id__gt=last_id)[:batch_size])
+        if not batch:
+            return fixed
+        last_id = batch[-1].expense_id
+        stored = [expense.group_amount for expense in batch]
+        changed = [
+            expense for expense, old in zip(set_group_amounts(batch), stored) if expense.group_amount != old
+        ]
+        Expense.objects.bulk_update(changed, ['group_amount'])
+        fixed += len(changed)
+
+
+def check_convertible(currency, target, day):
+    """Raise FxError unless `currency` can be converted to `target` on `day`"""
+    convert_cents([1], [currency], [day], [target])
+
+
+def import_rates(path):
+    """
+    Load a CSV with date (YYYY-MM-DD), currency and rate columns, where
+    rate is the value of one unit of the currency in the base currency.
+    Existing (currency, date) rows are overwritten. Returns rows loaded.
+    """
+    rates = {}
+    with open(path, newline='') as handle:
+        for line, row in enumerate(csv.DictReader(handle), start=2):
+            try:
+                day = datetime.strptime(row['date'].strip(), '%Y-%m-%d').date()
+                currency = row['currency'].strip().upper()
+                rate = Decimal(row['rate'].strip())
+            except (KeyError, AttributeError, ValueError, InvalidOperation):
+                raise FxError(f'{path}, line {line}: expected date, currency and rate columns.')
+            if len(currency) != 3 or rate <= 0:
+                raise FxError(f'{path}, line {line}: bad currency code or non-positive rate.')
+            rates[(currency, day)] = rate
+
+    FxRate.objects.bulk_create(
+        [FxRate(currency=currency, date=day, rate=rate) for (currency, day), rate in rates.items()],
+        batch_size=1000,
+        update_conflicts=True,
+        unique_fields=['currency', 'date'],
+        update_fields=['rate', 'imported_at']
+    )
+    invalidate_rates()
+    return len(rates)
+
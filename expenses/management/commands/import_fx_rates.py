@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.fx import FxError, base_currency, import_rates
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates from CSV files with date, currency and rate columns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='+',
+            help='CSV files; rate is the value of one unit of the currency in FX_BASE_CURRENCY'
+        )
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            try:
+                loaded = import_rates(path)
+            except (OSError, FxError) as error:
+                raise CommandError(str(error))
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Loaded {loaded} rates against {base_currency()} from {path}')
+            )
@@ -0,0 +1,36 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from expenses.recurring import materialize_due
+
+
+class Command(BaseCommand):
+    help = 'Create expenses for every recurring template occurrence that has come due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Materialise occurrences up to this date, YYYY-MM-DD (default: today)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Templates per transaction (default: 200)'
+        )
+
+    def handle(self, *args, **options):
+        as_of = None
+        if options['date']:
+            try:
+                as_of = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Date must be in YYYY-MM-DD format')
+
+        created, invalid = materialize_due(as_of, options['batch_size'])
+        for template_id in invalid:
+            self.stdout.write(
+                self.style.WARNING(f'Skipped recurring expense {template_id}: its shares do not add up or its currency has no exchange rate')
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Created {created} recurring expenses')
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from expenses.fx import refresh_group_amounts
+from expenses.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Backfill monthly spending rollups from existing expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group',
+            type=int,
+            action='append',
+            dest='group_ids',
+            help='Only rebuild this group (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        converted = refresh_group_amounts(options['group_ids'])
+        created = rebuild_rollups(options['group_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Reconverted {converted} expenses and rebuilt {created} spending rollups')
+        )
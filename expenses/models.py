@@ -1,9 +1,9 @@
 from django.db import models
 from django.utils import timezone
-from decimal import Decimal
 from users.models import User
 from groups.models import Group
 from django.core.exceptions import ValidationError
+from .money import Money, MoneyField
 
 class Category(models.Model):
     category_id = models.AutoField(primary_key=True)
@@ -27,17 +27,30 @@ class Expense(models.Model):
     expense_id = models.AutoField(primary_key=True)
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='expenses')
     payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='paid_expenses')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
+    # ISO code the amount was paid in; the ledger converts it to the group's currency
+    currency = models.CharField(max_length=3, blank=True)
+    # The amount in the group's currency, converted on save; derived totals add this
+    group_amount = MoneyField(default=0, editable=False)
     description = models.CharField(max_length=255)
     date = models.DateField(default=timezone.now)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     split_type = models.CharField(max_length=10, choices=SPLIT_TYPES, default='equal')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set on occurrences generated from a recurring template
+    recurring = models.ForeignKey(
+        'RecurringExpense', on_delete=models.SET_NULL, null=True, blank=True, related_name='occurrences'
+    )
+    occurrence_date = models.DateField(null=True, blank=True)
 
     class Meta:
         db_table = 'expenses'
         ordering = ['-date']
+        constraints = [
+            # Materialising a template twice for the same date is a no-op
+            models.UniqueConstraint(fields=['recurring', 'occurrence_date'], name='unique_recurring_occurrence'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.amount}"
@@ -51,20 +64,24 @@ class Expense(models.Model):
 
     def save(self, *args, **kwargs):
         """Override save to call clean"""
+        if not self.currency:
+            self.currency = self.group.currency
+        self.currency = self.currency.upper()
         self.full_clean()
         super().save(*args, **kwargs)
     
     def calculate_equal_split(self, num_participants):
+        # Per-head figure only; expenses.splits.equal_shares hands out the remainder cents
         if num_participants == 0:
-            return Decimal('0.00')
-        return (self.amount / num_participants).quantize(Decimal('0.01'))
+            return Money(0)
+        return self.amount / num_participants
 
 
 class ExpenseParticipant(models.Model):
     participant_id = models.AutoField(primary_key=True)
     expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name='participants')
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_participations')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     share_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     is_settled = models.BooleanField(default=False)
 
@@ -74,3 +91,96 @@ class ExpenseParticipant(models.Model):
 
     def __str__(self):
         return f"{self.user.name} - {self.amount}"
+
+
+class SpendingRollup(models.Model):
+    """Monthly spending totals per group, category and payer, kept in step with expense writes"""
+    rollup_id = models.BigAutoField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='spending_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='spending_rollups')
+    month = models.DateField()  # First day of the month
+    total_cents = models.BigIntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'spending_rollups'
+        unique_together = ['group', 'category', 'payer', 'month']
+        indexes = [
+            models.Index(fields=['group', 'month']),
+        ]
+
+    def __str__(self):
+        return f"{self.group.name} - {self.month:%b %Y}: {self.total_cents}"
+
+
+class RecurringExpense(models.Model):
+    """Template for an expense that repeats, e.g. rent or a subscription"""
+    FREQUENCIES = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+        ('yearly', 'Yearly'),
+    ]
+
+    template_id = models.AutoField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='recurring_expenses')
+    payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_expenses')
+    amount = MoneyField()
+    currency = models.CharField(max_length=3, blank=True)  # Blank means the group's currency
+    description = models.CharField(max_length=255)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
+    split_type = models.CharField(max_length=10, choices=Expense.SPLIT_TYPES, default='equal')
+    frequency = models.CharField(max_length=10, choices=FREQUENCIES, default='monthly')
+    interval = models.PositiveSmallIntegerField(default=1)
+    start_date = models.DateField()
+    end_date = models.DateField(null=True, blank=True)
+    # Earliest occurrence not yet materialised
+    next_date = models.DateField()
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'recurring_expenses'
+        indexes = [
+            models.Index(fields=['is_active', 'next_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.description} ({self.get_frequency_display()})"
+
+    def save(self, *args, **kwargs):
+        if not self.next_date:
+            self.next_date = self.start_date
+        super().save(*args, **kwargs)
+
+
+class RecurringParticipant(models.Model):
+    """Who shares a recurring expense; value is the exact amount or percentage for those split types"""
+    participant_id = models.AutoField(primary_key=True)
+    template = models.ForeignKey(RecurringExpense, on_delete=models.CASCADE, related_name='participants')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recurring_participations')
+    value = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        db_table = 'recurring_participants'
+        unique_together = ['template', 'user']
+
+    def __str__(self):
+        return f"{self.user.name} - {self.template.description}"
+
+
+class FxRate(models.Model):
+    """Value of one unit of `currency` in settings.FX_BASE_CURRENCY on a date"""
+    rate_id = models.AutoField(primary_key=True)
+    currency = models.CharField(max_length=3)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    imported_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'fx_rates'
+        unique_together = ['currency', 'date']
+        ordering = ['currency', 'date']
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
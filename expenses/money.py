@@ -0,0 +1,180 @@
+"""
+Money as integer minor units.
+
+Amounts are stored in BIGINT columns of cents by MoneyField and come back
+as Money values, so aggregation and balance loops add plain ints instead
+of Decimals. Money renders, compares and parses like the two-place Decimal
+it replaces: str() gives '12.50', plain numbers on the other side of an
+operator are major units, and multiplying or dividing by a number rounds
+half up to the cent.
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import total_ordering
+from numbers import Number
+from django import forms
+from django.core.exceptions import ValidationError
+from django.db import models
+
+
+def to_cents(amount):
+    """Convert a decimal money amount to integer cents"""
+    if isinstance(amount, Money):
+        return amount.cents
+    return int((Decimal(str(amount)) * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    """Convert integer cents back to a two-place Decimal"""
+    return (Decimal(cents) / 100).quantize(Decimal('0.01'))
+
+
+def format_cents(cents):
+    return f'{from_cents(cents):.2f}'
+
+
+def _round_cents(value):
+    return int(Decimal(value).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+@total_ordering
+class Money:
+    """An immutable amount of integer cents"""
+    __slots__ = ('cents',)
+
+    def __init__(self, cents=0):
+        object.__setattr__(self, 'cents', int(cents))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Money is immutable')
+
+    @classmethod
+    def of(cls, amount):
+        """Money from a major-unit amount (Decimal, str, int or float) or Money"""
+        if isinstance(amount, Money):
+            return amount
+        return cls(to_cents(amount))
+
+    @staticmethod
+    def _cents_of(other):
+        if isinstance(other, Money):
+            return other.cents
+        if isinstance(other, Number) and not isinstance(other, bool):
+            return to_cents(other)
+        return None
+
+    def to_decimal(self):
+        return from_cents(self.cents)
+
+    def __add__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else Money(self.cents + cents)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else Money(self.cents - cents)
+
+    def __rsub__(self, other):
+        cents = self._cents_of(other)
+        return NotImplemented if cents is None else Money(cents - self.cents)
+
+    def __mul__(self, factor):
+        if isinstance(factor, Money) or not isinstance(factor, Number):
+            return NotImplemented
+        return Money(_round_cents(self.cents * Decimal(str(factor))))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        """Money / Money is a Decimal ratio; Money / number is Money"""
+        if isinstance(other, Money):
+            return Decimal(self.cents) / Decimal(other.cents)
+        if not isinstance(other, Number):
+            return NotImplemented
+        return Money(_round_cents(Decimal(self.cents) / Decimal(str(other))))
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __pos__(self):
+        return self
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __float__(self):
+        return self.cents / 100
+
+    def __eq__(self, other):
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        if isinstance(other, Number) and not isinstance(other, bool):
+            return self.to_decimal() == other
+        return NotImplemented
+
+    def __lt__(self, other):
+        if isinstance(other, Money):
+            return self.cents < other.cents
+        if isinstance(other, Number) and not isinstance(other, bool):
+            return self.to_decimal() < other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def __str__(self):
+        return format_cents(self.cents)
+
+    def __format__(self, spec):
+        return format(self.to_decimal(), spec)
+
+    def __repr__(self):
+        return f'Money({self})'
+
+    def __reduce__(self):
+        return (Money, (self.cents,))
+
+
+def sum_money(amounts):
+    """Total of Money values (or zero) on ints"""
+    return Money(sum(amount.cents for amount in amounts))
+
+
+class MoneyField(models.BigIntegerField):
+    """A money amount stored as integer cents and exposed as Money"""
+    description = 'Money amount in integer cents'
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Money(value)
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Money):
+            return value
+        try:
+            return Money.of(value)
+        except (InvalidOperation, ValueError, TypeError):
+            raise ValidationError(
+                self.error_messages['invalid'], code='invalid', params={'value': value}
+            )
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return to_cents(value)
+
+    def value_to_string(self, obj):
+        value = self.value_from_object(obj)
+        return '' if value is None else str(value)
+
+    def formfield(self, **kwargs):
+        # Forms still take major units with two decimal places
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'max_digits': 17,
+            'decimal_places': 2,
+            **kwargs,
+        })
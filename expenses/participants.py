@@ -0,0 +1,41 @@
+"""
+Diff-based maintenance of an expense's participant rows.
+"""
+from django.db import transaction
+from .models import ExpenseParticipant
+
+
+def sync_participants(expense, shares, percentages=None):
+    """
+    Make the expense's participants match `shares` ({user_id: amount})
+    with at most one bulk insert, one bulk update and one delete.
+    `percentages` ({user_id: percentage}) is kept on percentage splits.
+    Returns True when any participant or share changed.
+    """
+    percentages = percentages or {}
+    existing = {participant.user_id: participant for participant in expense.participants.all()}
+
+    added = [
+        ExpenseParticipant(
+            expense=expense, user_id=user_id, amount=amount, share_percentage=percentages.get(user_id)
+        )
+        for user_id, amount in shares.items() if user_id not in existing
+    ]
+    changed = []
+    for user_id, amount in shares.items():
+        participant = existing.get(user_id)
+        percentage = percentages.get(user_id)
+        if participant is not None and (participant.amount, participant.share_percentage) != (amount, percentage):
+            participant.amount = amount
+            participant.share_percentage = percentage
+            changed.append(participant)
+    removed = [user_id for user_id in existing if user_id not in shares]
+
+    with transaction.atomic():
+        if added:
+            ExpenseParticipant.objects.bulk_create(added)
+        if changed:
+            ExpenseParticipant.objects.bulk_update(changed, ['amount', 'share_percentage'])
+        if removed:
+            ExpenseParticipant.objects.filter(expense=expense, user_id__in=removed).delete()
+    return bool(added or changed or removed)
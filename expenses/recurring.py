@@ -0,0 +1,176 @@
+"""
+Materialisation of recurring expense templates.
+
+materialize_due() turns every occurrence that has come due, across all
+groups, into ordinary Expense and ExpenseParticipant rows with a few bulk
+inserts per batch of templates. bulk_create skips the per-row expense
+signals, so the work they normally do (rollups, budget spending, group
+counters, the ledger and pairwise balances) is applied once per batch,
+aggregated per key or per group.
+
+Occurrences are keyed by (template, occurrence_date) under a unique
+constraint and already-generated ones are skipped, so reruns are safe.
+"""
+from calendar import monthrange
+from collections import defaultdict
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+from activities.services import log_activity
+from budgets.spending import apply_expense_delta
+from groups.models import Group
+from settlements.algorithms import calculate_group_balances
+from settlements.ledger import post_expense_batch
+from .fx import FxError, check_convertible, set_group_amounts
+from .models import Expense, ExpenseParticipant, RecurringExpense, RecurringParticipant
+from .money import Money, to_cents
+from .rollups import apply_to_rollup, rollup_key
+from .splits import SplitError, build_participants, split_expense
+
+
+def next_occurrence(template, day):
+    """The occurrence after `day`; monthly and yearly keep the start date's day of month"""
+    if template.frequency == 'weekly':
+        return day + timedelta(weeks=template.interval)
+    months = template.interval * (12 if template.frequency == 'yearly' else 1)
+    month_index = day.year * 12 + day.month - 1 + months
+    year, month = divmod(month_index, 12)
+    month += 1
+    return day.replace(year=year, month=month, day=min(template.start_date.day, monthrange(year, month)[1]))
+
+
+def due_occurrences(template, as_of):
+    """Dates from template.next_date up to `as_of` (and the template's end date)"""
+    last = min(as_of, template.end_date) if template.end_date else as_of
+    day = template.next_date
+    dates = []
+    while day <= last:
+        dates.append(day)
+        day = next_occurrence(template, day)
+    return dates, day
+
+
+def _currency(template):
+    return (template.currency or template.group.currency).upper()
+
+
+def _shares(template):
+    return [(participant.user_id, participant.value) for participant in template.participants.all()]
+
+
+def materialize_due(as_of=None, batch_size=200):
+    """
+    Generate every due occurrence. Returns (expenses created, ids of
+    templates skipped because their shares don't split or their currency
+    has no exchange rate).
+    """
+    as_of = as_of or timezone.localdate()
+    templates = (
+        RecurringExpense.objects.filter(is_active=True, next_date__lte=as_of, group__is_archived=False)
+        .select_related('payer', 'group')
+        .prefetch_related(Prefetch('participants', queryset=RecurringParticipant.objects.order_by('participant_id')))
+        .order_by('template_id')
+    )
+    created = 0
+    invalid = []
+    last_id = 0
+    while True:
+        batch = list(templates.filter(template_id__gt=last_id)[:batch_size])
+        if not batch:
+            return created, invalid
+        last_id = batch[-1].template_id
+        valid = []
+        for template in batch:
+            try:
+                split_expense(template.amount, _shares(template), template.split_type)
+                check_convertible(_currency(template), template.group.currency, template.next_date)
+                valid.append(template)
+            except (SplitError, FxError):
+                invalid.append(template.template_id)
+        created += _materialize_batch(valid, as_of)
+
+
+def _materialize_batch(templates, as_of):
+    pending = []
+    for template in templates:
+        dates, template.next_date = due_occurrences(template, as_of)
+        if template.end_date and template.next_date > template.end_date:
+            template.is_active = False
+        pending.extend((template, day) for day in dates)
+
+    existing = set(
+        Expense.objects.filter(
+            recurring_id__in=[template.template_id for template in templates],
+            occurrence_date__lte=as_of
+        ).values_list('recurring_id', 'occurrence_date')
+    )
+    pending = [(template, day) for template, day in pending if (template.template_id, day) not in existing]
+
+    with transaction.atomic():
+        expenses = Expense.objects.bulk_create(set_group_amounts([
+            Expense(
+                group=template.group,
+                payer_id=template.payer_id,
+                amount=template.amount,
+                currency=_currency(template),
+                description=template.description,
+                date=day,
+                category_id=template.category_id,
+                split_type=template.split_type,
+                recurring=template,
+                occurrence_date=day
+            )
+            for template, day in pending
+        ]))
+        participants = ExpenseParticipant.objects.bulk_create(
+            build_participants(expenses, [_shares(template) for template, day in pending]), batch_size=1000
+        )
+        splits = defaultdict(dict)
+        for participant in participants:
+            splits[participant.expense_id][participant.user_id] = to_cents(participant.amount)
+        post_expense_batch(expenses, [splits[expense.expense_id] for expense in expenses])
+        _apply_side_effects(expenses)
+        RecurringExpense.objects.bulk_update(templates, ['next_date', 'is_active'])
+
+    group_ids = {expense.group_id for expense in expenses}
+    for group in Group.objects.filter(group_id__in=group_ids):
+        calculate_group_balances(group)
+    for template, count in _counts_by_template(pending).items():
+        log_activity(
+            user=template.payer,
+            group=template.group,
+            activity_type='expense_added',
+            description=f'Added recurring expense: {template.description} ({template.amount})',
+            count=count
+        )
+    return len(expenses)
+
+
+def _apply_side_effects(expenses):
+    """What the expense post_save signals would have done, aggregated"""
+    rollups = defaultdict(lambda: [0, 0])
+    budgets = defaultdict(int)
+    counters = defaultdict(lambda: [0, 0])
+    for expense in expenses:
+        cents = to_cents(expense.group_amount)
+        rollups[rollup_key(expense)][0] += cents
+        rollups[rollup_key(expense)][1] += 1
+        budgets[(expense.group_id, expense.category_id, expense.date)] += cents
+        counters[expense.group_id][0] += 1
+        counters[expense.group_id][1] += cents
+
+    for key, (cents, count) in rollups.items():
+        apply_to_rollup(key, cents, count)
+    for (group_id, category_id, day), cents in budgets.items():
+        apply_expense_delta(group_id, category_id, day, Money(cents))
+    for group_id, (count, cents) in counters.items():
+        Group.adjust_counters(group_id, expenses=count, spent=Money(cents))
+        Group.bump_ledger_version(group_id)
+
+
+def _counts_by_template(pending):
+    counts = {}
+    for template, day in pending:
+        counts[template] = counts.get(template, 0) + 1
+    return counts
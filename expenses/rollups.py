@@ -0,0 +1,120 @@
+"""
+Monthly spending rollups.
+
+SpendingRollup rows hold the total and count of expenses per
+(group, category, payer, month). Expense signals keep them current, so
+dashboards and budgets aggregate over months x categories instead of
+over every expense row.
+"""
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncMonth
+from .models import Expense, SpendingRollup
+from .money import to_cents
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def rollup_key(expense):
+    """The (group_id, category_id, payer_id, month) an expense is counted under"""
+    return (expense.group_id, expense.category_id, expense.payer_id, month_start(expense.date))
+
+
+def apply_to_rollup(key, amount_cents, count):
+    """
+    Add `amount_cents` and `count` to one rollup row. Removals (negative
+    count) only touch an existing row and drop it once it is empty.
+    """
+    group_id, category_id, payer_id, month = key
+    rollups = SpendingRollup.objects.filter(
+        group_id=group_id,
+        category_id=category_id,
+        payer_id=payer_id,
+        month=month
+    )
+    with transaction.atomic():
+        if count > 0:
+            SpendingRollup.objects.get_or_create(
+                group_id=group_id,
+                category_id=category_id,
+                payer_id=payer_id,
+                month=month
+            )
+        rollups.update(
+            total_cents=F('total_cents') + amount_cents,
+            count=F('count') + count
+        )
+        if count < 0:
+            rollups.filter(count__lte=0).delete()
+
+
+def rebuild_rollups(group_ids=None, batch_size=1000):
+    """Recompute rollups from raw expenses, for all groups or only `group_ids`"""
+    expenses = Expense.objects.all()
+    rollups = SpendingRollup.objects.all()
+    if group_ids is not None:
+        expenses = expenses.filter(group_id__in=group_ids)
+        rollups = rollups.filter(group_id__in=group_ids)
+
+    rows = expenses.annotate(month=TruncMonth('date')).values(
+        'group_id', 'category_id', 'payer_id', 'month'
+    ).annotate(total=Sum('group_amount'), expense_count=Count('expense_id')).order_by()
+
+    with transaction.atomic():
+        rollups.delete()
+        created = SpendingRollup.objects.bulk_create(
+            [
+                SpendingRollup(
+                    group_id=row['group_id'],
+                    category_id=row['category_id'],
+                    payer_id=row['payer_id'],
+                    month=row['month'],
+                    total_cents=to_cents(row['total']),
+                    count=row['expense_count']
+                )
+                for row in rows
+            ],
+            batch_size=batch_size
+        )
+    return len(created)
+
+
+def spending_by_category(group, start_date, end_date):
+    """
+    Total spend in cents per category_id for expenses dated in
+    [start_date, end_date]. Whole months are read from rollups; only the
+    partial months at either end touch the expenses table.
+    """
+    first_full = start_date if start_date.day == 1 else next_month(start_date)
+    end_exclusive = end_date + timedelta(days=1)
+    last_full = month_start(end_exclusive)  # Months before this are fully covered
+
+    totals = {}
+    if first_full < last_full:
+        for row in SpendingRollup.objects.filter(
+            group=group,
+            month__gte=first_full,
+            month__lt=last_full
+        ).values('category_id').annotate(total=Sum('total_cents')).order_by():
+            totals[row['category_id']] = row['total']
+        partial_ranges = [(start_date, first_full), (last_full, end_exclusive)]
+    else:
+        partial_ranges = [(start_date, end_exclusive)]
+
+    for range_start, range_end in partial_ranges:
+        if range_start >= range_end:
+            continue
+        for row in Expense.objects.filter(
+            group=group,
+            date__gte=range_start,
+            date__lt=range_end
+        ).values('category_id').annotate(total=Sum('group_amount')).order_by():
+            totals[row['category_id']] = totals.get(row['category_id'], 0) + to_cents(row['total'])
+    return totals
@@ -0,0 +1,54 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .fx import invalidate_rates, set_group_amounts
+from .models import Expense, FxRate
+from .money import to_cents
+from .rollups import rollup_key, apply_to_rollup
+
+
+# Fields that decide the converted amount; an edit of anything else keeps the stored group_amount
+CONVERSION_FIELDS = ('group_id', 'amount', 'currency', 'date')
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_expense(sender, instance, **kwargs):
+    """
+    Keep the stored version of an edited expense so its rollup can be
+    reversed, and convert the amount only when it is new or its money
+    fields changed: the ledger is reposted only then, so a later rate
+    import must not move group_amount (and the totals that follow it) alone.
+    """
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Expense.objects.filter(pk=instance.pk).only(
+            'group_id', 'category_id', 'payer_id', 'date', 'amount', 'currency', 'group_amount'
+        ).first()
+    previous = instance._previous
+    if previous is not None and all(
+        getattr(previous, field) == getattr(instance, field) for field in CONVERSION_FIELDS
+    ):
+        instance.group_amount = previous.group_amount
+    else:
+        set_group_amounts([instance])
+
+
+@receiver(post_save, sender=Expense)
+def update_rollup_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        if rollup_key(previous) == rollup_key(instance) and previous.group_amount == instance.group_amount:
+            return
+        apply_to_rollup(rollup_key(previous), -to_cents(previous.group_amount), -1)
+    apply_to_rollup(rollup_key(instance), to_cents(instance.group_amount), 1)
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    apply_to_rollup(rollup_key(instance), -to_cents(instance.group_amount), -1)
+
+
+@receiver(post_save, sender=FxRate)
+@receiver(post_delete, sender=FxRate)
+def drop_cached_rates(sender, **kwargs):
+    """Rates edited one at a time (e.g. in the admin) must not be served stale"""
+    invalidate_rates()
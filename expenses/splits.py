@@ -0,0 +1,165 @@
+"""
+Split engine: divide expense amounts into participant shares.
+
+Every split type reduces to integer weights per share:
+
+* equal      - weight 1 each;
+* percentage - the percentage in basis points, which must total 100%;
+* exact      - the share in cents, which must total the amount.
+
+Exact shares are taken as given. Other shares are amount * weight / total
+weight, floored in integer cents, and the cents lost to flooring go one
+each to the shares with the largest remainders (ties to the earlier
+participant). Shares therefore always sum to the amount exactly.
+
+A batch of expenses is processed in one pass over flat NumPy arrays: one
+row per share, with `owner` giving the index of the expense it belongs to.
+"""
+from decimal import Decimal
+import numpy as np
+from .models import ExpenseParticipant
+from .money import Money, to_cents
+
+SPLIT_TYPES = ('equal', 'exact', 'percentage')
+FULL_PERCENTAGE = 10000  # 100% in basis points
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class SplitError(ValueError):
+    pass
+
+
+def allocate(amounts, owner, weights):
+    """
+    Largest-remainder allocation. `amounts` holds cents per expense,
+    `owner` the expense index of each share row (in any order) and
+    `weights` each row's integer weight. Returns cents per row.
+    """
+    amounts = np.asarray(amounts, dtype=np.int64)
+    owner = np.asarray(owner, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.int64)
+    n = len(amounts)
+
+    totals = np.zeros(n, dtype=np.int64)
+    np.add.at(totals, owner, weights)
+    if (totals[owner] <= 0).any():
+        raise SplitError('Every expense needs at least one share with a positive weight.')
+
+    if int(np.abs(amounts).max()) * int(totals.max()) > INT64_MAX:
+        # amount * weight would wrap in int64; divide in Python ints instead
+        numerators = amounts[owner].astype(object) * weights.astype(object)
+        divisors = totals[owner].astype(object)
+        shares = (numerators // divisors).astype(np.int64)
+        remainders = (numerators % divisors).astype(np.int64)
+    else:
+        shares, remainders = np.divmod(amounts[owner] * weights, totals[owner])
+
+    allocated = np.zeros(n, dtype=np.int64)
+    np.add.at(allocated, owner, shares)
+    shortfall = amounts - allocated
+
+    # Rank rows within each expense by remainder, largest first, stable on position
+    rows = np.arange(len(owner))
+    order = np.lexsort((rows, -remainders, owner))
+    starts = np.searchsorted(owner[order], np.arange(n))
+    rank = np.empty_like(rows)
+    rank[order] = rows - starts[owner[order]]
+    return shares + (rank < shortfall[owner])
+
+
+def _weight(split_type, value):
+    if split_type == 'equal':
+        return 1
+    if value is None:
+        raise SplitError(f'Every share of a {split_type} split needs a value.')
+    if split_type == 'percentage':
+        return int((Decimal(str(value)) * 100).to_integral_value())
+    return to_cents(value)
+
+
+def split_batch(amounts, shares, split_types='equal'):
+    """
+    Split many expenses at once.
+
+    `amounts` is a sequence of money amounts, `shares` a parallel sequence
+    of [(user_id, value), ...] where value is ignored for equal splits, a
+    percentage for percentage splits and an amount for exact splits.
+    `split_types` is one type for all expenses or one per expense.
+    Returns a list of {user_id: cents} in the order of `amounts`.
+    """
+    if not amounts:
+        return []
+    if isinstance(split_types, str):
+        split_types = [split_types] * len(amounts)
+    amount_cents = np.array([to_cents(amount) for amount in amounts], dtype=np.int64)
+
+    owner, users, weights = [], [], []
+    for index, (split_type, expense_shares) in enumerate(zip(split_types, shares)):
+        if split_type not in SPLIT_TYPES:
+            raise SplitError(f'Unknown split type {split_type!r}.')
+        for user_id, value in expense_shares:
+            owner.append(index)
+            users.append(user_id)
+            weights.append(_weight(split_type, value))
+    owner = np.array(owner, dtype=np.int64)
+    weights = np.array(weights, dtype=np.int64)
+
+    totals = np.zeros(len(amount_cents), dtype=np.int64)
+    np.add.at(totals, owner, weights)
+    kinds = np.array(split_types)
+    bad = ((kinds == 'percentage') & (totals != FULL_PERCENTAGE)) | ((kinds == 'exact') & (totals != amount_cents))
+    if bad.any():
+        index = int(np.flatnonzero(bad)[0])
+        raise SplitError(f'Shares of expense {index} do not add up for a {split_types[index]} split.')
+
+    # Exact shares are already in cents; only the other rows are allocated
+    cents = weights.copy()
+    allocated = kinds[owner] != 'exact'
+    if allocated.any():
+        cents[allocated] = allocate(amount_cents, owner[allocated], weights[allocated])
+    result = [{} for _ in amount_cents]
+    for index, user_id, share in zip(owner.tolist(), users, cents.tolist()):
+        result[index][user_id] = result[index].get(user_id, 0) + share
+    return result
+
+
+def split_expense(amount, shares, split_type='equal'):
+    """{user_id: cents} for a single expense; see split_batch"""
+    return split_batch([amount], [shares], split_type)[0]
+
+
+def split_shares(amount, shares, split_type='equal'):
+    """{user_id: Money share} for a single expense; see split_batch"""
+    cents = split_expense(amount, shares, split_type)
+    return {user_id: Money(share) for user_id, share in cents.items()}
+
+
+def equal_shares(amount, user_ids):
+    """{user_id: Money share} splitting `amount` equally, remainder cents included"""
+    return split_shares(amount, [(user_id, None) for user_id in user_ids])
+
+
+def build_participants(expenses, shares):
+    """
+    Unsaved ExpenseParticipant rows for saved `expenses`, split by each
+    expense's split_type, ready for bulk_create. `shares` is parallel to
+    `expenses` as in split_batch.
+    """
+    splits = split_batch(
+        [expense.amount for expense in expenses],
+        shares,
+        [expense.split_type for expense in expenses]
+    )
+    participants = []
+    for expense, expense_shares, split in zip(expenses, shares, splits):
+        percentages = dict(expense_shares) if expense.split_type == 'percentage' else {}
+        participants.extend(
+            ExpenseParticipant(
+                expense=expense,
+                user_id=user_id,
+                amount=Money(cents),
+                share_percentage=percentages.get(user_id)
+            )
+            for user_id, cents in split.items()
+        )
+    return participants
@@ -1,23 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Q
 from decimal import Decimal
 from .models import Expense, ExpenseParticipant, Category
 from .forms import ExpenseForm
 from .filters import ExpenseFilter
+from .participants import sync_participants
+from .splits import split_shares
 from groups.models import Group, GroupMember
-from .email_service import send_expense_notification
-from activities.models import Activity
-from settlements.algorithms import calculate_group_balances
+from groups.membership import group_member_required, is_group_member
+from activities.services import log_activity
+from activities.payloads import expense_payload
+from settlements.ledger import post_expense, repost_expense, reverse_source
+from jobs.queue import HIGH, LOW, enqueue
+
+
+def _queue_group_refresh(group):
+    """Rebuild balances (soon) and budget forecasts (when idle) in the job worker, once the change commits"""
+    transaction.on_commit(lambda: enqueue('recalculate_balances', group, priority=HIGH))
+    transaction.on_commit(lambda: enqueue('refresh_forecasts', group, priority=LOW))
+
+
+def _percentages(expense, shares):
+    """{user_id: percentage} to keep on the participants of a percentage split"""
+    return dict(shares) if expense.split_type == 'percentage' else {}
 
 
 @login_required
+@group_member_required(writable=True, redirect_to='groups:detail')
 def add_expense_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:detail', group_id=group_id)
     
     if request.method == 'POST':
         form = ExpenseForm(request.POST, group=group)
@@ -25,32 +39,35 @@ def add_expense_view(request, group_id):
             expense = form.save(commit=False)
             expense.group = group
             expense.payer = request.user
-            expense.save()
             
-            participants = form.cleaned_data['participants']
-            share_amount = expense.calculate_equal_split(len(participants))
+            shares = split_shares(expense.amount, form.cleaned_data['shares'], expense.split_type)
+            percentages = _percentages(expense, form.cleaned_data['shares'])
             
-            for participant in participants:
-                ExpenseParticipant.objects.create(
-                    expense=expense,
-                    user=participant,
-                    share_amount=share_amount
-                )
+            # Expense, shares and ledger journal commit together
+            with transaction.atomic():
+                expense.save()
+                ExpenseParticipant.objects.bulk_create([
+                    ExpenseParticipant(
+                        expense=expense, user_id=user_id, amount=amount, share_percentage=percentages.get(user_id)
+                    )
+                    for user_id, amount in shares.items()
+                ])
+                post_expense(expense)
             
-            # Recalculate balances
-            calculate_group_balances(group)
+            _queue_group_refresh(group)
             
             # Log activity
-            Activity.objects.create(
+            log_activity(
                 user=request.user,
                 group=group,
                 activity_type='expense_added',
                 description=f'Added expense: {expense.description} ({expense.amount})',
-                related_expense_id=expense.expense_id
+                related_expense_id=expense.expense_id,
+                payload=expense_payload(expense)
             )
             
-            # Send email notification
-            send_expense_notification(expense)
+            # Email the other members from the worker
+            transaction.on_commit(lambda: enqueue('expense_notification', group, {'expense_id': expense.expense_id}))
             
             messages.success(request, 'Expense added successfully!')
             return redirect('groups:detail', group_id=group_id)
@@ -61,14 +78,10 @@ def add_expense_view(request, group_id):
 
 
 @login_required
+@group_member_required
 def expense_list_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     expenses = Expense.objects.filter(group=group)
     
     # Apply filter
@@ -112,11 +125,11 @@ def delete_expense_view(request, expense_id):
     
     if request.method == 'POST':
         group_id = expense.group.group_id
-        expense.delete()
+        with transaction.atomic():
+            reverse_source(group_id, 'expense', expense.expense_id)
+            expense.delete()
         
-        # Recalculate balances
-        from settlements.algorithms import calculate_group_balances
-        calculate_group_balances(expense.group)
+        _queue_group_refresh(expense.group)
         
         messages.success(request, 'Expense deleted successfully!')
         return redirect('groups:detail', group_id=group_id)
@@ -131,7 +144,7 @@ def edit_expense_view(request, expense_id):
     group = expense.group
     
     # Check if user is member
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
+    if not is_group_member(request, group.group_id):
         messages.error(request, 'You are not a member of this group.')
         return redirect('groups:list')
     
@@ -141,36 +154,38 @@ def edit_expense_view(request, expense_id):
         return redirect('expenses:detail', expense_id=expense_id)
     
     if request.method == 'POST':
+        # The form writes cleaned data onto the instance, so keep the old money fields first
+        original = (expense.amount, expense.currency, expense.date)
         form = ExpenseForm(request.POST, instance=expense, group=group)
         if form.is_valid():
-            # Save expense
             expense = form.save(commit=False)
-            expense.save()
+            shares = split_shares(expense.amount, form.cleaned_data['shares'], expense.split_type)
             
-            # Clear existing participants
-            ExpenseParticipant.objects.filter(expense=expense).delete()
+            with transaction.atomic():
+                # Save expense
+                expense.save()
+                
+                # Insert, update or delete only the participants that changed
+                shares_changed = sync_participants(expense, shares, _percentages(expense, form.cleaned_data['shares']))
+                # A new currency or date changes the conversion into the group's currency
+                money_changed = shares_changed or (expense.amount, expense.currency, expense.date) != original
+                
+                # Reverse the old journal and post the edited one
+                if money_changed:
+                    repost_expense(expense)
             
-            # Add new participants
-            participants = form.cleaned_data['participants']
-            share_amount = expense.calculate_equal_split(len(participants))
-            
-            for participant in participants:
-                ExpenseParticipant.objects.create(
-                    expense=expense,
-                    user=participant.user,
-                    share_amount=share_amount
-                )
-            
-            # Recalculate group balances
-            calculate_group_balances(group)
+            # Recalculate group balances; description-only edits leave them as they are
+            if money_changed:
+                _queue_group_refresh(group)
             
             # Log activity
-            Activity.objects.create(
+            log_activity(
                 user=request.user,
                 group=group,
-                activity_type='expense_added',
+                activity_type='expense_updated',
                 description=f'Updated expense: {expense.description} ({expense.amount})',
-                related_expense_id=expense.expense_id
+                related_expense_id=expense.expense_id,
+                payload=expense_payload(expense)
             )
             
             messages.success(request, 'Expense updated successfully!')
@@ -179,10 +194,9 @@ def edit_expense_view(request, expense_id):
         # Pre-populate form with existing data
         form = ExpenseForm(instance=expense, group=group)
         # Pre-select existing participants
-        existing_participants = expense.participants.all()
-        form.fields['participants'].initial = [p.member_id for p in GroupMember.objects.filter(
-            user__in=[ep.user for ep in existing_participants]
-        )]
+        form.fields['participants'].initial = list(GroupMember.objects.filter(
+            group=group, user_id__in=expense.participants.values('user_id')
+        ).values_list('member_id', flat=True))
     
     context = {
         'form': form,
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Group, GroupMember
+from .models import Group, GroupMember, GroupArchive
 
 
 class GroupMemberInline(admin.TabularInline):
@@ -9,8 +9,8 @@ class GroupMemberInline(admin.TabularInline):
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
-    list_display = ['name', 'owner', 'currency', 'created_at']
-    list_filter = ['currency', 'created_at']
+    list_display = ['name', 'owner', 'currency', 'is_archived', 'created_at']
+    list_filter = ['currency', 'simplify_debts', 'is_archived', 'created_at']
     search_fields = ['name', 'owner__name']
     inlines = [GroupMemberInline]
 
@@ -21,3 +21,9 @@ class GroupMemberAdmin(admin.ModelAdmin):
     list_filter = ['is_admin', 'joined_date']
     search_fields = ['user__name', 'group__name']
 
+
+@admin.register(GroupArchive)
+class GroupArchiveAdmin(admin.ModelAdmin):
+    list_display = ['group', 'archived_at', 'archived_by', 'expense_count', 'total_spent', 'raw_size']
+    search_fields = ['group__name']
+    exclude = ['data']
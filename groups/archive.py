@@ -0,0 +1,249 @@
+"""
+Archival of settled, inactive groups.
+
+Archiving snapshots every ledger and history row a group owns into one
+zlib-compressed JSON blob on a GroupArchive and then deletes those rows
+from the hot tables in bulk. The Group and its memberships stay, so the
+group still lists and can be restored on demand; its counters keep the
+archived totals.
+
+The bulk deletes run as plain DELETE statements without per-row signals:
+the rows leave together and come back together, so rollups, budget
+spending and group counters must not be adjusted row by row. Restore
+recomputes them once the rows are back, and the reconcilers leave
+archived groups alone. Users, categories and templates an archive refers
+to may have been deleted meanwhile; restore drops or nulls those
+references as the foreign keys' on_delete would have.
+"""
+import json
+import zlib
+from datetime import datetime, timedelta
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from activities.models import Activity, TimelineEntry
+from activities.services import fan_out_activities
+from budgets.spending import reconcile_budget_spending
+from chat.models import Message
+from expenses.models import Expense, ExpenseParticipant, SpendingRollup
+from expenses.fx import refresh_group_amounts
+from expenses.money import Money, sum_money
+from expenses.rollups import rebuild_rollups
+from settlements.debts import forget_debt_graph
+from settlements.models import Balance, LedgerEntry, LedgerSnapshot, Settlement
+from .counters import reconcile_group_counters
+from .models import Group, GroupArchive
+
+ARCHIVE_FORMAT_VERSION = 1
+DELETE_BATCH_SIZE = 500
+
+# (key, model, lookup to the group); parents before children so restore can insert in order
+ARCHIVED_TABLES = [
+    ('expenses', Expense, 'group'),
+    ('participants', ExpenseParticipant, 'expense__group'),
+    ('settlements', Settlement, 'group'),
+    ('balances', Balance, 'group'),
+    ('activities', Activity, 'group'),
+    ('messages', Message, 'group'),
+    ('ledger', LedgerEntry, 'group'),
+]
+
+# Derived rows that are dropped on archive and rebuilt (or not needed) on restore
+DERIVED_TABLES = [
+    (TimelineEntry, 'activity__group'),
+    (SpendingRollup, 'group'),
+    (LedgerSnapshot, 'group'),
+]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+class ArchiveEncoder(DjangoJSONEncoder):
+    """Keep datetimes exact (DjangoJSONEncoder rounds to milliseconds) and write Money as a decimal string"""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        if isinstance(o, Money):
+            return str(o)
+        return super().default(o)
+
+
+def _columns(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _bulk_delete(queryset, batch_size=DELETE_BATCH_SIZE):
+    """DELETE the rows by primary key in raw SQL, loading only their ids and sending no signals"""
+    model = queryset.model
+    quote = connection.ops.quote_name
+    sql = f'DELETE FROM {quote(model._meta.db_table)} WHERE {quote(model._meta.pk.column)} IN ({{}})'
+    ids = list(queryset.order_by().values_list('pk', flat=True))
+    deleted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            cursor.execute(sql.format(', '.join(['%s'] * len(chunk))), chunk)
+            deleted += cursor.rowcount
+    return deleted
+
+
+def is_settled(group):
+    """No outstanding balances and no pending settlements"""
+    return not (
+        Balance.objects.filter(group=group, amount__gt=0).exists()
+        or Settlement.objects.filter(group=group, is_completed=False).exists()
+    )
+
+
+def archivable_groups(inactive_days):
+    """Unarchived, settled groups with no expense or activity in the last `inactive_days`"""
+    cutoff = timezone.now() - timedelta(days=inactive_days)
+    group = OuterRef('pk')
+    return Group.objects.filter(is_archived=False, created_at__lt=cutoff).exclude(
+        Exists(Expense.objects.filter(group=group, created_at__gte=cutoff))
+    ).exclude(
+        Exists(Activity.objects.filter(group=group, timestamp__gte=cutoff))
+    ).exclude(
+        Exists(Balance.objects.filter(group=group, amount__gt=0))
+    ).exclude(
+        Exists(Settlement.objects.filter(group=group, is_completed=False))
+    )
+
+
+def archive_group(group, archived_by=None):
+    """Snapshot a settled group into a GroupArchive and delete its hot rows"""
+    if group.is_archived:
+        raise ArchiveError(f'{group.name} is already archived.')
+    if not is_settled(group):
+        raise ArchiveError(f'{group.name} has unsettled balances.')
+
+    with transaction.atomic():
+        tables = {
+            key: list(model.objects.filter(**{lookup: group}).order_by('pk').values(*_columns(model)))
+            for key, model, lookup in ARCHIVED_TABLES
+        }
+        raw = json.dumps(
+            {'version': ARCHIVE_FORMAT_VERSION, 'tables': tables},
+            cls=ArchiveEncoder,
+            separators=(',', ':')
+        ).encode()
+        archive = GroupArchive.objects.create(
+            group=group,
+            archived_by=archived_by,
+            data=zlib.compress(raw, 9),
+            expense_count=len(tables['expenses']),
+            settlement_count=len(tables['settlements']),
+            total_spent=sum_money(Money.of(row['group_amount']) for row in tables['expenses']),
+            raw_size=len(raw)
+        )
+
+        for model, lookup in DERIVED_TABLES:
+            _bulk_delete(model.objects.filter(**{lookup: group}))
+        for key, model, lookup in reversed(ARCHIVED_TABLES):
+            _bulk_delete(model.objects.filter(**{lookup: group}))
+
+        Group.objects.filter(pk=group.pk).update(is_archived=True)
+        Group.bump_ledger_version(group.pk)
+        forget_debt_graph(group.pk)
+        group.is_archived = True
+    return archive
+
+
+def _live_references(model, rows, restored):
+    """
+    Drop rows whose required foreign keys point at deleted rows and null
+    the optional ones. `restored` maps models already re-inserted to their
+    primary keys, so children of dropped rows are dropped too.
+    """
+    for field in model._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        target = field.target_field
+        values = {row.get(field.attname) for row in rows} - {None}
+        if not values:
+            continue
+        if field.related_model in restored:
+            live = restored[field.related_model]
+        else:
+            live = set(
+                field.related_model._base_manager.filter(**{f'{target.attname}__in': values})
+                .values_list(target.attname, flat=True)
+            )
+        if values <= live:
+            continue
+        if field.null:
+            for row in rows:
+                if row.get(field.attname) not in live:
+                    row[field.attname] = None
+        else:
+            rows = [row for row in rows if row.get(field.attname) in live]
+    return rows
+
+
+def _restore_rows(model, rows, batch_size):
+    fields = model._meta.concrete_fields
+    objs = [
+        # Columns added since the archive was written take their defaults
+        model(**{
+            field.attname: field.to_python(row[field.attname]) if field.attname in row else field.get_default()
+            for field in fields
+        })
+        for row in rows
+    ]
+    model.objects.bulk_create(objs, batch_size=batch_size)
+    # bulk_create stamps auto_now/auto_now_add fields with the current time; put the originals back
+    stamped = [
+        field.name for field in fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    if stamped and objs:
+        model.objects.bulk_update(objs, stamped, batch_size=batch_size)
+    return objs
+
+
+def restore_group(group, batch_size=1000):
+    """Re-insert an archived group's rows into the hot tables and drop the archive"""
+    try:
+        archive = group.archive
+    except GroupArchive.DoesNotExist:
+        raise ArchiveError(f'{group.name} has no archive.')
+
+    payload = json.loads(zlib.decompress(bytes(archive.data)))
+    if payload.get('version') != ARCHIVE_FORMAT_VERSION:
+        raise ArchiveError(f'Unsupported archive format {payload.get("version")}.')
+
+    with transaction.atomic():
+        restored = {}
+        restored_ids = {}
+        for key, model, lookup in ARCHIVED_TABLES:
+            rows = _live_references(model, payload['tables'].get(key, []), restored_ids)
+            objs = _restore_rows(model, rows, batch_size)
+            restored[key] = len(objs)
+            restored_ids[model] = {obj.pk for obj in objs}
+            if model is Activity:
+                # Timeline entries are derived; put the group's history back in members' feeds
+                fan_out_activities(objs)
+        # Archives written before group_amount existed restore it as zero
+        refresh_group_amounts([group.pk])
+        rebuild_rollups([group.pk])
+        archive.delete()
+        Group.objects.filter(pk=group.pk).update(is_archived=False)
+        # Rows dropped above and edits since archiving leave the archived totals behind
+        reconcile_group_counters([group.pk])
+        reconcile_budget_spending([group.pk])
+        Group.bump_ledger_version(group.pk)
+        forget_debt_graph(group.pk)
+        group.is_archived = False
+    return restored
+
+
+def archive_inactive_groups(inactive_days):
+    """Archive every eligible group, one transaction each; returns the number archived"""
+    groups = list(archivable_groups(inactive_days))
+    for group in groups:
+        archive_group(group)
+    return len(groups)
@@ -0,0 +1,49 @@
+"""
+Reconciliation for the denormalised Group counters.
+
+member_count, expense_count and total_spent are maintained incrementally
+by groups.signals. Writes that bypass signals (bulk_create, queryset
+update/delete, raw SQL) can let them drift; this recomputes them from the
+source tables and rewrites only the groups that disagree. Archived groups
+keep their archived totals and are skipped; restore_group recomputes them.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from expenses.models import Expense
+from expenses.money import MoneyField
+from .models import Group, GroupMember
+
+COUNTER_FIELDS = ['member_count', 'expense_count', 'total_spent']
+
+
+def _aggregate(queryset, expression, output_field):
+    """Correlated per-group aggregate, so member and expense counts don't multiply each other"""
+    return Coalesce(
+        Subquery(
+            queryset.filter(group=OuterRef('pk')).order_by().values('group')
+            .annotate(value=expression).values('value'),
+            output_field=output_field
+        ),
+        0,
+        output_field=output_field
+    )
+
+
+def reconcile_group_counters(group_ids=None, batch_size=500):
+    """Recompute counters from members and expenses; returns the number of groups fixed"""
+    groups = Group.objects.annotate(
+        actual_members=_aggregate(GroupMember.objects, Count('member_id'), IntegerField()),
+        actual_expenses=_aggregate(Expense.objects, Count('expense_id'), IntegerField()),
+        actual_spent=_aggregate(Expense.objects, Sum('group_amount'), MoneyField()),
+    ).filter(is_archived=False).only('group_id', *COUNTER_FIELDS)
+    if group_ids:
+        groups = groups.filter(group_id__in=group_ids)
+
+    drifted = []
+    for group in groups.iterator(chunk_size=batch_size):
+        actual = (group.actual_members, group.actual_expenses, group.actual_spent)
+        if (group.member_count, group.expense_count, group.total_spent) != actual:
+            group.member_count, group.expense_count, group.total_spent = actual
+            drifted.append(group)
+    Group.objects.bulk_update(drifted, COUNTER_FIELDS, batch_size=batch_size)
+    return len(drifted)
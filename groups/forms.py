@@ -5,11 +5,12 @@ from .models import Group
 class GroupForm(forms.ModelForm):
     class Meta:
         model = Group
-        fields = ['name', 'description', 'currency']
+        fields = ['name', 'description', 'currency', 'simplify_debts']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Group Name'}),
             'description': forms.Textarea(attrs={'class': 'form-control', 'rows': 3, 'placeholder': 'Description (optional)'}),
             'currency': forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Currency (e.g., USD, INR)'}),
+            'simplify_debts': forms.Select(attrs={'class': 'form-control'}),
         }
 
 
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+from groups.archive import ArchiveError, archive_inactive_groups, restore_group
+from groups.models import Group
+
+
+class Command(BaseCommand):
+    help = 'Archive settled groups with no recent activity, or restore an archived group'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=180,
+            help='Archive groups inactive for at least this many days (default: 180)'
+        )
+        parser.add_argument(
+            '--restore',
+            type=int,
+            metavar='GROUP_ID',
+            help='Restore this archived group instead of archiving'
+        )
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            try:
+                group = Group.objects.get(group_id=options['restore'])
+                restored = restore_group(group)
+            except (Group.DoesNotExist, ArchiveError) as e:
+                raise CommandError(str(e))
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ Restored {group.name} ({restored["expenses"]} expenses)')
+            )
+            return
+
+        archived = archive_inactive_groups(options['days'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Archived {archived} inactive groups')
+        )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from groups.counters import reconcile_group_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalised group member/expense counters and fix any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--group',
+            type=int,
+            action='append',
+            dest='group_ids',
+            help='Only reconcile this group (can be repeated)'
+        )
+
+    def handle(self, *args, **options):
+        fixed = reconcile_group_counters(options['group_ids'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Reconciled counters, {fixed} groups corrected')
+        )
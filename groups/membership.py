@@ -0,0 +1,129 @@
+"""
+Membership and role resolution shared by every group-scoped view.
+
+A user's memberships are loaded once as a {group_id: is_admin} map,
+cached per user and memoised on the request, so a request makes at most
+one membership query (none when the cache is warm). GroupMember signals
+drop the cached map whenever the user joins or leaves a group (see
+spliteaseproject.caching for how long it is kept). Async views get the same
+map through the async cache and ORM APIs.
+"""
+from functools import wraps
+from asgiref.sync import iscoroutinefunction
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.shortcuts import redirect
+from spliteaseproject.caching import cache_timeout
+from .models import Group, GroupMember
+
+MEMBERSHIP_CACHE_TIMEOUT = 60 * 60
+ARCHIVED_MESSAGE = 'This group is archived. Restore it to make changes.'
+
+
+def _cache_key(user_id):
+    return f'memberships:{user_id}'
+
+
+def get_user_memberships(request):
+    """{group_id: is_admin} for the requesting user"""
+    memberships = getattr(request, '_group_memberships', None)
+    if memberships is None:
+        key = _cache_key(request.user.pk)
+        memberships = cache.get(key)
+        if memberships is None:
+            memberships = dict(
+                GroupMember.objects.filter(user=request.user).values_list('group_id', 'is_admin')
+            )
+            cache.set(key, memberships, cache_timeout(MEMBERSHIP_CACHE_TIMEOUT))
+        request._group_memberships = memberships
+    return memberships
+
+
+async def aget_user_memberships(request):
+    """Async get_user_memberships(), for async views"""
+    memberships = getattr(request, '_group_memberships', None)
+    if memberships is None:
+        user = await request.auser()
+        key = _cache_key(user.pk)
+        memberships = await cache.aget(key)
+        if memberships is None:
+            memberships = {
+                group_id: is_admin
+                async for group_id, is_admin in
+                GroupMember.objects.filter(user=user).values_list('group_id', 'is_admin')
+            }
+            await cache.aset(key, memberships, cache_timeout(MEMBERSHIP_CACHE_TIMEOUT))
+        request._group_memberships = memberships
+    return memberships
+
+
+def is_group_member(request, group_id):
+    return int(group_id) in get_user_memberships(request)
+
+
+def is_group_admin(request, group_id):
+    return get_user_memberships(request).get(int(group_id), False)
+
+
+def invalidate_memberships(user_id):
+    cache.delete(_cache_key(user_id))
+
+
+def _archived(group_id):
+    return Group.objects.filter(group_id=group_id, is_archived=True)
+
+
+def group_member_required(view_func=None, *, admin=False, json=False, writable=False,
+                          message='You are not a member of this group.', redirect_to='groups:list'):
+    """
+    Reject requests from users who are not members (or, with admin=True,
+    admins) of the group named by the view's `group_id` argument. With
+    writable=True, archived groups are rejected too, so views that write
+    into a group cannot make its archive snapshot stale.
+    JSON endpoints get a 403; other views redirect with an error message.
+    Works on both sync and async views.
+    """
+    def allowed(memberships, group_id):
+        if admin:
+            return memberships.get(int(group_id), False)
+        return int(group_id) in memberships
+
+    def reject(request, group_id):
+        if json:
+            return JsonResponse({'error': 'Not authorized'}, status=403)
+        if message:
+            messages.error(request, message)
+        if redirect_to == 'groups:detail':
+            return redirect(redirect_to, group_id=group_id)
+        return redirect(redirect_to)
+
+    def reject_archived(request, group_id):
+        if json:
+            return JsonResponse({'error': 'Group is archived'}, status=403)
+        messages.error(request, ARCHIVED_MESSAGE)
+        return redirect('groups:detail', group_id=group_id)
+
+    def decorator(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(request, group_id, *args, **kwargs):
+                if not allowed(await aget_user_memberships(request), group_id):
+                    return reject(request, group_id)
+                if writable and await _archived(group_id).aexists():
+                    return reject_archived(request, group_id)
+                return await func(request, group_id, *args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(request, group_id, *args, **kwargs):
+            if not allowed(get_user_memberships(request), group_id):
+                return reject(request, group_id)
+            if writable and _archived(group_id).exists():
+                return reject_archived(request, group_id)
+            return func(request, group_id, *args, **kwargs)
+        return wrapper
+
+    if view_func is not None:
+        return decorator(view_func)
+    return decorator
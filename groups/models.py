@@ -1,16 +1,33 @@
 from django.db import models
 from django.utils import timezone
 from users.models import User
+from expenses.money import MoneyField, to_cents
 
 
 class Group(models.Model):
+    SIMPLIFY_CHOICES = [
+        ('full', 'Minimise payments'),
+        ('cycles', 'Cancel debt cycles only'),
+        ('none', 'Keep every pairwise debt'),
+    ]
+
     group_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
     currency = models.CharField(max_length=3, default='USD')
+    # How pairwise debts are simplified into balances; see settlements.debts
+    simplify_debts = models.CharField(max_length=10, choices=SIMPLIFY_CHOICES, default='full')
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_groups')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    # Bumped on every expense, settlement or membership change; used as a cache key
+    ledger_version = models.PositiveIntegerField(default=0)
+    # Denormalised counters kept in step by groups.signals; see reconcile_group_counters
+    member_count = models.PositiveIntegerField(default=0)
+    expense_count = models.PositiveIntegerField(default=0)
+    total_spent = MoneyField(default=0)
+    # Set while the group's ledger rows live in its GroupArchive instead of the hot tables
+    is_archived = models.BooleanField(default=False)
 
     class Meta:
         db_table = 'groups'
@@ -20,7 +37,24 @@ class Group(models.Model):
         return self.name
 
     def get_total_members(self):
-        return self.members.count()
+        return self.member_count
+
+    @classmethod
+    def bump_ledger_version(cls, group_id):
+        cls.objects.filter(group_id=group_id).update(ledger_version=models.F('ledger_version') + 1)
+
+    @classmethod
+    def adjust_counters(cls, group_id, members=0, expenses=0, spent=0):
+        """Apply counter deltas in a single UPDATE so concurrent writers don't race"""
+        changes = {}
+        if members:
+            changes['member_count'] = models.F('member_count') + members
+        if expenses:
+            changes['expense_count'] = models.F('expense_count') + expenses
+        if spent:
+            changes['total_spent'] = models.F('total_spent') + to_cents(spent)
+        if changes:
+            cls.objects.filter(group_id=group_id).update(**changes)
 
 
 class GroupMember(models.Model):
@@ -36,3 +70,23 @@ class GroupMember(models.Model):
 
     def __str__(self):
         return f"{self.user.name} - {self.group.name}"
+
+
+class GroupArchive(models.Model):
+    """Compressed snapshot of an archived group's expenses, settlements and history"""
+    archive_id = models.AutoField(primary_key=True)
+    group = models.OneToOneField(Group, on_delete=models.CASCADE, related_name='archive')
+    archived_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+    # zlib-compressed JSON of the archived rows, keyed by table
+    data = models.BinaryField()
+    expense_count = models.PositiveIntegerField(default=0)
+    settlement_count = models.PositiveIntegerField(default=0)
+    total_spent = MoneyField(default=0)
+    raw_size = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        db_table = 'group_archives'
+
+    def __str__(self):
+        return f"Archive - {self.group.name}"
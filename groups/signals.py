@@ -0,0 +1,59 @@
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Group, GroupMember
+from .membership import invalidate_memberships
+
+
+@receiver(post_save, sender='expenses.Expense')
+@receiver(post_delete, sender='expenses.Expense')
+@receiver(post_save, sender='settlements.Settlement')
+@receiver(post_delete, sender='settlements.Settlement')
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+def bump_group_ledger_version(sender, instance, **kwargs):
+    """Invalidate caches keyed on the group's ledger version"""
+    Group.bump_ledger_version(instance.group_id)
+
+
+@receiver(post_save, sender='expenses.ExpenseParticipant')
+@receiver(post_delete, sender='expenses.ExpenseParticipant')
+def bump_ledger_version_for_participant(sender, instance, **kwargs):
+    Group.objects.filter(expenses__expense_id=instance.expense_id).update(
+        ledger_version=F('ledger_version') + 1
+    )
+
+
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+def drop_cached_memberships(sender, instance, **kwargs):
+    invalidate_memberships(instance.user_id)
+
+
+@receiver(post_save, sender=GroupMember)
+def count_member_added(sender, instance, created, **kwargs):
+    if created:
+        Group.adjust_counters(instance.group_id, members=1)
+
+
+@receiver(post_delete, sender=GroupMember)
+def count_member_removed(sender, instance, **kwargs):
+    Group.adjust_counters(instance.group_id, members=-1)
+
+
+@receiver(post_save, sender='expenses.Expense')
+def count_expense_saved(sender, instance, created, **kwargs):
+    # expenses.signals stores the pre-edit row on instance._previous
+    previous = getattr(instance, '_previous', None)
+    if created or previous is None:
+        Group.adjust_counters(instance.group_id, expenses=1, spent=instance.group_amount)
+    elif previous.group_id != instance.group_id:
+        Group.adjust_counters(previous.group_id, expenses=-1, spent=-previous.group_amount)
+        Group.adjust_counters(instance.group_id, expenses=1, spent=instance.group_amount)
+    else:
+        Group.adjust_counters(instance.group_id, spent=instance.group_amount - previous.group_amount)
+
+
+@receiver(post_delete, sender='expenses.Expense')
+def count_expense_deleted(sender, instance, **kwargs):
+    Group.adjust_counters(instance.group_id, expenses=-1, spent=-instance.group_amount)
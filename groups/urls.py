@@ -9,6 +9,9 @@ urlpatterns = [
     path('<int:group_id>/', views.group_detail_view, name='detail'),
     path('<int:group_id>/add-member/', views.add_member_view, name='add_member'),
     path('<int:group_id>/remove-member/<int:member_id>/', views.remove_member_view, name='remove_member'),
+    path('<int:group_id>/simplify-debts/', views.simplify_debts_view, name='simplify_debts'),
+    path('<int:group_id>/archive/', views.archive_group_view, name='archive'),
+    path('<int:group_id>/restore/', views.restore_group_view, name='restore'),
     path('<int:group_id>/delete/', views.delete_group_view, name='delete'),
     path('delete/<int:group_id>/', views.delete_group_view, name='delete'),
 ]
\ No newline at end of file
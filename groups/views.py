@@ -1,10 +1,24 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import ExpressionWrapper, OuterRef, Prefetch, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from .models import Group, GroupMember
+from .archive import ArchiveError, archive_group, restore_group
+from .membership import group_member_required, is_group_admin
 from .forms import GroupForm, AddMemberForm
 from users.models import User
+from activities.services import log_activity
+from activities.payloads import member_payload
 from activities.models import Activity
+from jobs.queue import HIGH, enqueue
+from settlements.models import Balance
+from expenses.money import MoneyField
+
+GROUPS_PER_PAGE = 12
+
 
 @login_required
 def create_group_view(request):
@@ -23,24 +37,52 @@ def create_group_view(request):
     return render(request, 'groups/create_group.html', {'form': form})
 
 
+def _balance_total(field):
+    """Sum of the requesting member's Balance rows on one side, correlated to the membership"""
+    return Coalesce(
+        Subquery(
+            Balance.objects.filter(group=OuterRef('group'), **{field: OuterRef('user')})
+            .order_by().values(field).annotate(total=Sum('amount')).values('total'),
+            output_field=MoneyField()
+        ),
+        Value(0),
+        output_field=MoneyField()
+    )
+
+
 @login_required
 def group_list_view(request):
-    groups = request.user.group_memberships.all()
-    return render(request, 'groups/group_list.html', {'groups': groups})
+    # One query for the page of memberships with balance and last activity
+    # annotated, one for the count, and one prefetch for the member previews
+    memberships = (
+        request.user.group_memberships
+        .select_related('group')
+        .annotate(
+            # Combining two MoneyFields would otherwise resolve to a plain IntegerField
+            net_balance=ExpressionWrapper(_balance_total('user2') - _balance_total('user1'), output_field=MoneyField()),
+            last_activity=Subquery(
+                Activity.objects.filter(group=OuterRef('group'))
+                .order_by('-timestamp').values('timestamp')[:1]
+            ),
+        )
+        .prefetch_related(
+            Prefetch(
+                'group__members',
+                queryset=GroupMember.objects.select_related('user').order_by('-is_admin', 'joined_date'),
+                to_attr='roster'
+            )
+        )
+        .order_by('-group__created_at', 'member_id')
+    )
+    page = Paginator(memberships, GROUPS_PER_PAGE).get_page(request.GET.get('page'))
+    return render(request, 'groups/group_list.html', {'groups': page, 'page_obj': page})
 
 
 @login_required
+@group_member_required
 def group_detail_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check if user is a member
-    is_member = GroupMember.objects.filter(group=group, user=request.user).exists()
-    is_admin = GroupMember.objects.filter(group=group, user=request.user, is_admin=True).exists()
-    
-    if not is_member:
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     members = GroupMember.objects.filter(group=group).select_related('user')
     expenses = group.expenses.all().order_by('-date')[:3]
     
@@ -49,21 +91,16 @@ def group_detail_view(request, group_id):
         'members': members,
         'expenses': expenses,
         'is_owner': group.owner == request.user,
-        'is_admin': is_admin,
+        'is_admin': is_group_admin(request, group_id),
     }
     return render(request, 'groups/group_detail.html', context)
 
 
 @login_required
+@group_member_required(admin=True, writable=True, message='Only group admins can add members.', redirect_to='groups:detail')
 def add_member_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check if user is admin
-    member = GroupMember.objects.filter(group=group, user=request.user, is_admin=True).first()
-    if not member:
-        messages.error(request, 'Only group admins can add members.')
-        return redirect('groups:detail', group_id=group_id)
-    
     if request.method == 'POST':
         form = AddMemberForm(request.POST)
         if form.is_valid():
@@ -77,12 +114,12 @@ def add_member_view(request, group_id):
                     messages.success(request, f'{user.name} added to group!')
                     
                     # Log activity
-                    from activities.models import Activity
-                    Activity.objects.create(
+                    log_activity(
                         user=request.user,
                         group=group,
                         activity_type='member_joined',
-                        description=f'Added {user.name} to the group'
+                        description=f'Added {user.name} to the group',
+                        payload=member_payload(user)
                     )
             except User.DoesNotExist:
                 messages.error(request, 'User with this email does not exist.')
@@ -94,16 +131,11 @@ def add_member_view(request, group_id):
     return render(request, 'groups/add_member.html', {'form': form, 'group': group})
 
 @login_required
+@group_member_required(admin=True, writable=True, message='Only group admins can remove members.', redirect_to='groups:detail')
 def remove_member_view(request, group_id, member_id):
     group = get_object_or_404(Group, group_id=group_id)
     member_to_remove = get_object_or_404(GroupMember, member_id=member_id)
     
-    # Check if user is admin
-    admin_member = GroupMember.objects.filter(group=group, user=request.user, is_admin=True).first()
-    if not admin_member:
-        messages.error(request, 'Only group admins can remove members.')
-        return redirect('groups:detail', group_id=group_id)
-    
     # Can't remove owner
     if member_to_remove.user == group.owner:
         messages.error(request, 'Cannot remove group owner.')
@@ -114,21 +146,62 @@ def remove_member_view(request, group_id, member_id):
         messages.error(request, 'You cannot remove yourself.')
         return redirect('groups:detail', group_id=group_id)
     
-    member_name = member_to_remove.user.name
+    removed_user = member_to_remove.user
+    member_name = removed_user.name
     member_to_remove.delete()
     messages.success(request, f'{member_name} removed from group.')
     
     # Log activity
-    Activity.objects.create(
+    log_activity(
         user=request.user,
         group=group,
         activity_type='member_left',
-        description=f'Removed {member_name} from the group'
+        description=f'Removed {member_name} from the group',
+        payload=member_payload(removed_user)
     )
     
     return redirect('groups:detail', group_id=group_id)
 
 
+@login_required
+@group_member_required(admin=True, writable=True, message='Only group admins can change how debts are simplified.', redirect_to='groups:detail')
+def simplify_debts_view(request, group_id):
+    group = get_object_or_404(Group, group_id=group_id)
+    mode = request.POST.get('simplify_debts')
+    if request.method == 'POST' and mode in dict(Group.SIMPLIFY_CHOICES):
+        group.simplify_debts = mode
+        group.save(update_fields=['simplify_debts'])
+        transaction.on_commit(lambda: enqueue('recalculate_balances', group, priority=HIGH))
+        messages.success(request, f'Debts: {group.get_simplify_debts_display()}.')
+    return redirect('groups:detail', group_id=group_id)
+
+
+@login_required
+@group_member_required(admin=True, message='Only group admins can archive the group.', redirect_to='groups:detail')
+def archive_group_view(request, group_id):
+    group = get_object_or_404(Group, group_id=group_id)
+    if request.method == 'POST':
+        try:
+            archive = archive_group(group, archived_by=request.user)
+            messages.success(request, f'"{group.name}" archived ({archive.expense_count} expenses).')
+        except ArchiveError as e:
+            messages.error(request, str(e))
+    return redirect('groups:detail', group_id=group_id)
+
+
+@login_required
+@group_member_required(admin=True, message='Only group admins can restore the group.', redirect_to='groups:detail')
+def restore_group_view(request, group_id):
+    group = get_object_or_404(Group, group_id=group_id)
+    if request.method == 'POST':
+        try:
+            restored = restore_group(group)
+            messages.success(request, f'"{group.name}" restored ({restored["expenses"]} expenses).')
+        except ArchiveError as e:
+            messages.error(request, str(e))
+    return redirect('groups:detail', group_id=group_id)
+
+
 @login_required
 def delete_group_view(request, group_id):
     group = get_object_or_404(Group, group_id=group_id)
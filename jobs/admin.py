@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'group', 'priority', 'status', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'kind', 'priority']
+    readonly_fields = ['created_at', 'locked_at', 'finished_at', 'last_error']
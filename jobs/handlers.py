@@ -0,0 +1,26 @@
+"""Job kinds run by the worker; each takes the job's group_id and its payload as keyword arguments"""
+from budgets.forecast import run_forecasts
+from expenses.email_service import send_expense_notification
+from expenses.models import Expense
+from groups.models import Group
+from settlements.algorithms import calculate_group_balances
+from .queue import handler
+
+
+@handler('recalculate_balances', coalesce=True)
+def recalculate_balances(group_id):
+    group = Group.objects.filter(group_id=group_id).first()
+    if group is not None:
+        calculate_group_balances(group)
+
+
+@handler('refresh_forecasts', coalesce=True)
+def refresh_forecasts(group_id):
+    run_forecasts(group_ids=[group_id])
+
+
+@handler('expense_notification')
+def expense_notification(group_id, expense_id):
+    expense = Expense.objects.select_related('group', 'payer', 'category').filter(expense_id=expense_id).first()
+    if expense is not None:
+        send_expense_notification(expense)
@@ -0,0 +1,56 @@
+import time
+from django.core.management.base import BaseCommand
+from jobs.queue import claim, purge_finished, requeue_stale, run_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (balance rebuilds, forecasts, notifications)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when the queue is empty instead of polling'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Jobs claimed per batch (default: 50)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1)'
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            default=7,
+            help='Delete finished jobs older than this many days on start (default: 7)'
+        )
+
+    def handle(self, *args, **options):
+        purged = purge_finished(options['purge_days'])
+        requeued = requeue_stale()
+        if purged or requeued:
+            self.stdout.write(f'Purged {purged} finished jobs, requeued {requeued} stale ones')
+
+        processed = succeeded = 0
+        try:
+            while True:
+                jobs = claim(options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(options['sleep'])
+                    requeue_stale()
+                    continue
+                succeeded += run_jobs(jobs)
+                processed += len(jobs)
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Ran {processed} jobs, {processed - succeeded} failed')
+        )
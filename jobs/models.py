@@ -0,0 +1,49 @@
+from django.db import models
+from django.utils import timezone
+from groups.models import Group
+
+
+class Job(models.Model):
+    """A unit of deferred work, run by the run_jobs worker; see jobs.queue"""
+    PRIORITIES = [
+        (0, 'High'),
+        (5, 'Normal'),
+        (9, 'Low'),
+    ]
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    job_id = models.BigAutoField(primary_key=True)
+    kind = models.CharField(max_length=50)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.PositiveSmallIntegerField(choices=PRIORITIES, default=5)  # Lower runs first
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    # Set for kinds that coalesce per group; at most one queued job per key
+    coalesce_key = models.CharField(max_length=100, null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'jobs'
+        indexes = [
+            models.Index(fields=['status', 'priority', 'run_after']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['coalesce_key'],
+                condition=models.Q(status='queued'),
+                name='unique_queued_job'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} ({self.get_status_display()})"
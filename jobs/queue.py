@@ -0,0 +1,164 @@
+"""
+Database-backed job queue.
+
+Views enqueue follow-up work (balance rebuilds, budget forecasts, email)
+as Job rows and return; the run_jobs worker claims the most urgent jobs
+in batches and runs them group by group. No broker is involved: the jobs
+table is the queue.
+
+Kinds registered with coalesce=True keep at most one queued job per
+group, enforced by a partial unique constraint. Enqueuing again while one
+is waiting only raises its priority, so a burst of expense edits costs a
+single rebuild. A job that raises is retried with backoff up to
+MAX_ATTEMPTS, then left as failed with its error.
+
+With settings.JOB_QUEUE_EAGER the job runs as soon as it is enqueued,
+for setups without a worker.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+from django.utils import timezone
+from .models import Job
+
+HIGH, NORMAL, LOW = 0, 5, 9
+MAX_ATTEMPTS = 5
+RETRY_DELAY = timedelta(seconds=30)  # Doubled on every further attempt
+# A job running longer than this is assumed to have lost its worker
+STALE_AFTER = timedelta(minutes=10)
+
+# kind -> (function(group_id, **payload), coalesce)
+HANDLERS = {}
+
+
+class JobError(Exception):
+    pass
+
+
+def handler(kind, coalesce=False):
+    """Register the function that runs jobs of `kind`"""
+    def register(func):
+        HANDLERS[kind] = (func, coalesce)
+        return func
+    return register
+
+
+def enqueue(kind, group=None, payload=None, priority=NORMAL):
+    """
+    Queue a job for `group` (a Group or its id). Returns the new Job, or
+    None when it coalesced into one already queued.
+    """
+    if kind not in HANDLERS:
+        raise JobError(f'No handler registered for {kind!r}.')
+    group_id = getattr(group, 'pk', group)
+    key = f'{kind}:{group_id}' if HANDLERS[kind][1] else None
+
+    job = None
+    if key is None or not _coalesce(key, priority):
+        try:
+            with transaction.atomic():
+                job = Job.objects.create(
+                    kind=kind, group_id=group_id, payload=payload or {}, priority=priority, coalesce_key=key
+                )
+        except IntegrityError:
+            # Another request queued the same key between the update and the insert
+            _coalesce(key, priority)
+
+    if job is not None and getattr(settings, 'JOB_QUEUE_EAGER', False):
+        run_jobs(claim(job_ids=[job.job_id]))
+    return job
+
+
+def _coalesce(key, priority):
+    return Job.objects.filter(coalesce_key=key, status='queued').update(priority=Least('priority', priority))
+
+
+def claim(batch_size=50, job_ids=None):
+    """Mark up to `batch_size` due jobs running, most urgent first, and return them"""
+    now = timezone.now()
+    due = Job.objects.filter(status='queued', run_after__lte=now)
+    if job_ids is not None:
+        due = due.filter(job_id__in=job_ids)
+    with transaction.atomic():
+        ids = list(
+            due.select_for_update(skip_locked=True)
+            .order_by('priority', 'job_id').values_list('job_id', flat=True)[:batch_size]
+        )
+        # Workers that raced for the same rows each get only the ones they flipped
+        Job.objects.filter(job_id__in=ids, status='queued').update(
+            status='running', locked_at=now, attempts=F('attempts') + 1
+        )
+    return list(Job.objects.filter(job_id__in=ids, status='running', locked_at=now).order_by('priority', 'job_id'))
+
+
+def run_jobs(jobs):
+    """Run claimed jobs one group at a time, most urgent group first; returns the number that succeeded"""
+    by_group = defaultdict(list)
+    for job in jobs:
+        by_group[job.group_id].append(job)
+    succeeded = 0
+    for group_jobs in sorted(by_group.values(), key=lambda group_jobs: (group_jobs[0].priority, group_jobs[0].job_id)):
+        for job in group_jobs:
+            succeeded += run_job(job)
+    return succeeded
+
+
+def run_job(job):
+    try:
+        if job.kind not in HANDLERS:
+            raise JobError(f'No handler registered for {job.kind!r}.')
+        HANDLERS[job.kind][0](job.group_id, **job.payload)
+    except Exception as error:
+        _failed(job, error)
+        return False
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'finished_at'])
+    return True
+
+
+def _failed(job, error):
+    job.last_error = f'{type(error).__name__}: {error}'
+    if job.attempts >= MAX_ATTEMPTS:
+        job.status = 'failed'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at', 'last_error'])
+        return
+    job.status = 'queued'
+    job.run_after = timezone.now() + RETRY_DELAY * 2 ** (job.attempts - 1)
+    try:
+        with transaction.atomic():
+            job.save(update_fields=['status', 'run_after', 'last_error'])
+    except IntegrityError:
+        # A newer queued job for the same key will do the work
+        Job.objects.filter(pk=job.pk).update(status='done', finished_at=timezone.now(), last_error=job.last_error)
+
+
+def requeue_stale(older_than=STALE_AFTER):
+    """Put jobs whose worker died mid-run back in the queue; returns how many"""
+    stale = Job.objects.filter(status='running', locked_at__lt=timezone.now() - older_than)
+    count = 0
+    for job in stale:
+        _failed(job, JobError('Worker stopped while running the job.'))
+        count += 1
+    return count
+
+
+def purge_finished(older_than_days):
+    """Delete done jobs finished more than `older_than_days` ago; failed ones are kept"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    return Job.objects.filter(status='done', finished_at__lt=cutoff).delete()[0]
+
+
+def run_pending(batch_size=50):
+    """Work through every due job; returns the number processed"""
+    processed = 0
+    while True:
+        jobs = claim(batch_size)
+        if not jobs:
+            return processed
+        run_jobs(jobs)
+        processed += len(jobs)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Balance, Settlement
+from .models import Balance, Settlement, LedgerEntry, LedgerSnapshot
 
 
 @admin.register(Balance)
@@ -16,3 +16,21 @@ class SettlementAdmin(admin.ModelAdmin):
     search_fields = ['payer__name', 'payee__name']
     readonly_fields = ['created_at', 'completed_at']
 
+
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ['entry_id', 'group', 'user', 'source_type', 'source_id', 'kind', 'amount_cents', 'created_at']
+    list_filter = ['source_type', 'kind', 'group']
+    search_fields = ['user__name', 'group__name']
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(LedgerSnapshot)
+class LedgerSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['group', 'last_entry_id', 'as_of', 'created_at']
+    list_filter = ['group']
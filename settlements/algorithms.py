@@ -1,21 +1,23 @@
-from decimal import Decimal
 from collections import defaultdict
 from .models import Balance, Settlement
 from users.models import User
 from groups.models import GroupMember
 from expenses.models import Expense, ExpenseParticipant
+from expenses.money import Money, sum_money
+from django.db import transaction
+from django.utils import timezone
+from .debts import group_debt_graph
 
 
 class SettlementOptimizer:
     def __init__(self, group):
         self.group = group
-        self.balances = defaultdict(Decimal)
+        self.balances = defaultdict(int)  # user_id -> net cents
     
     def calculate_net_balances(self):
-        balance_records = Balance.objects.filter(group=self.group)
-        for balance in balance_records:
-            self.balances[balance.user1.user_id] -= balance.amount
-            self.balances[balance.user2.user_id] += balance.amount
+        for debtor_id, creditor_id, amount in Balance.objects.filter(group=self.group).values_list('user1_id', 'user2_id', 'amount'):
+            self.balances[debtor_id] -= amount.cents
+            self.balances[creditor_id] += amount.cents
         return self.balances
     
     def minimize_transactions(self):
@@ -25,12 +27,12 @@ class SettlementOptimizer:
         
         for user_id, balance in self.balances.items():
             if balance < 0:
-                debtors.append([user_id, abs(balance)])
+                debtors.append([user_id, -balance])
             elif balance > 0:
                 creditors.append([user_id, balance])
         
-        debtors.sort(key=lambda x: x, reverse=True)
-        creditors.sort(key=lambda x: x, reverse=True)
+        debtors.sort(key=lambda x: x[1], reverse=True)
+        creditors.sort(key=lambda x: x[1], reverse=True)
         
         settlements = []
         i = j = 0
@@ -44,15 +46,15 @@ class SettlementOptimizer:
             settlements.append({
                 'payer_id': debtor_id,
                 'payee_id': creditor_id,
-                'amount': transfer_amount
+                'amount': Money(transfer_amount)
             })
             
-            debtors[i] -= transfer_amount
-            creditors[j] -= transfer_amount
+            debtors[i][1] -= transfer_amount
+            creditors[j][1] -= transfer_amount
             
-            if debtors[i] == 0:
+            if debtors[i][1] == 0:
                 i += 1
-            if creditors[j] == 0:
+            if creditors[j][1] == 0:
                 j += 1
         
         return settlements
@@ -79,69 +81,51 @@ class SettlementOptimizer:
 
 def calculate_group_balances(group):
     """
-    Calculate and update balance records for all members in a group.
+    Bring the group's pairwise Balance records in line with its debt graph
+    (see settlements.debts), simplified per group.simplify_debts. Only
+    pairs whose amount changed are written.
     This is called after expenses are added or modified.
     """
-    # Clear existing balances
-    Balance.objects.filter(group=group).delete()
-    
-    # Get all expenses for this group
-    expenses = group.expenses.all()
-    
-    # Calculate net balance for each user
-    balances = defaultdict(Decimal)
-    
-    for expense in expenses:
-        # Payer gets credited
-        balances[expense.payer.user_id] += Decimal(str(expense.amount))
-        
-        # Participants get debited
-        participants = expense.participants.all()
-        for participant in participants:
-            balances[participant.user.user_id] -= Decimal(str(participant.share_amount))
-    
-    # Create Balance records for each pair where money is owed
-    members = GroupMember.objects.filter(group=group)
-    member_dict = {m.user.user_id: m.user for m in members}
-    
-    for user_id, balance in balances.items():
-        if balance > 0:  # User is owed money
-            for other_id, other_balance in balances.items():
-                if other_balance < 0 and user_id != other_id:  # Other user owes money
-                    amount_owed = min(balance, abs(other_balance))
-                    if amount_owed > 0:
-                        Balance.objects.create(
-                            group=group,
-                            user1=member_dict[other_id],  # Debtor
-                            user2=member_dict[user_id],   # Creditor
-                            amount=amount_owed
-                        )
-                        balances[user_id] -= amount_owed
-                        balances[other_id] += amount_owed
-                        balance = balances[user_id]
-                        if balance <= 0:
-                            break
+    graph = group_debt_graph(group.group_id).simplified(group.simplify_debts)
+    wanted = {(debtor, creditor): cents for debtor, creditor, cents in graph.edges()}
+    existing = {(balance.user1_id, balance.user2_id): balance for balance in Balance.objects.filter(group=group)}
+    
+    stale = [balance.balance_id for pair, balance in existing.items() if pair not in wanted]
+    changed = []
+    for pair, cents in wanted.items():
+        balance = existing.get(pair)
+        if balance is not None and balance.amount.cents != cents:
+            balance.amount = Money(cents)
+            balance.updated_at = timezone.now()
+            changed.append(balance)
+    
+    with transaction.atomic():
+        Balance.objects.filter(balance_id__in=stale).delete()
+        Balance.objects.bulk_update(changed, ['amount', 'updated_at'])
+        Balance.objects.bulk_create([
+            Balance(group=group, user1_id=debtor, user2_id=creditor, amount=Money(cents))
+            for (debtor, creditor), cents in wanted.items() if (debtor, creditor) not in existing
+        ])
+
                         
 def optimize_settlements(group):
     """
     Generate optimized settlement transactions to minimize the number of payments.
     """
-    balances = Balance.objects.filter(group=group)
+    # Net balance for each user, in cents
+    net_balances = defaultdict(int)
     
-    # Calculate net balance for each user
-    net_balances = defaultdict(Decimal)
-    
-    for balance in balances:
-        net_balances[balance.user1.user_id] -= balance.amount  # Owes
-        net_balances[balance.user2.user_id] += balance.amount  # Owed
+    for debtor_id, creditor_id, amount in Balance.objects.filter(group=group).values_list('user1_id', 'user2_id', 'amount'):
+        net_balances[debtor_id] -= amount.cents  # Owes
+        net_balances[creditor_id] += amount.cents  # Owed
     
     # Separate debtors and creditors
-    debtors = []   # List of [user_id, amount_owed]
-    creditors = []  # List of [user_id, amount_owed]
+    debtors = []   # List of [user_id, cents_owed]
+    creditors = []  # List of [user_id, cents_owed]
     
     for user_id, balance in net_balances.items():
         if balance < 0:
-            debtors.append([user_id, abs(balance)])
+            debtors.append([user_id, -balance])
         elif balance > 0:
             creditors.append([user_id, balance])
     
@@ -156,11 +140,8 @@ def optimize_settlements(group):
     
     i, j = 0, 0
     while i < len(debtors) and j < len(creditors):
-        debtor_id = debtors[i][0]
-        debt_amount = Decimal(str(debtors[i][1]))  # Convert to Decimal
-        
-        creditor_id = creditors[j][0]
-        credit_amount = Decimal(str(creditors[j][1]))  # Convert to Decimal
+        debtor_id, debt_amount = debtors[i]
+        creditor_id, credit_amount = creditors[j]
         
         # Match smallest of the two
         settlement_amount = min(debt_amount, credit_amount)
@@ -170,14 +151,14 @@ def optimize_settlements(group):
             group=group,
             payer=member_dict[debtor_id],
             payee=member_dict[creditor_id],
-            amount=settlement_amount,
+            amount=Money(settlement_amount),
             is_completed=False
         )
         settlements.append(settlement)
         
-        # Update remaining amounts (use Decimal for proper arithmetic)
-        debtors[i][1] = debt_amount - settlement_amount
-        creditors[j][1] = credit_amount - settlement_amount
+        # Update remaining amounts
+        debtors[i][1] -= settlement_amount
+        creditors[j][1] -= settlement_amount
         
         # Move to next if current is settled
         if debtors[i][1] <= 0:
@@ -201,8 +182,8 @@ def get_settlement_summary(group, user):
     owes = Balance.objects.filter(group=group, user1=user)
     owed = Balance.objects.filter(group=group, user2=user)
     
-    total_owes = sum(b.amount for b in owes)
-    total_owed = sum(b.amount for b in owed)
+    total_owes = sum_money(b.amount for b in owes)
+    total_owed = sum_money(b.amount for b in owed)
     net_balance = total_owed - total_owes
     
     return {
@@ -222,8 +203,8 @@ def get_user_balance_summary(user, group=None):
         owes = owes.filter(group=group)
         owed = owed.filter(group=group)
     
-    total_owes = sum(b.amount for b in owes)
-    total_owed = sum(b.amount for b in owed)
+    total_owes = sum_money(b.amount for b in owes)
+    total_owed = sum_money(b.amount for b in owed)
     net_balance = total_owed - total_owes
     
     return {
@@ -0,0 +1,204 @@
+"""
+Pairwise debt graph.
+
+Every ledger journal says who owes whom: the members it debits owe the
+members it credits. For an expense each participant owes the payer their
+share; a completed settlement shrinks the payee's claim on the payer.
+DebtGraph keeps those obligations as adjacency maps in cents, netting
+the two directions of a pair as journals are applied, and simplifies
+them per the group's simplify_debts setting:
+
+* none   - every pairwise debt as recorded;
+* cycles - debt cycles (A owes B owes C owes A) cancelled, so nobody is
+  asked to pay someone they didn't already owe;
+* full   - who owes whom is dropped and the largest debtors are paired
+  with the largest creditors: the fewest payments for the same nets.
+
+The raw graph is cached per group with the id of the last ledger entry
+folded into it, so recomputing balances only applies newer journals.
+"""
+from collections import defaultdict
+from django.core.cache import cache
+from .ledger import group_net_balances
+from .models import LedgerEntry
+
+SIMPLIFY_MODES = ('none', 'cycles', 'full')
+
+
+def _greedy_pairs(debtors, creditors):
+    """
+    Pair [id, cents] debtors with creditors, largest first (ties by id);
+    yields (debtor, creditor, cents). Both totals must match.
+    """
+    debtors = sorted(([user_id, cents] for user_id, cents in debtors), key=lambda x: (-x[1], x[0]))
+    creditors = sorted(([user_id, cents] for user_id, cents in creditors), key=lambda x: (-x[1], x[0]))
+    i = j = 0
+    while i < len(debtors) and j < len(creditors):
+        cents = min(debtors[i][1], creditors[j][1])
+        yield debtors[i][0], creditors[j][0], cents
+        debtors[i][1] -= cents
+        creditors[j][1] -= cents
+        if debtors[i][1] == 0:
+            i += 1
+        if creditors[j][1] == 0:
+            j += 1
+
+
+class DebtGraph:
+    """Who owes whom, in cents; at most one direction per pair"""
+
+    def __init__(self):
+        self.owes = {}      # debtor -> {creditor: cents}
+        self.owed_by = {}   # creditor -> {debtor: cents}
+
+    def amount(self, debtor, creditor):
+        return self.owes.get(debtor, {}).get(creditor, 0)
+
+    def _set(self, debtor, creditor, cents):
+        if cents:
+            self.owes.setdefault(debtor, {})[creditor] = cents
+            self.owed_by.setdefault(creditor, {})[debtor] = cents
+            return
+        for adjacency, key, other in ((self.owes, debtor, creditor), (self.owed_by, creditor, debtor)):
+            edges = adjacency.get(key)
+            if edges is not None:
+                edges.pop(other, None)
+                if not edges:
+                    del adjacency[key]
+
+    def add(self, debtor, creditor, cents):
+        """`debtor` owes `creditor` another `cents` (negative reduces it), netted against the reverse edge"""
+        if debtor == creditor or not cents:
+            return
+        if cents < 0:
+            debtor, creditor, cents = creditor, debtor, -cents
+        reverse = self.amount(creditor, debtor)
+        if reverse:
+            offset = min(reverse, cents)
+            self._set(creditor, debtor, reverse - offset)
+            cents -= offset
+        if cents:
+            self._set(debtor, creditor, self.amount(debtor, creditor) + cents)
+
+    def apply_journal(self, legs):
+        """Fold one balanced journal of {user_id: cents} legs in"""
+        debtors = [(user_id, -cents) for user_id, cents in legs.items() if cents < 0]
+        creditors = [(user_id, cents) for user_id, cents in legs.items() if cents > 0]
+        for debtor, creditor, cents in _greedy_pairs(debtors, creditors):
+            self.add(debtor, creditor, cents)
+
+    def apply_entries(self, entries):
+        """Apply LedgerEntry rows (dicts with entry_id, journal, user_id, amount_cents) by journal"""
+        journals = defaultdict(lambda: defaultdict(int))
+        last_entry_id = 0
+        for entry in entries:
+            journals[entry['journal']][entry['user_id']] += entry['amount_cents']
+            last_entry_id = max(last_entry_id, entry['entry_id'])
+        for legs in journals.values():
+            self.apply_journal(legs)
+        return last_entry_id
+
+    def edges(self):
+        """(debtor, creditor, cents) for every debt, in a stable order"""
+        return sorted(
+            (debtor, creditor, cents)
+            for debtor, creditors in self.owes.items()
+            for creditor, cents in creditors.items()
+        )
+
+    def nets(self):
+        """{user_id: cents}; positive means the member is owed"""
+        nets = defaultdict(int)
+        for debtor, creditor, cents in self.edges():
+            nets[debtor] -= cents
+            nets[creditor] += cents
+        return {user_id: cents for user_id, cents in nets.items() if cents}
+
+    def copy(self):
+        graph = DebtGraph()
+        graph.owes = {debtor: dict(creditors) for debtor, creditors in self.owes.items()}
+        graph.owed_by = {creditor: dict(debtors) for creditor, debtors in self.owed_by.items()}
+        return graph
+
+    def _find_cycle(self):
+        """Some cycle as a list of nodes [a, b, ..., a], or None"""
+        state = {}  # node -> 1 on the current path, 2 finished
+        # A member nobody owes can't be on a cycle
+        for root in sorted(node for node in self.owes if node in self.owed_by):
+            if root in state:
+                continue
+            path = [root]
+            state[root] = 1
+            stack = [iter(sorted(self.owes.get(root, {})))]
+            while stack:
+                node = next(stack[-1], None)
+                if node is None:
+                    state[path.pop()] = 2
+                    stack.pop()
+                elif state.get(node) == 1:
+                    return path[path.index(node):] + [node]
+                elif node not in state:
+                    state[node] = 1
+                    path.append(node)
+                    stack.append(iter(sorted(self.owes.get(node, {}))))
+        return None
+
+    def cancel_cycles(self):
+        """Remove every cycle by subtracting its smallest debt around it; nets are unchanged"""
+        cycle = self._find_cycle()
+        while cycle is not None:
+            pairs = list(zip(cycle, cycle[1:]))
+            smallest = min(self.amount(debtor, creditor) for debtor, creditor in pairs)
+            for debtor, creditor in pairs:
+                self._set(debtor, creditor, self.amount(debtor, creditor) - smallest)
+            cycle = self._find_cycle()
+        return self
+
+    def simplified(self, mode):
+        """A simplified copy; see SIMPLIFY_MODES"""
+        if mode not in SIMPLIFY_MODES:
+            raise ValueError(f'Unknown simplification {mode!r}.')
+        if mode == 'none':
+            return self.copy()
+        if mode == 'cycles':
+            return self.copy().cancel_cycles()
+        nets = self.nets()
+        graph = DebtGraph()
+        for debtor, creditor, cents in _greedy_pairs(
+            [(user_id, -cents) for user_id, cents in nets.items() if cents < 0],
+            [(user_id, cents) for user_id, cents in nets.items() if cents > 0],
+        ):
+            graph.add(debtor, creditor, cents)
+        return graph
+
+
+def _cache_key(group_id):
+    return f'debt_graph:{group_id}'
+
+
+def _entries(group_id, after=0):
+    return (
+        LedgerEntry.objects.filter(group_id=group_id, entry_id__gt=after)
+        .order_by('entry_id').values('entry_id', 'journal', 'user_id', 'amount_cents')
+    )
+
+
+def forget_debt_graph(group_id):
+    cache.delete(_cache_key(group_id))
+
+
+def group_debt_graph(group_id):
+    """
+    The group's unsimplified DebtGraph. The cached graph is brought up to
+    date with the entries after its cursor; it is rebuilt from the whole
+    ledger when its nets disagree with the ledger's (a journal committed
+    out of id order, or the group was archived and restored).
+    """
+    cached = cache.get(_cache_key(group_id))
+    graph, last_entry_id = cached if cached else (DebtGraph(), 0)
+    last_entry_id = max(last_entry_id, graph.apply_entries(_entries(group_id, last_entry_id)))
+    if graph.nets() != group_net_balances(group_id):
+        graph = DebtGraph()
+        last_entry_id = graph.apply_entries(_entries(group_id))
+    cache.set(_cache_key(group_id), (graph, last_entry_id), None)
+    return graph
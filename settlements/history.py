@@ -0,0 +1,103 @@
+"""
+Point-in-time group balances.
+
+The snapshot_balances job closes each day (or month) with a LedgerSnapshot
+whose as_of is the period's last instant, for every group whose ledger
+moved during it. A balance at any moment is then the nearest snapshot at or
+before it plus the few entries in between, and a history of period ends
+reads straight from the snapshots.
+"""
+import calendar
+from bisect import bisect_right
+from datetime import datetime, time, timedelta
+from django.db.models import Max
+from django.utils import timezone
+from .ledger import fold_balances, latest_snapshot
+from .models import LedgerEntry, LedgerSnapshot
+
+PERIODS = ('day', 'month')
+
+
+def period_bounds(day, period='day'):
+    """(first instant, last instant) of the day or month containing `day`"""
+    if period == 'month':
+        first = day.replace(day=1)
+        last = day.replace(day=calendar.monthrange(day.year, day.month)[1])
+    else:
+        first = last = day
+    return (
+        timezone.make_aware(datetime.combine(first, time.min)),
+        timezone.make_aware(datetime.combine(last, time.max)),
+    )
+
+
+def period_end(day, period='day'):
+    return period_bounds(day, period)[1]
+
+
+def close_period(day, period='day', group_ids=None):
+    """
+    Snapshot every group whose ledger moved in the period containing `day`.
+    Periods already closed for a group are skipped, so reruns are safe.
+    """
+    start, end = period_bounds(day, period)
+    moved = LedgerEntry.objects.filter(created_at__gte=start, created_at__lte=end)
+    if group_ids is not None:
+        moved = moved.filter(group_id__in=group_ids)
+    closed = LedgerSnapshot.objects.filter(period=period, as_of=end).values('group_id')
+    last_entries = (
+        moved.exclude(group_id__in=closed)
+        .values('group_id').annotate(last_entry_id=Max('entry_id')).order_by()
+    )
+
+    snapshots = []
+    for row in last_entries:
+        balances = fold_balances(row['group_id'], latest_snapshot(row['group_id'], at=end), at=end)
+        snapshots.append(LedgerSnapshot(
+            group_id=row['group_id'],
+            period=period,
+            last_entry_id=row['last_entry_id'],
+            as_of=end,
+            balances={str(user_id): cents for user_id, cents in balances.items()}
+        ))
+    return LedgerSnapshot.objects.bulk_create(snapshots)
+
+
+def balances_on(group_id, day, period='day'):
+    """{user_id: net cents} at the close of the day (or month) containing `day`"""
+    end = period_end(day, period)
+    return fold_balances(group_id, latest_snapshot(group_id, at=end), at=end)
+
+
+def balance_history(group_id, days, period='day'):
+    """
+    [(day, {user_id: net cents})] at the close of each of `days` (ascending).
+    Snapshots are loaded once; a point only queries the ledger when no
+    snapshot closes exactly at it, and then only the entries since the
+    nearest one.
+    """
+    if not days:
+        return []
+    ends = [period_end(day, period) for day in days]
+    base = latest_snapshot(group_id, at=ends[0])
+    snapshots = ([base] if base else []) + list(
+        LedgerSnapshot.objects.filter(group_id=group_id, as_of__gt=ends[0], as_of__lte=ends[-1])
+        .order_by('as_of', 'last_entry_id')
+    )
+    as_ofs = [snapshot.as_of for snapshot in snapshots]
+
+    history = []
+    for day, end in zip(days, ends):
+        index = bisect_right(as_ofs, end) - 1
+        snapshot = snapshots[index] if index >= 0 else None
+        if snapshot is not None and snapshot.as_of == end:
+            balances = {int(user_id): cents for user_id, cents in snapshot.balances.items() if cents}
+        else:
+            balances = fold_balances(group_id, snapshot, at=end)
+        history.append((day, balances))
+    return history
+
+
+def recent_days(count, today=None):
+    today = today or timezone.localdate()
+    return [today - timedelta(days=offset) for offset in range(count - 1, -1, -1)]
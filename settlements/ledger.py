@@ -0,0 +1,241 @@
+"""
+Append-only, double-entry ledger of group money movements.
+
+Every expense or completed settlement posts a journal of LedgerEntry legs
+in integer cents that sum to zero. Edits and deletions never touch old
+rows: they post a reversal of the source's current position and, for an
+edit, a fresh journal. A member's net position is therefore the sum of
+their legs, and LedgerSnapshot rows fold that sum periodically so reads
+only aggregate the entries after the latest snapshot.
+
+Callers post inside the same transaction.atomic() block as the expense or
+settlement write so the ledger never disagrees with the rows it records.
+Legs are in the group's currency; expenses paid in another currency are
+converted share by share when posted (see expenses.fx).
+"""
+import uuid
+from collections import defaultdict
+from django.db.models import Count, Exists, F, Max, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+from expenses.fx import convert_splits
+from expenses.models import Expense
+from expenses.money import to_cents
+from .models import LedgerEntry, LedgerSnapshot, Settlement
+
+# Entries after the latest snapshot before snapshot_ledgers folds a new one
+SNAPSHOT_EVERY = 200
+
+
+class LedgerError(Exception):
+    pass
+
+
+def _post(group_id, source_type, source_id, legs, kind='post', at=None):
+    """Write one balanced journal, dated `at` (default now); zero legs are dropped"""
+    legs = {user_id: cents for user_id, cents in legs.items() if cents}
+    if sum(legs.values()) != 0:
+        raise LedgerError(f'Unbalanced journal for {source_type} {source_id}: {legs}')
+    if not legs:
+        return []
+    journal = uuid.uuid4()
+    at = at or timezone.now()
+    return LedgerEntry.objects.bulk_create([
+        LedgerEntry(
+            group_id=group_id,
+            user_id=user_id,
+            journal=journal,
+            source_type=source_type,
+            source_id=source_id,
+            kind=kind,
+            amount_cents=cents,
+            created_at=at
+        )
+        for user_id, cents in sorted(legs.items())
+    ])
+
+
+def _legs(payer_id, split):
+    legs = defaultdict(int)
+    for user_id, cents in split.items():
+        legs[user_id] -= cents
+        legs[payer_id] += cents
+    return legs
+
+
+def expense_legs(expense, shares=None):
+    """
+    {user_id: cents} for an expense in its group's currency: each
+    participant is debited their converted share and the payer credited
+    the sum, so the journal always balances. `shares` is an iterable of
+    (user_id, amount) and defaults to the stored participants.
+    """
+    if shares is None:
+        shares = expense.participants.values_list('user_id', 'amount')
+    split = defaultdict(int)
+    for user_id, amount in shares:
+        split[user_id] += to_cents(amount)
+    return _legs(expense.payer_id, convert_splits([expense], [split])[0])
+
+
+def source_position(source_type, source_id):
+    """Current net legs of one expense or settlement across all its journals"""
+    return {
+        row['user_id']: row['total']
+        for row in LedgerEntry.objects.filter(source_type=source_type, source_id=source_id)
+        .values('user_id').annotate(total=Sum('amount_cents')).order_by()
+    }
+
+
+def post_expense(expense):
+    return _post(expense.group_id, 'expense', expense.expense_id, expense_legs(expense))
+
+
+def post_expense_batch(expenses, splits, backdate=False):
+    """
+    Post journals for many new expenses in one insert. `splits` is parallel
+    to `expenses`, each {user_id: cents} in the expense's currency as
+    produced by expenses.splits; all of them convert in one pass. With
+    `backdate`, journals are dated when each expense was recorded rather
+    than now.
+    """
+    now = timezone.now()
+    entries = []
+    for expense, split in zip(expenses, convert_splits(expenses, splits)):
+        legs = _legs(expense.payer_id, split)
+        journal = uuid.uuid4()
+        entries.extend(
+            LedgerEntry(
+                group_id=expense.group_id,
+                user_id=user_id,
+                journal=journal,
+                source_type='expense',
+                source_id=expense.expense_id,
+                amount_cents=cents,
+                created_at=expense.created_at if backdate else now
+            )
+            for user_id, cents in sorted(legs.items()) if cents
+        )
+    return LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def reverse_source(group_id, source_type, source_id):
+    """Post a journal cancelling everything recorded so far for a source"""
+    position = source_position(source_type, source_id)
+    return _post(group_id, source_type, source_id, {user_id: -cents for user_id, cents in position.items()}, kind='reversal')
+
+
+def repost_expense(expense):
+    """Reverse an edited expense's previous journals and post its current state"""
+    return reverse_source(expense.group_id, 'expense', expense.expense_id) + post_expense(expense)
+
+
+def post_settlement(settlement, at=None):
+    """A completed payment: the payer's position rises, the payee's falls"""
+    cents = to_cents(settlement.amount)
+    return _post(
+        settlement.group_id, 'settlement', settlement.settlement_id,
+        {settlement.payer_id: cents, settlement.payee_id: -cents}, at=at
+    )
+
+
+def latest_snapshot(group_id, at=None):
+    snapshots = LedgerSnapshot.objects.filter(group_id=group_id)
+    if at is not None:
+        snapshots = snapshots.filter(as_of__lte=at)
+    return snapshots.order_by('-as_of', '-last_entry_id').first()
+
+
+def _tail(group_id, snapshot):
+    """
+    The group's entries a snapshot does not cover. Snapshots are keyed on
+    (as_of, last_entry_id) rather than entry id alone: backfilled journals
+    are dated in the past, so ids need not follow time order.
+    """
+    tail = LedgerEntry.objects.filter(group_id=group_id)
+    if snapshot is None:
+        return tail
+    return tail.filter(
+        Q(created_at__gt=snapshot.as_of) | Q(created_at=snapshot.as_of, entry_id__gt=snapshot.last_entry_id)
+    )
+
+
+def fold_balances(group_id, snapshot, at=None):
+    """`snapshot`'s nets (or zero) plus the group's entries after it, up to `at`"""
+    balances = defaultdict(int)
+    tail = _tail(group_id, snapshot)
+    if snapshot is not None:
+        balances.update({int(user_id): cents for user_id, cents in snapshot.balances.items()})
+    if at is not None:
+        tail = tail.filter(created_at__lte=at)
+    for row in tail.values('user_id').annotate(total=Sum('amount_cents')).order_by():
+        balances[row['user_id']] += row['total']
+    return {user_id: cents for user_id, cents in balances.items() if cents}
+
+
+def group_net_balances(group_id, at=None):
+    """
+    {user_id: net cents} for a group, now or as of datetime `at`: the
+    nearest snapshot plus the entries after it. Positive means the group
+    owes the member.
+    """
+    return fold_balances(group_id, latest_snapshot(group_id, at), at=at)
+
+
+def take_snapshot(group_id):
+    """Fold the group's tail into a new snapshot; None when there is nothing new"""
+    previous = latest_snapshot(group_id)
+    last = _tail(group_id, previous).aggregate(entry_id=Max('entry_id'), created_at=Max('created_at'))
+    if last['entry_id'] is None:
+        return None
+    balances = fold_balances(group_id, previous, at=last['created_at'])
+    return LedgerSnapshot.objects.create(
+        group_id=group_id,
+        last_entry_id=last['entry_id'],
+        as_of=last['created_at'],
+        balances={str(user_id): cents for user_id, cents in balances.items()}
+    )
+
+
+def snapshot_ledgers(min_tail=SNAPSHOT_EVERY):
+    """Snapshot every group with at least `min_tail` entries since its last snapshot"""
+    folded_until = Subquery(
+        LedgerSnapshot.objects.filter(group=OuterRef('group')).order_by('-as_of', '-last_entry_id').values('as_of')[:1]
+    )
+    group_ids = (
+        LedgerEntry.objects.annotate(folded=folded_until)
+        .filter(Q(folded__isnull=True) | Q(created_at__gt=F('folded')))
+        .values('group_id').annotate(tail=Count('entry_id')).filter(tail__gte=min_tail)
+        .values_list('group_id', flat=True)
+    )
+    return [snapshot for snapshot in map(take_snapshot, list(group_ids)) if snapshot]
+
+
+def backfill_ledger():
+    """
+    Post journals for expenses and completed settlements recorded before
+    the ledger existed, dated when each was recorded or completed so
+    balance history places them correctly. Snapshots closing after the
+    earliest backdated entry no longer cover everything before their
+    as_of, so they are dropped and rebuilt by the next close or tail
+    snapshot. Runs after every migrate.
+    """
+    unposted = ~Exists(LedgerEntry.objects.filter(source_id=OuterRef('pk'), source_type='expense'))
+    expenses = list(Expense.objects.filter(unposted).select_related('group').prefetch_related('participants'))
+    splits = [
+        {participant.user_id: to_cents(participant.amount) for participant in expense.participants.all()}
+        for expense in expenses
+    ]
+    entries = post_expense_batch(expenses, splits, backdate=True)
+    posted = len({entry.source_id for entry in entries})
+    unposted = ~Exists(LedgerEntry.objects.filter(source_id=OuterRef('pk'), source_type='settlement'))
+    for settlement in Settlement.objects.filter(unposted, is_completed=True):
+        legs = post_settlement(settlement, at=settlement.completed_at or settlement.created_at)
+        entries.extend(legs)
+        posted += bool(legs)
+
+    earliest = {}
+    for entry in entries:
+        earliest[entry.group_id] = min(earliest.get(entry.group_id, entry.created_at), entry.created_at)
+    for group_id, created_at in earliest.items():
+        LedgerSnapshot.objects.filter(group_id=group_id, as_of__gte=created_at).delete()
+    return posted
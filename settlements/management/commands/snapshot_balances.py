@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from settlements.history import PERIODS, close_period
+
+
+class Command(BaseCommand):
+    help = 'Close a day or month with point-in-time balance snapshots for every group that moved'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period',
+            choices=PERIODS,
+            default='day',
+            help='Snapshot granularity (default: day)'
+        )
+        parser.add_argument(
+            '--date',
+            help='A date inside the period to close, YYYY-MM-DD (default: yesterday)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Also close this many preceding periods, oldest first (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Date must be in YYYY-MM-DD format')
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+
+        # Earlier periods first, so each snapshot can build on the previous one
+        days = []
+        for _ in range(options['days']):
+            days.insert(0, day)
+            day = day.replace(day=1) - timedelta(days=1) if options['period'] == 'month' else day - timedelta(days=1)
+
+        created = sum(len(close_period(day, options['period'])) for day in days)
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Created {created} {options["period"]} balance snapshots')
+        )
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from settlements.ledger import SNAPSHOT_EVERY, backfill_ledger, snapshot_ledgers
+
+
+class Command(BaseCommand):
+    help = 'Fold long ledger tails into per-group balance snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-tail',
+            type=int,
+            default=SNAPSHOT_EVERY,
+            help=f'Only snapshot groups with at least this many new entries (default: {SNAPSHOT_EVERY})'
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='First post journals for expenses and settlements that predate the ledger'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            posted = backfill_ledger()
+            self.stdout.write(self.style.SUCCESS(f'✓ Posted {posted} backfill journals'))
+        snapshots = snapshot_ledgers(options['min_tail'])
+        self.stdout.write(
+            self.style.SUCCESS(f'✓ Created {len(snapshots)} ledger snapshots')
+        )
@@ -3,12 +3,13 @@ from django.utils import timezone
 from users.models import User
 from groups.models import Group
 from django.core.exceptions import ValidationError
+from expenses.money import MoneyField
 
 class Balance(models.Model):
     balance_id = models.AutoField(primary_key=True)
     user1 = models.ForeignKey(User, related_name='balance_from', on_delete=models.CASCADE)
     user2 = models.ForeignKey(User, related_name='balance_to', on_delete=models.CASCADE)
-    amount = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+    amount = MoneyField(default=0)
     group = models.ForeignKey(Group, on_delete=models.CASCADE, null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -20,11 +21,11 @@ class Balance(models.Model):
         return f"{self.user1.name} owes {self.user2.name}: {self.amount}"
 
     def clean(self):
-        """Validate settlement data"""
-        if self.payer == self.payee:
-            raise ValidationError("Payer and payee must be different.")
+        """Validate balance data"""
+        if self.user1_id and self.user1_id == self.user2_id:
+            raise ValidationError("Debtor and creditor must be different.")
         if self.amount <= 0:
-            raise ValidationError("Settlement amount must be positive.")
+            raise ValidationError("Balance amount must be positive.")
 
     def save(self, *args, **kwargs):
         """Override save to call clean"""
@@ -36,7 +37,7 @@ class Settlement(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='settlements')
     payer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments_made')
     payee = models.ForeignKey(User, on_delete=models.CASCADE, related_name='payments_received')
-    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = MoneyField()
     is_completed = models.BooleanField(default=False)  # ADD THIS LINE
     created_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)  # OPTIONAL: Add this too
@@ -60,4 +61,80 @@ class Settlement(models.Model):
     def save(self, *args, **kwargs):
         """Override save to call clean"""
         self.full_clean()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+class LedgerEntry(models.Model):
+    """
+    One leg of an append-only, double-entry journal of group money movements.
+
+    amount_cents is the change in what the group owes the user: positive when
+    they paid for others, negative when they consumed a share. The legs of a
+    journal always sum to zero. Rows are never updated or deleted; edits and
+    deletions post reversing journals.
+    """
+    SOURCE_TYPES = [
+        ('expense', 'Expense'),
+        ('settlement', 'Settlement'),
+    ]
+    KINDS = [
+        ('post', 'Post'),
+        ('reversal', 'Reversal'),
+    ]
+
+    entry_id = models.BigAutoField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='ledger_entries')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='ledger_entries')
+    journal = models.UUIDField()
+    source_type = models.CharField(max_length=20, choices=SOURCE_TYPES)
+    # Plain id rather than a foreign key: entries outlive the expense or settlement they record
+    source_id = models.IntegerField()
+    kind = models.CharField(max_length=10, choices=KINDS, default='post')
+    amount_cents = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ledger_entries'
+        indexes = [
+            models.Index(fields=['group', 'entry_id']),
+            models.Index(fields=['source_type', 'source_id']),
+        ]
+
+    def __str__(self):
+        return f"{self.source_type} {self.source_id}: {self.user_id} {self.amount_cents:+d}"
+
+
+class LedgerSnapshot(models.Model):
+    """Per-member net cents for a group, folded up to and including (as_of, last_entry_id)"""
+    PERIODS = [
+        ('tail', 'Tail'),      # Taken when the tail grew long, at an arbitrary entry
+        ('day', 'Daily'),      # Closes a calendar day; as_of is its last instant
+        ('month', 'Monthly'),  # Closes a calendar month
+    ]
+
+    snapshot_id = models.AutoField(primary_key=True)
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='ledger_snapshots')
+    period = models.CharField(max_length=10, choices=PERIODS, default='tail')
+    last_entry_id = models.BigIntegerField()
+    # Every entry created at or before this instant is folded in
+    as_of = models.DateTimeField()
+    # {user_id: net_cents}; JSON object keys are strings
+    balances = models.JSONField(default=dict)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'ledger_snapshots'
+        indexes = [
+            models.Index(fields=['group', 'last_entry_id']),
+            models.Index(fields=['group', 'as_of']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['group', 'period', 'as_of'],
+                condition=~models.Q(period='tail'),
+                name='unique_period_snapshot'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Snapshot {self.group_id} @ {self.last_entry_id}"
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_migrate
+from django.dispatch import receiver
+from .ledger import backfill_ledger
+
+
+@receiver(post_migrate, dispatch_uid='settlements.backfill_ledger')
+def backfill_ledger_after_migrate(sender, app_config=None, **kwargs):
+    """Balances read only the ledger, so rows that predate it are posted on deploy"""
+    if app_config is None or app_config.name != 'settlements':
+        return
+    backfill_ledger()
@@ -1,10 +1,18 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from groups.models import Group, GroupMember
+from django.http import JsonResponse
+from groups.models import Group
+from groups.membership import group_member_required
 from .models import Settlement
+from django.db import transaction
 from .algorithms import optimize_settlements, get_settlement_summary, calculate_group_balances
-from activities.models import Activity
+from .ledger import post_settlement
+from .history import balance_history, recent_days
+from users.models import User
+from activities.services import log_activity
+from activities.payloads import settlement_payload
 
 
 @login_required
@@ -41,15 +49,11 @@ def balance_summary_view(request):
     return render(request, 'settlements/balance_summary.html', context)
 
 @login_required
+@group_member_required
 def group_balance_view(request, group_id):
     """Show balance for a specific group"""
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     summary = get_settlement_summary(group, request.user)
     
     context = {
@@ -60,15 +64,39 @@ def group_balance_view(request, group_id):
 
 
 @login_required
+@group_member_required(json=True)
+async def balance_history_view(request, group_id):
+    """
+    Daily net balance per member as JSON, for charts. Series are keyed by
+    user id (names need not be unique); `names` maps the ids to labels.
+    """
+    try:
+        days = min(max(int(request.GET.get('days', 30)), 1), 365)
+    except ValueError:
+        days = 30
+    # The snapshot walk is a run of small queries; one thread hop for all of them
+    history = await sync_to_async(balance_history)(group_id, recent_days(days))
+    user_ids = {user_id for _, balances in history for user_id in balances}
+    names = {
+        user_id: name
+        async for user_id, name in User.objects.filter(user_id__in=user_ids).values_list('user_id', 'name')
+    }
+    return JsonResponse({
+        'dates': [day.isoformat() for day, _ in history],
+        'members': {
+            str(user_id): [balances.get(user_id, 0) / 100 for _, balances in history]
+            for user_id in sorted(user_ids)
+        },
+        'names': {str(user_id): names.get(user_id, str(user_id)) for user_id in sorted(user_ids)},
+    })
+
+
+@login_required
+@group_member_required(writable=True)
 def optimize_settlements_view(request, group_id):
     """Generate and display optimized settlement plan"""
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     # Recalculate balances to ensure accuracy
     calculate_group_balances(group)
     
@@ -89,11 +117,13 @@ def optimize_settlements_view(request, group_id):
                 created_settlements.append(settlement)
             
             # Log activity
-            Activity.objects.create(
+            log_activity(
                 user=request.user,
                 group=group,
                 activity_type='settlement_created',
-                description=f'Created {len(created_settlements)} optimized settlements (replaced {old_count} previous)'
+                description=f'Created {len(created_settlements)} optimized settlements (replaced {old_count} previous)',
+                count=len(created_settlements),
+                payload={'replaced': old_count}
             )
             
             messages.success(request, f'{len(created_settlements)} optimized settlements created successfully!')
@@ -113,15 +143,11 @@ def optimize_settlements_view(request, group_id):
 
 
 @login_required
+@group_member_required
 def settlement_list_view(request, group_id):
     """Show all settlements for a group"""
     group = get_object_or_404(Group, group_id=group_id)
     
-    # Check membership
-    if not GroupMember.objects.filter(group=group, user=request.user).exists():
-        messages.error(request, 'You are not a member of this group.')
-        return redirect('groups:list')
-    
     pending_settlements = Settlement.objects.filter(group=group, is_completed=False)
     completed_settlements = Settlement.objects.filter(group=group, is_completed=True)
     
@@ -144,21 +170,29 @@ def mark_settlement_complete_view(request, settlement_id):
         messages.error(request, 'Only payer or payee can mark settlement as complete.')
         return redirect('settlements:settlement_list', group_id=settlement.group.group_id)
     
+    if settlement.is_completed:
+        messages.info(request, 'Settlement is already complete.')
+        return redirect('settlements:settlement_list', group_id=settlement.group.group_id)
+    
     if request.method == 'POST':
         from django.utils import timezone
         
         settlement.is_completed = True
         settlement.completed_at = timezone.now()
-        settlement.save()
+        with transaction.atomic():
+            settlement.save()
+            post_settlement(settlement)
+        calculate_group_balances(settlement.group)
         
         messages.success(request, f'Settlement marked as complete!')
         
         # Log activity
-        Activity.objects.create(
+        log_activity(
             user=request.user,
             group=settlement.group,
             activity_type='settlement_completed',
-            description=f'{settlement.payer.name} paid {settlement.amount} {settlement.group.currency} to {settlement.payee.name}'
+            description=f'{settlement.payer.name} paid {settlement.amount} {settlement.group.currency} to {settlement.payee.name}',
+            payload=settlement_payload(settlement)
         )
     
     return redirect('settlements:settlement_list', group_id=settlement.group.group_id)
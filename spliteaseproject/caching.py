@@ -0,0 +1,20 @@
+"""
+Timeouts for caches that signals or commands invalidate.
+
+Invalidation only clears the cache of the process that runs it. With a
+process-local backend (LocMemCache) every other worker would keep its copy
+until it expired, so there entries are kept for a few seconds only. These
+caches therefore save queries only with a shared backend such as Redis;
+see CACHES in settings.
+"""
+from django.conf import settings
+
+LOCAL_CACHE_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+LOCAL_CACHE_TIMEOUT = 5
+
+
+def cache_timeout(timeout):
+    """`timeout` with a shared cache backend, a few seconds with a process-local one"""
+    if settings.CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+        return LOCAL_CACHE_TIMEOUT
+    return timeout
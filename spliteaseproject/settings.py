@@ -55,6 +55,7 @@ INSTALLED_APPS = [
     'channels',
     'chat',
     'budgets',
+    'jobs',
 ]
 
     
@@ -109,6 +110,25 @@ CHANNEL_LAYERS = {
 }
 
 
+# Cache (dashboard contexts and other per-user caches)
+# Memberships, budget interval indexes and FX rates are invalidated by
+# signals and commands that only reach their own process, so with LocMemCache
+# they are kept for seconds (spliteaseproject.caching) and barely save queries.
+# For production, point this at a shared backend such as Redis:
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+#         'LOCATION': 'redis://127.0.0.1:6379',
+#     }
+# }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -150,6 +170,13 @@ USE_I18N = True
 
 USE_TZ = True
 
+# Exchange rates in the fx_rates table are quoted against this currency
+FX_BASE_CURRENCY = 'USD'
+
+# Run background jobs as soon as they are queued instead of in `manage.py run_jobs`;
+# on by default in development so no worker is needed
+JOB_QUEUE_EAGER = os.getenv('JOB_QUEUE_EAGER', str(DEBUG)) == 'True'
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
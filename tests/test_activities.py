@@ -0,0 +1,251 @@
+from django.test import TestCase
+from users.models import User
+from groups.models import Group, GroupMember
+from activities.models import Activity, TimelineEntry
+from datetime import timedelta
+from decimal import Decimal
+from django.utils import timezone
+from activities.services import (
+    log_activity, trim_timelines, get_user_timeline, compact_activities, activity_totals, COALESCE_WINDOW
+)
+from activities.payloads import to_cents, format_cents, render_activities
+
+# Alternating types keep consecutive activities from being coalesced
+ALTERNATING_TYPES = ['expense_added', 'expense_deleted']
+
+
+class TestActivityTimeline(TestCase):
+    """TC22: Cross-group Activity Timeline"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email='timeline1@example.com',
+            password='Pass123',
+            name='Timeline User 1'
+        )
+        self.user2 = User.objects.create_user(
+            email='timeline2@example.com',
+            password='Pass123',
+            name='Timeline User 2'
+        )
+        self.group1 = Group.objects.create(name='Timeline Group 1', owner=self.user1)
+        self.group2 = Group.objects.create(name='Timeline Group 2', owner=self.user1)
+        GroupMember.objects.create(group=self.group1, user=self.user1, is_admin=True)
+        GroupMember.objects.create(group=self.group1, user=self.user2)
+        GroupMember.objects.create(group=self.group2, user=self.user1, is_admin=True)
+
+    def test_activity_fanned_out_to_members(self):
+        """TC22.1: Logging an activity writes one entry per member"""
+        activity = log_activity(self.user1, self.group1, 'expense_added', 'Added expense: Dinner (40.00)')
+        self.assertEqual(Activity.objects.count(), 1)
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(activity=activity).values_list('user_id', flat=True)),
+            {self.user1.user_id, self.user2.user_id}
+        )
+
+    def test_timeline_spans_groups(self):
+        """TC22.2: Timeline merges all of a user's groups, newest first"""
+        first = log_activity(self.user1, self.group1, 'expense_added', 'First')
+        second = log_activity(self.user1, self.group2, 'expense_added', 'Second')
+        entries, next_cursor = get_user_timeline(self.user1)
+        self.assertEqual([e.activity for e in entries], [second, first])
+        self.assertIsNone(next_cursor)
+        entries, _ = get_user_timeline(self.user2)
+        self.assertEqual([e.activity for e in entries], [first])
+
+    def test_timeline_cursor_pagination(self):
+        """TC22.3: Cursor returns the next older page"""
+        for i in range(5):
+            log_activity(self.user1, self.group2, ALTERNATING_TYPES[i % 2], f'Expense {i}')
+        page1, cursor = get_user_timeline(self.user1, limit=3)
+        page2, cursor2 = get_user_timeline(self.user1, before=cursor, limit=3)
+        self.assertEqual(len(page1), 3)
+        self.assertEqual(len(page2), 2)
+        self.assertIsNone(cursor2)
+        self.assertTrue(all(e.entry_id < cursor for e in page2))
+
+    def test_timeline_capped_per_user(self):
+        """TC22.4: Trimming keeps only the newest entries"""
+        for i in range(5):
+            log_activity(self.user1, self.group2, ALTERNATING_TYPES[i % 2], f'Expense {i}')
+        trim_timelines([self.user1.user_id], max_entries=2)
+        entries = TimelineEntry.objects.filter(user=self.user1)
+        self.assertEqual(entries.count(), 2)
+        self.assertEqual(
+            [e.activity.description for e in entries],
+            ['Expense 4', 'Expense 3']
+        )
+        self.assertEqual(Activity.objects.count(), 5)
+
+
+class TestActivityCoalescing(TestCase):
+    """TC23: Activity Coalescing and Compaction"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email='coalesce1@example.com',
+            password='Pass123',
+            name='Coalesce User 1'
+        )
+        self.user2 = User.objects.create_user(
+            email='coalesce2@example.com',
+            password='Pass123',
+            name='Coalesce User 2'
+        )
+        self.group = Group.objects.create(name='Coalesce Group', owner=self.user1)
+        GroupMember.objects.create(group=self.group, user=self.user1, is_admin=True)
+        GroupMember.objects.create(group=self.group, user=self.user2)
+
+    def test_burst_merged_into_one_row(self):
+        """TC23.1: Same-type burst by one user becomes one aggregated row"""
+        for i in range(12):
+            log_activity(self.user1, self.group, 'expense_added', f'Added expense: Item {i} (1.00)',
+                         related_expense_id=i)
+        activity = Activity.objects.get()
+        self.assertEqual(activity.count, 12)
+        self.assertEqual(activity.description, 'Added 12 expenses')
+        self.assertIsNone(activity.related_expense_id)
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+
+    def test_different_user_or_type_not_merged(self):
+        """TC23.2: Other users and other types start new rows"""
+        log_activity(self.user1, self.group, 'expense_added', 'One')
+        log_activity(self.user2, self.group, 'expense_added', 'Two')
+        log_activity(self.user1, self.group, 'member_joined', 'Three')
+        self.assertEqual(Activity.objects.count(), 3)
+
+    def test_outside_window_not_merged(self):
+        """TC23.3: Activities outside the window are kept separate"""
+        first = log_activity(self.user1, self.group, 'expense_added', 'One')
+        Activity.objects.filter(pk=first.pk).update(
+            timestamp=timezone.now() - COALESCE_WINDOW - timedelta(minutes=1)
+        )
+        log_activity(self.user1, self.group, 'expense_added', 'Two')
+        self.assertEqual(Activity.objects.count(), 2)
+
+    def test_counts_carried_through(self):
+        """TC23.4: Coalescing adds the supplied counts"""
+        log_activity(self.user1, self.group, 'settlement_created', 'Created 3', count=3)
+        log_activity(self.user1, self.group, 'settlement_created', 'Created 4', count=4)
+        activity = Activity.objects.get()
+        self.assertEqual(activity.count, 7)
+        self.assertEqual(activity.description, 'Created 7 optimized settlements')
+
+    def test_compaction_merges_old_rows_per_day(self):
+        """TC23.5: Compaction keeps one row per day with summed counts"""
+        old = (timezone.now() - timedelta(days=120)).replace(hour=9, minute=0)
+        for i in range(4):
+            Activity.objects.create(
+                user=self.user1, group=self.group, activity_type='expense_added',
+                description=f'Expense {i}', timestamp=old + timedelta(minutes=30 * i), count=2,
+                payload={'amount_cents': 100}
+            )
+        recent = log_activity(self.user1, self.group, 'expense_added', 'Recent')
+
+        removed = compact_activities(timezone.now() - timedelta(days=90))
+
+        self.assertEqual(removed, 3)
+        compacted = Activity.objects.exclude(pk=recent.pk).get()
+        self.assertEqual(compacted.count, 8)
+        self.assertEqual(compacted.description, 'Added 8 expenses')
+        self.assertEqual(compacted.payload, {'amount_cents': 400})
+        self.assertTrue(Activity.objects.filter(pk=recent.pk).exists())
+
+    def test_coalesced_activity_moves_to_top_of_timeline(self):
+        """TC23.6: A merged activity is re-fanned out ahead of newer entries"""
+        merged = log_activity(self.user1, self.group, 'expense_added', 'One')
+        other = log_activity(self.user2, self.group, 'member_joined', 'Two')
+        log_activity(self.user1, self.group, 'expense_added', 'Three')
+        for user in (self.user1, self.user2):
+            entries, _ = get_user_timeline(user)
+            self.assertEqual([entry.activity_id for entry in entries], [merged.pk, other.pk])
+
+    def test_compaction_sums_settlement_payloads(self):
+        """TC23.7: Compacted settlement rows keep how many settlements they replaced"""
+        old = (timezone.now() - timedelta(days=120)).replace(hour=9, minute=0)
+        for i, replaced in enumerate((2, 3)):
+            Activity.objects.create(
+                user=self.user1, group=self.group, activity_type='settlement_created',
+                description=f'Optimized {i}', timestamp=old + timedelta(minutes=30 * i), count=1,
+                payload={'replaced': replaced}
+            )
+
+        self.assertEqual(compact_activities(timezone.now() - timedelta(days=90)), 1)
+        compacted = render_activities(Activity.objects.select_related('group'))[0]
+        self.assertEqual(compacted.payload, {'replaced': 5})
+        self.assertEqual(compacted.display, 'Created 2 optimized settlements (replaced 5 previous)')
+
+
+class TestActivityPayloads(TestCase):
+    """TC24: Structured Activity Payloads"""
+
+    def setUp(self):
+        self.user1 = User.objects.create_user(
+            email='payload1@example.com',
+            password='Pass123',
+            name='Payload User 1'
+        )
+        self.user2 = User.objects.create_user(
+            email='payload2@example.com',
+            password='Pass123',
+            name='Payload User 2'
+        )
+        self.group = Group.objects.create(name='Payload Group', owner=self.user1, currency='EUR')
+        GroupMember.objects.create(group=self.group, user=self.user1, is_admin=True)
+        GroupMember.objects.create(group=self.group, user=self.user2)
+
+    def test_cents_conversion(self):
+        """TC24.1: Amounts are stored as integer cents"""
+        self.assertEqual(to_cents(Decimal('12.34')), 1234)
+        self.assertEqual(to_cents('0.05'), 5)
+        self.assertEqual(format_cents(1234), '12.34')
+
+    def test_feed_rendered_from_payload(self):
+        """TC24.2: Display text is built from typed fields"""
+        log_activity(
+            self.user1, self.group, 'settlement_completed', 'stale text',
+            payload={'amount_cents': 2550, 'payer_id': self.user2.user_id, 'payee_id': self.user1.user_id}
+        )
+        activity = render_activities(Activity.objects.select_related('group'))[0]
+        self.assertEqual(activity.display, 'Payload User 2 paid 25.50 EUR to Payload User 1')
+
+    def test_coalesced_payload_keeps_totals(self):
+        """TC24.3: Coalesced rows sum their amounts"""
+        log_activity(self.user1, self.group, 'expense_added', 'A', payload={'expense_id': 1, 'amount_cents': 1000, 'title': 'A'})
+        log_activity(self.user1, self.group, 'expense_added', 'B', payload={'expense_id': 2, 'amount_cents': 250, 'title': 'B'})
+        activity = render_activities(Activity.objects.select_related('group'))[0]
+        self.assertEqual(activity.payload, {'amount_cents': 1250})
+        self.assertEqual(activity.display, 'Added 2 expenses totalling 12.50 EUR')
+
+    def test_activity_totals_by_type(self):
+        """TC24.4: Per-type totals aggregate payload amounts"""
+        log_activity(self.user1, self.group, 'expense_added', 'A', payload={'amount_cents': 1000})
+        log_activity(self.user2, self.group, 'expense_added', 'B', payload={'amount_cents': 500})
+        log_activity(self.user2, self.group, 'member_joined', 'C', payload={'member_id': self.user1.user_id})
+        self.assertEqual(
+            activity_totals(self.group, 'expense_added'),
+            {'count': 2, 'amount_cents': 1500}
+        )
+
+    def test_legacy_rows_use_description(self):
+        """TC24.5: Rows without a payload render their description"""
+        Activity.objects.create(user=self.user1, group=self.group, activity_type='member_joined',
+                                description='Added someone to the group')
+        activity = render_activities(Activity.objects.select_related('group'))[0]
+        self.assertEqual(activity.display, 'Added someone to the group')
+
+    def test_expense_payload_in_group_currency(self):
+        """TC24.6: Expenses paid in another currency are rendered converted"""
+        from datetime import date
+        from expenses.fx import invalidate_rates
+        from expenses.models import Expense, FxRate
+        from activities.payloads import expense_payload
+        FxRate.objects.create(currency='EUR', date=date(2025, 6, 1), rate=Decimal('1.25'))
+        invalidate_rates()
+        expense = Expense.objects.create(
+            group=self.group, payer=self.user1, amount=Decimal('50.00'), currency='USD',
+            description='Museum', date=date(2025, 6, 2)
+        )
+        log_activity(self.user1, self.group, 'expense_added', 'stale text', payload=expense_payload(expense))
+        activity = render_activities(Activity.objects.select_related('group'))[0]
+        self.assertEqual(activity.display, 'Added expense: Museum (40.00 EUR)')
@@ -0,0 +1,400 @@
+from datetime import date
+from io import StringIO
+from decimal import Decimal
+import numpy as np
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from users.models import User
+from groups.models import Group, GroupMember
+from expenses.models import Expense, Category
+from budgets.models import BudgetPlan, BudgetItem, BudgetAlert
+from budgets.spending import refresh_budget_spending
+from budgets.intervals import BudgetIntervalIndex, active_budget_ids
+from budgets.rollover import roll_over_budgets, add_months
+from budgets.forecast import project, run_forecasts, group_forecasts
+
+
+class TestBudgetSpending(TestCase):
+    """TC28: Budget Spending Calculation"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='budget@example.com',
+            password='Pass123',
+            name='Budget User'
+        )
+        self.group = Group.objects.create(name='Budget Group', owner=self.user)
+        GroupMember.objects.create(group=self.group, user=self.user, is_admin=True)
+        self.food = Category.objects.create(name='Budget Food')
+        self.fuel = Category.objects.create(name='Budget Fuel')
+        self.budget = BudgetPlan.objects.create(
+            group=self.group,
+            name='January',
+            start_date=date(2025, 1, 1),
+            end_date=date(2025, 1, 31)
+        )
+        self.food_item = BudgetItem.objects.create(
+            budget=self.budget, category=self.food, budget_amount=Decimal('100.00')
+        )
+        self.fuel_item = BudgetItem.objects.create(
+            budget=self.budget, category=self.fuel, budget_amount=Decimal('50.00')
+        )
+
+    def add_expense(self, amount, category, day=date(2025, 1, 10)):
+        return Expense.objects.create(
+            group=self.group,
+            payer=self.user,
+            amount=Decimal(amount),
+            description='Budget expense',
+            date=day,
+            category=category
+        )
+
+    def test_detail_view_does_not_write(self):
+        """TC28.1: Viewing a budget shows spending without saving items"""
+        self.add_expense('30.00', self.food)
+        BudgetItem.objects.update(spent_amount=0)  # Stale stored value
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/budgets/detail/{self.budget.budget_id}/')
+        self.assertEqual(response.status_code, 200)
+        items = {item.category_id: item.spent_amount for item in response.context['items']}
+        self.assertEqual(items[self.food.category_id], Decimal('30.00'))
+        writes = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "budget_items"')]
+        self.assertEqual(writes, [])
+        self.food_item.refresh_from_db()
+        self.assertEqual(self.food_item.spent_amount, Decimal('0'))
+
+    def test_refresh_writes_only_changed_items(self):
+        """TC28.2: Only items whose spending changed are updated"""
+        self.add_expense('30.00', self.food)
+        self.add_expense('99.00', self.food, day=date(2025, 2, 1))
+        BudgetItem.objects.update(spent_amount=0)  # Drift from the incremental path
+        changed = refresh_budget_spending(self.budget)
+        self.assertEqual([item.item_id for item in changed], [self.food_item.item_id])
+        self.food_item.refresh_from_db()
+        self.assertEqual(self.food_item.spent_amount, Decimal('30.00'))
+        self.assertEqual(refresh_budget_spending(self.budget), [])
+
+    def test_refresh_raises_alerts(self):
+        """TC28.3: Crossing threshold and limit creates alerts"""
+        self.add_expense('60.00', self.fuel)
+        BudgetItem.objects.update(spent_amount=0)
+        BudgetAlert.objects.all().delete()
+        refresh_budget_spending(self.budget)
+        self.assertEqual(
+            sorted(BudgetAlert.objects.filter(budget_item=self.fuel_item).values_list('alert_type', flat=True)),
+            ['over', 'threshold']
+        )
+
+
+class TestIncrementalBudgetTracking(TestCase):
+    """TC29: Incremental Budget Tracking"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='budgettrack@example.com',
+            password='Pass123',
+            name='Budget Tracker'
+        )
+        self.group = Group.objects.create(name='Tracking Group', owner=self.user)
+        self.food = Category.objects.create(name='Tracking Food')
+        self.fuel = Category.objects.create(name='Tracking Fuel')
+        self.january = BudgetPlan.objects.create(
+            group=self.group, name='January', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)
+        )
+        self.quarter = BudgetPlan.objects.create(
+            group=self.group, name='Q1', period='quarterly', start_date=date(2025, 1, 1), end_date=date(2025, 3, 31)
+        )
+        self.january_food = BudgetItem.objects.create(
+            budget=self.january, category=self.food, budget_amount=Decimal('100.00')
+        )
+        self.quarter_food = BudgetItem.objects.create(
+            budget=self.quarter, category=self.food, budget_amount=Decimal('300.00')
+        )
+        cache.clear()
+
+    def add_expense(self, amount, day=date(2025, 1, 10), category=None):
+        return Expense.objects.create(
+            group=self.group,
+            payer=self.user,
+            amount=Decimal(amount),
+            description='Tracked expense',
+            date=day,
+            category=category or self.food
+        )
+
+    def spent(self, item):
+        item.refresh_from_db()
+        return item.spent_amount
+
+    def test_create_updates_overlapping_budgets(self):
+        """TC29.1: New expense adds to every covering budget"""
+        self.add_expense('40.00')
+        self.add_expense('10.00', day=date(2025, 2, 10))
+        self.assertEqual(self.spent(self.january_food), Decimal('40.00'))
+        self.assertEqual(self.spent(self.quarter_food), Decimal('50.00'))
+
+    def test_edit_and_delete_apply_deltas(self):
+        """TC29.2: Edits move spend and deletes remove it"""
+        expense = self.add_expense('40.00')
+        expense.amount = Decimal('25.00')
+        expense.save()
+        self.assertEqual(self.spent(self.january_food), Decimal('25.00'))
+        expense.date = date(2025, 2, 10)
+        expense.save()
+        self.assertEqual(self.spent(self.january_food), Decimal('0.00'))
+        self.assertEqual(self.spent(self.quarter_food), Decimal('25.00'))
+        expense.delete()
+        self.assertEqual(self.spent(self.quarter_food), Decimal('0.00'))
+
+    def test_alerts_on_crossing_only(self):
+        """TC29.3: Alerts fire once when a threshold is crossed"""
+        self.add_expense('50.00')
+        self.assertFalse(BudgetAlert.objects.filter(budget_item=self.january_food).exists())
+        self.add_expense('35.00')
+        self.add_expense('5.00')
+        self.assertEqual(
+            list(BudgetAlert.objects.filter(budget_item=self.january_food).values_list('alert_type', flat=True)),
+            ['threshold']
+        )
+        self.add_expense('20.00')
+        self.assertEqual(
+            BudgetAlert.objects.filter(budget_item=self.january_food, alert_type='over').count(), 1
+        )
+
+    def test_uncategorized_expense_ignored(self):
+        """TC29.4: Expenses without a category leave budgets untouched"""
+        Expense.objects.create(
+            group=self.group, payer=self.user, amount=Decimal('10.00'),
+            description='No category', date=date(2025, 1, 10)
+        )
+        self.assertEqual(self.spent(self.january_food), Decimal('0.00'))
+
+    def test_new_budget_counts_existing_expenses(self):
+        """TC29.5: A budget created mid-period starts from the spending already recorded"""
+        self.add_expense('45.00', day=date(2025, 2, 3))
+        GroupMember.objects.create(group=self.group, user=self.user, is_admin=True)
+        self.client.force_login(self.user)
+        self.client.post(f'/budgets/create/{self.group.group_id}/', {
+            'name': 'February', 'period': 'monthly', 'start_date': '2025-02-01', 'end_date': '2025-02-28',
+            f'category_{self.food.category_id}': '50.00',
+        })
+        item = BudgetItem.objects.get(budget__name='February')
+        self.assertEqual(item.spent_amount, Decimal('45.00'))
+        self.assertEqual(list(item.alerts.values_list('alert_type', flat=True)), ['threshold'])
+
+    def test_reconcile_fixes_drift(self):
+        """TC29.6: Reconciliation recomputes spending that bypassed the deltas"""
+        self.add_expense('40.00')
+        BudgetItem.objects.filter(pk=self.january_food.pk).update(spent_amount=Decimal('1.00'))
+        call_command('reconcile_budget_spending', stdout=StringIO())
+        self.assertEqual(self.spent(self.january_food), Decimal('40.00'))
+
+
+class TestBudgetIntervalIndex(TestCase):
+    """TC30: Active Budget Interval Index"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='intervals@example.com',
+            password='Pass123',
+            name='Interval User'
+        )
+        self.group = Group.objects.create(name='Interval Group', owner=self.user)
+        cache.clear()
+
+    def test_index_lookup(self):
+        """TC30.1: Lookup returns every period covering the date"""
+        index = BudgetIntervalIndex([
+            (1, date(2025, 1, 1), date(2025, 1, 31)),
+            (2, date(2025, 2, 1), date(2025, 2, 28)),
+            (3, date(2025, 1, 1), date(2025, 3, 31)),
+        ])
+        self.assertEqual(index.covering(date(2024, 12, 31)), ())
+        self.assertEqual(index.covering(date(2025, 1, 1)), (1, 3))
+        self.assertEqual(index.covering(date(2025, 1, 31)), (1, 3))
+        self.assertEqual(index.covering(date(2025, 2, 15)), (2, 3))
+        self.assertEqual(index.covering(date(2025, 3, 31)), (3,))
+        self.assertEqual(index.covering(date(2025, 4, 1)), ())
+
+    def test_cached_index_invalidated_on_budget_change(self):
+        """TC30.2: Index is cached and rebuilt after budget writes"""
+        january = BudgetPlan.objects.create(
+            group=self.group, name='January', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)
+        )
+        self.assertEqual(active_budget_ids(self.group.group_id, date(2025, 1, 5)), (january.budget_id,))
+        with CaptureQueriesContext(connection) as ctx:
+            active_budget_ids(self.group.group_id, date(2025, 1, 6))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        january.end_date = date(2025, 1, 4)
+        january.save()
+        self.assertEqual(active_budget_ids(self.group.group_id, date(2025, 1, 5)), ())
+
+    def test_expense_outside_budgets_skips_item_lookup(self):
+        """TC30.3: Expenses on dates with no budget do not query budget items"""
+        BudgetPlan.objects.create(
+            group=self.group, name='January', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)
+        )
+        category = Category.objects.create(name='Interval Food')
+        active_budget_ids(self.group.group_id, date(2025, 1, 1))
+        with CaptureQueriesContext(connection) as ctx:
+            Expense.objects.create(
+                group=self.group, payer=self.user, amount=Decimal('5.00'),
+                description='Outside budgets', date=date(2025, 6, 1), category=category
+            )
+        self.assertFalse(any('budget_items' in q['sql'] for q in ctx.captured_queries))
+
+
+class TestBudgetRollover(TestCase):
+    """TC31: Budget Period Rollover"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='rollover@example.com',
+            password='Pass123',
+            name='Rollover User'
+        )
+        self.group = Group.objects.create(name='Rollover Group', owner=self.user)
+        self.food = Category.objects.create(name='Rollover Food')
+        self.january = BudgetPlan.objects.create(
+            group=self.group, name='Household', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31)
+        )
+        self.item = BudgetItem.objects.create(
+            budget=self.january, category=self.food, budget_amount=Decimal('100.00'),
+            spent_amount=Decimal('60.00'), alert_percentage=90
+        )
+        cache.clear()
+
+    def test_add_months_clamps_day(self):
+        """TC31.1: Month arithmetic clamps to the end of shorter months"""
+        self.assertEqual(add_months(date(2025, 1, 31), 1), date(2025, 2, 28))
+        self.assertEqual(add_months(date(2025, 11, 15), 3), date(2026, 2, 15))
+
+    def test_rollover_creates_next_period(self):
+        """TC31.2: Next period copies the template's items"""
+        self.assertEqual(roll_over_budgets(date(2025, 2, 1)), 1)
+        february = BudgetPlan.objects.get(group=self.group, start_date=date(2025, 2, 1))
+        self.assertEqual(february.end_date, date(2025, 2, 28))
+        item = february.items.get()
+        self.assertEqual(item.budget_amount, Decimal('100.00'))
+        self.assertEqual(item.spent_amount, Decimal('0'))
+        self.assertEqual(item.alert_percentage, 90)
+
+    def test_rollover_carry_over(self):
+        """TC31.3: Unspent amounts are carried over on request"""
+        roll_over_budgets(date(2025, 2, 1), carry_over=True)
+        february = BudgetPlan.objects.get(group=self.group, start_date=date(2025, 2, 1))
+        self.assertEqual(february.items.get().budget_amount, Decimal('140.00'))
+
+    def test_rollover_is_idempotent(self):
+        """TC31.4: Periods still running are not rolled over"""
+        self.assertEqual(roll_over_budgets(date(2025, 1, 31)), 0)
+        roll_over_budgets(date(2025, 2, 1))
+        self.assertEqual(roll_over_budgets(date(2025, 2, 1)), 0)
+        self.assertEqual(BudgetPlan.objects.filter(group=self.group).count(), 2)
+
+    def test_missed_periods_caught_up(self):
+        """TC31.5: One run rolls forward through every missed period"""
+        self.assertEqual(roll_over_budgets(date(2025, 4, 15)), 3)
+        self.assertEqual(
+            list(BudgetPlan.objects.filter(group=self.group).order_by('start_date').values_list('end_date', flat=True)),
+            [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)]
+        )
+
+    def test_new_periods_seeded_with_spend(self):
+        """TC31.6: Expenses already dated in a new period count toward it"""
+        for day, amount in ((date(2025, 2, 10), '30.00'), (date(2025, 2, 20), '100.00'), (date(2025, 3, 5), '5.00')):
+            Expense.objects.create(
+                group=self.group, payer=self.user, amount=Decimal(amount),
+                description='Early expense', date=day, category=self.food
+            )
+        roll_over_budgets(date(2025, 3, 1), carry_over=True)
+        february = BudgetItem.objects.get(budget__start_date=date(2025, 2, 1))
+        self.assertEqual((february.spent_amount, february.budget_amount), (Decimal('130.00'), Decimal('140.00')))
+        self.assertEqual(list(february.alerts.values_list('alert_type', flat=True)), ['threshold'])
+        # March carries over February's seeded remainder, not its whole budget
+        march = BudgetItem.objects.get(budget__start_date=date(2025, 3, 1))
+        self.assertEqual((march.spent_amount, march.budget_amount), (Decimal('5.00'), Decimal('150.00')))
+
+class TestBudgetForecast(TestCase):
+    """TC32: Budget Spend Forecasting"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='forecast@example.com',
+            password='Pass123',
+            name='Forecast User'
+        )
+        self.group = Group.objects.create(name='Forecast Group', owner=self.user)
+        self.food = Category.objects.create(name='Forecast Food')
+        # June 2025 starts on a Sunday and has 30 days
+        self.budget = BudgetPlan.objects.create(
+            group=self.group, name='June', start_date=date(2025, 6, 1), end_date=date(2025, 6, 30)
+        )
+        self.item = BudgetItem.objects.create(
+            budget=self.budget, category=self.food, budget_amount=Decimal('250.00')
+        )
+        cache.clear()
+
+    def add_expense(self, amount, day):
+        return Expense.objects.create(
+            group=self.group, payer=self.user, amount=Decimal(amount),
+            description='Forecast expense', date=day, category=self.food
+        )
+
+    def test_linear_and_seasonal_projection(self):
+        """TC32.1: Steady spending projects linearly under both baselines"""
+        matrix = np.full((1, 30), 500.0)
+        spent, linear, seasonal = project(matrix, np.array([10]), np.array([30]), np.array([6]))
+        self.assertEqual(spent[0], 5000)
+        self.assertAlmostEqual(linear[0], 15000)
+        self.assertAlmostEqual(seasonal[0], 15000)
+
+    def test_seasonal_projection_follows_weekdays(self):
+        """TC32.2: Weekend-only spending projects onto remaining weekends"""
+        matrix = np.zeros((1, 19))
+        # Period starts on a Monday; 70.00 spent on each of the first two Saturdays,
+        # and the five remaining days run Monday to Friday
+        matrix[0, [5, 12]] = 7000
+        spent, linear, seasonal = project(matrix, np.array([14]), np.array([19]), np.array([0]))
+        self.assertAlmostEqual(linear[0], 14000 + 5 * 1000)
+        self.assertAlmostEqual(seasonal[0], 14000 + 5 * 500)
+
+    def test_forecast_and_predictive_alert(self):
+        """TC32.3: Projected overspend raises one predictive alert"""
+        for day in range(1, 11):
+            self.add_expense('10.00', date(2025, 6, day))
+        items, alerts = run_forecasts(date(2025, 6, 10))
+        self.assertEqual((items, alerts), (1, 1))
+        self.assertEqual(group_forecasts(self.group, date(2025, 6, 10))[self.item.item_id], Decimal('300.00'))
+        alert = BudgetAlert.objects.get(budget_item=self.item, alert_type='forecast')
+        self.assertIn('projected', alert.message)
+        self.assertEqual(run_forecasts(date(2025, 6, 10)), (1, 0))
+
+    def test_forecast_cache_follows_ledger_version(self):
+        """TC32.4: Cached forecasts are replaced after an expense write"""
+        self.add_expense('10.00', date(2025, 6, 1))
+        self.group.refresh_from_db()
+        first = group_forecasts(self.group, date(2025, 6, 10))[self.item.item_id]
+        self.add_expense('90.00', date(2025, 6, 2))
+        self.group.refresh_from_db()
+        second = group_forecasts(self.group, date(2025, 6, 10))[self.item.item_id]
+        self.assertGreater(second, first)
+
+    def test_forecast_cache_follows_budget_edits(self):
+        """TC32.5: Changing a budget's period replaces its cached forecast"""
+        for day in range(1, 11):
+            self.add_expense('10.00', date(2025, 6, day))
+        self.group.refresh_from_db()
+        self.assertEqual(group_forecasts(self.group, date(2025, 6, 10))[self.item.item_id], Decimal('300.00'))
+        self.budget.end_date = date(2025, 6, 20)
+        self.budget.save()
+        self.assertEqual(group_forecasts(self.group, date(2025, 6, 10))[self.item.item_id], Decimal('200.00'))
+        fuel = Category.objects.create(name='Forecast Fuel')
+        item = BudgetItem.objects.create(budget=self.budget, category=fuel, budget_amount=Decimal('50.00'))
+        self.assertIn(item.item_id, group_forecasts(self.group, date(2025, 6, 10)))
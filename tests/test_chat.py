@@ -0,0 +1,44 @@
+from django.test import TestCase
+from django.core.cache import cache
+from users.models import User
+from groups.models import Group, GroupMember
+from chat.models import UserActivity
+
+
+class TestAsyncChatEndpoints(TestCase):
+    """TC46: Async Chat and Balance JSON Endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(email='asyncowner@example.com', password='Pass123', name='Async Owner')
+        self.outsider = User.objects.create_user(email='asyncout@example.com', password='Pass123', name='Async Outsider')
+        self.group = Group.objects.create(name='Async Group', owner=self.owner)
+        GroupMember.objects.create(group=self.group, user=self.owner, is_admin=True)
+
+    async def test_send_and_poll_messages(self):
+        """TC46.1: Sending and polling run on the async client and mark the member online"""
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.post(f'/chat/send/{self.group.group_id}/', {'message': 'Hello'})
+        self.assertEqual(response.status_code, 200)
+        sent = response.json()['message']
+        self.assertEqual((sent['sender'], sent['content']), ('Async Owner', 'Hello'))
+        self.assertEqual((await self.async_client.post(f'/chat/send/{self.group.group_id}/', {'message': ' '})).status_code, 400)
+
+        response = await self.async_client.get(f'/chat/messages/{self.group.group_id}/', {'last_id': 0})
+        self.assertEqual([m['id'] for m in response.json()['messages']], [sent['id']])
+        response = await self.async_client.get(f'/chat/messages/{self.group.group_id}/', {'last_id': sent['id']})
+        self.assertEqual(response.json()['messages'], [])
+        self.assertEqual(await UserActivity.objects.filter(group=self.group, user=self.owner, is_online=True).acount(), 1)
+
+        response = await self.async_client.get(f'/chat/online/{self.group.group_id}/')
+        self.assertEqual(response.json()['members'], [{'user__user_id': self.owner.user_id, 'user__name': 'Async Owner'}])
+
+    async def test_async_views_check_membership(self):
+        """TC46.2: Non-members and anonymous users are turned away from async chat views"""
+        response = await self.async_client.get(f'/chat/messages/{self.group.group_id}/')
+        self.assertEqual(response.status_code, 302)
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(f'/chat/messages/{self.group.group_id}/')
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.post(f'/chat/send/{self.group.group_id}/', {'message': 'Hi'})
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,145 @@
+from datetime import date
+from decimal import Decimal
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from users.models import User
+from users.dashboard import _month_starts, get_dashboard_context, _lock_key, ledger_fingerprint
+from groups.models import Group, GroupMember
+from expenses.models import Expense, Category
+
+
+class TestDashboardAnalytics(TestCase):
+    """TC25: Dashboard Analytics"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='dash@example.com',
+            password='Pass123',
+            name='Dashboard User'
+        )
+        self.category = Category.objects.create(name='Dashboard Food')
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def add_group(self, name, amount):
+        group = Group.objects.create(name=name, owner=self.user)
+        GroupMember.objects.create(group=group, user=self.user, is_admin=True)
+        Expense.objects.create(
+            group=group,
+            payer=self.user,
+            amount=Decimal(amount),
+            description=f'{name} expense',
+            category=self.category
+        )
+        return group
+
+    def dashboard_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response
+
+    def test_month_starts_are_calendar_months(self):
+        """TC25.1: Months step back by calendar month across years"""
+        self.assertEqual(
+            _month_starts(date(2025, 3, 31), 6),
+            [date(2024, 10, 1), date(2024, 11, 1), date(2024, 12, 1),
+             date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)]
+        )
+
+    def test_query_count_independent_of_groups(self):
+        """TC25.2: Dashboard query count does not grow with group count"""
+        self.add_group('Dash Group 1', '10.00')
+        baseline, _ = self.dashboard_queries()
+        for i in range(2, 6):
+            self.add_group(f'Dash Group {i}', '10.00')
+        queries, _ = self.dashboard_queries()
+        self.assertEqual(queries, baseline)
+
+    def test_totals(self):
+        """TC25.3: Summary totals cover all groups"""
+        self.add_group('Dash Group A', '10.50')
+        self.add_group('Dash Group B', '20.25')
+        _, response = self.dashboard_queries()
+        self.assertEqual(response.context['total_expenses'], Decimal('30.75'))
+        self.assertEqual(response.context['total_groups'], 2)
+        self.assertEqual(response.context['total_members'], 2)
+        self.assertEqual(response.context['spending'], '[0.0, 0.0, 0.0, 0.0, 0.0, 30.75]')
+
+
+    def test_spenders_sharing_a_name_keep_separate_bars(self):
+        """TC25.4: Top spenders are totalled per member, not per display name"""
+        group = self.add_group('Dash Group Twins', '10.00')
+        twin = User.objects.create_user(email='dashtwin@example.com', password='Pass123', name='Dashboard User')
+        GroupMember.objects.create(group=group, user=twin)
+        Expense.objects.create(group=group, payer=twin, amount=Decimal('4.00'), description='Twin expense')
+        _, response = self.dashboard_queries()
+        self.assertEqual(response.context['spender_names'], '["Dashboard User", "Dashboard User"]')
+        self.assertEqual(response.context['spender_amounts'], '[10.0, 4.0]')
+
+class TestDashboardCache(TestCase):
+    """TC27: Dashboard Cache Invalidation"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='dashcache@example.com',
+            password='Pass123',
+            name='Dashboard Cache User'
+        )
+        self.other = User.objects.create_user(
+            email='dashcache2@example.com',
+            password='Pass123',
+            name='Dashboard Cache Other'
+        )
+        self.group = Group.objects.create(name='Cache Group', owner=self.user)
+        GroupMember.objects.create(group=self.group, user=self.user, is_admin=True)
+        cache.clear()
+
+    def add_expense(self, amount):
+        return Expense.objects.create(
+            group=self.group,
+            payer=self.user,
+            amount=Decimal(amount),
+            description='Cached expense'
+        )
+
+    def test_cached_context_is_single_lookup(self):
+        """TC27.1: A warm cache costs only the version lookup"""
+        get_dashboard_context(self.user)
+        with CaptureQueriesContext(connection) as ctx:
+            get_dashboard_context(self.user)
+        self.assertEqual(len(ctx.captured_queries), 1)
+
+    def test_expense_write_invalidates(self):
+        """TC27.2: Expense writes rebuild the dashboard"""
+        self.assertEqual(get_dashboard_context(self.user)['total_expenses'], Decimal('0'))
+        expense = self.add_expense('12.00')
+        self.assertEqual(get_dashboard_context(self.user)['total_expenses'], Decimal('12.00'))
+        expense.delete()
+        self.assertEqual(get_dashboard_context(self.user)['total_expenses'], Decimal('0'))
+
+    def test_membership_write_invalidates(self):
+        """TC27.3: Membership changes rebuild the dashboard"""
+        self.assertEqual(get_dashboard_context(self.user)['total_members'], 1)
+        GroupMember.objects.create(group=self.group, user=self.other)
+        self.assertEqual(get_dashboard_context(self.user)['total_members'], 2)
+
+    def test_stale_served_while_rebuilding(self):
+        """TC27.4: Stale context is served while another request rebuilds"""
+        get_dashboard_context(self.user)
+        self.add_expense('5.00')
+        cache.add(_lock_key(self.user), True)
+        self.assertEqual(get_dashboard_context(self.user)['total_expenses'], Decimal('0'))
+        cache.delete(_lock_key(self.user))
+        self.assertEqual(get_dashboard_context(self.user)['total_expenses'], Decimal('5.00'))
+
+    def test_group_edit_and_new_month_invalidate(self):
+        """TC27.5: Renaming a group rebuilds the dashboard, and the key changes with the month"""
+        self.assertEqual(get_dashboard_context(self.user)['groups'][0].group.name, 'Cache Group')
+        self.group.name = 'Renamed Group'
+        self.group.save()
+        self.assertEqual(get_dashboard_context(self.user)['groups'][0].group.name, 'Renamed Group')
+        self.assertEqual(ledger_fingerprint(self.user)[0], now().date().replace(day=1))
@@ -3,7 +3,9 @@ from django.core.exceptions import ValidationError
 from decimal import Decimal
 from users.models import User
 from groups.models import Group
-from expenses.models import Expense, ExpenseParticipant
+from datetime import date
+from expenses.models import Expense, ExpenseParticipant, Category, SpendingRollup
+from expenses.rollups import rebuild_rollups, spending_by_category
 
 
 class TestExpenseCreation(TestCase):
@@ -253,4 +255,439 @@ class TestExpenseEditDelete(TestCase):
         expense_id = self.expense.expense_id
         self.expense.delete()
         
-        self.assertFalse(ExpenseParticipant.objects.filter(expense_id=expense_id).exists())
\ No newline at end of file
+        self.assertFalse(ExpenseParticipant.objects.filter(expense_id=expense_id).exists())
+
+class TestSpendingRollups(TestCase):
+    """TC26: Monthly Spending Rollups"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            email='rollup@example.com',
+            password='Pass123',
+            name='Rollup Owner'
+        )
+        self.group = Group.objects.create(name='Rollup Group', owner=self.owner)
+        self.food = Category.objects.create(name='Rollup Food')
+        self.travel = Category.objects.create(name='Rollup Travel')
+
+    def add_expense(self, amount, day, category=None):
+        return Expense.objects.create(
+            group=self.group,
+            payer=self.owner,
+            amount=Decimal(amount),
+            description='Rollup expense',
+            date=day,
+            category=category or self.food
+        )
+
+    def rollup_totals(self):
+        return {
+            (r.category_id, r.month): (r.total_cents, r.count)
+            for r in SpendingRollup.objects.filter(group=self.group)
+        }
+
+    def test_rollup_tracks_create(self):
+        """TC26.1: Creating expenses adds to the month's rollup"""
+        self.add_expense('10.00', date(2025, 1, 5))
+        self.add_expense('2.50', date(2025, 1, 20))
+        self.assertEqual(self.rollup_totals(), {(self.food.category_id, date(2025, 1, 1)): (1250, 2)})
+
+    def test_rollup_tracks_edit_and_delete(self):
+        """TC26.2: Edits move amounts between rollups and deletes remove them"""
+        expense = self.add_expense('10.00', date(2025, 1, 5))
+        expense.amount = Decimal('15.00')
+        expense.date = date(2025, 2, 1)
+        expense.category = self.travel
+        expense.save()
+        self.assertEqual(self.rollup_totals(), {(self.travel.category_id, date(2025, 2, 1)): (1500, 1)})
+        expense.delete()
+        self.assertEqual(self.rollup_totals(), {})
+
+    def test_rebuild_matches_incremental(self):
+        """TC26.3: Backfill reproduces the incrementally maintained rollups"""
+        self.add_expense('10.00', date(2025, 1, 5))
+        self.add_expense('7.25', date(2025, 3, 9), self.travel)
+        incremental = self.rollup_totals()
+        SpendingRollup.objects.all().delete()
+        rebuild_rollups([self.group.group_id])
+        self.assertEqual(self.rollup_totals(), incremental)
+
+    def test_spending_by_category_with_partial_months(self):
+        """TC26.4: Ranges mix whole-month rollups with partial-month expenses"""
+        self.add_expense('1.00', date(2025, 1, 10))   # before range
+        self.add_expense('2.00', date(2025, 1, 20))   # partial first month
+        self.add_expense('4.00', date(2025, 2, 14))   # whole month
+        self.add_expense('8.00', date(2025, 3, 15))   # partial last month
+        self.add_expense('16.00', date(2025, 3, 16))  # after range
+        self.assertEqual(
+            spending_by_category(self.group, date(2025, 1, 15), date(2025, 3, 15)),
+            {self.food.category_id: 1400}
+        )
+        self.assertEqual(
+            spending_by_category(self.group, date(2025, 2, 1), date(2025, 2, 28)),
+            {self.food.category_id: 400}
+        )
+
+
+class TestExpenseEditDiff(TestCase):
+    """TC39: Diff-based Expense Edits"""
+
+    def setUp(self):
+        from groups.models import GroupMember
+        self.payer = User.objects.create_user(email='diffpayer@example.com', password='Pass123', name='Diff Payer')
+        self.friend = User.objects.create_user(email='difffriend@example.com', password='Pass123', name='Diff Friend')
+        self.other = User.objects.create_user(email='diffother@example.com', password='Pass123', name='Diff Other')
+        self.group = Group.objects.create(name='Diff Group', owner=self.payer)
+        self.members = [
+            GroupMember.objects.create(group=self.group, user=user)
+            for user in (self.payer, self.friend, self.other)
+        ]
+        self.client.force_login(self.payer)
+        self.client.post(f'/expenses/add/{self.group.group_id}/', self.form_data('Dinner', '30.00', self.members))
+        self.expense = Expense.objects.get(group=self.group)
+
+    def form_data(self, description, amount, members):
+        return {
+            'amount': amount,
+            'description': description,
+            'date': '2025-03-01',
+            'split_type': 'equal',
+            'participants': [member.member_id for member in members],
+        }
+
+    def edit(self, description, amount, members):
+        response = self.client.post(f'/expenses/edit/{self.expense.expense_id}/', self.form_data(description, amount, members))
+        self.assertEqual(response.status_code, 302)
+
+    def test_description_only_skips_balance_work(self):
+        """TC39.1: Renaming keeps participant rows, ledger and balances untouched"""
+        from settlements.models import Balance, LedgerEntry
+        participants = set(self.expense.participants.values_list('participant_id', 'amount'))
+        entries = LedgerEntry.objects.count()
+        balances = set(Balance.objects.filter(group=self.group).values_list('balance_id', flat=True))
+        self.edit('Team dinner', '30.00', self.members)
+        self.assertEqual(set(self.expense.participants.values_list('participant_id', 'amount')), participants)
+        self.assertEqual(LedgerEntry.objects.count(), entries)
+        self.assertEqual(set(Balance.objects.filter(group=self.group).values_list('balance_id', flat=True)), balances)
+
+    def test_changed_participants_diffed(self):
+        """TC39.2: Dropping a participant updates the rest in place"""
+        from settlements.ledger import group_net_balances
+        kept = dict(self.expense.participants.filter(user=self.friend).values_list('user_id', 'participant_id'))
+        self.edit('Dinner', '30.00', self.members[:2])
+        participants = {p.user_id: p for p in self.expense.participants.all()}
+        self.assertEqual(set(participants), {self.payer.user_id, self.friend.user_id})
+        self.assertEqual(participants[self.friend.user_id].participant_id, kept[self.friend.user_id])
+        self.assertEqual(participants[self.friend.user_id].amount, Decimal('15.00'))
+        self.assertEqual(group_net_balances(self.group.group_id), {self.payer.user_id: 1500, self.friend.user_id: -1500})
+
+    def test_split_type_drives_shares(self):
+        """TC39.3: Percentage and exact splits use the entered shares; shares that do not add up are rejected"""
+        data = self.form_data('Dinner', '30.00', self.members)
+        data.update({'split_type': 'percentage', **{f'share_{m.member_id}': p for m, p in zip(self.members, ('50', '30', '20'))}})
+        self.assertEqual(self.client.post(f'/expenses/edit/{self.expense.expense_id}/', data).status_code, 302)
+        self.assertEqual(
+            dict(self.expense.participants.values_list('user_id', 'amount')),
+            {self.payer.user_id: Decimal('15.00'), self.friend.user_id: Decimal('9.00'), self.other.user_id: Decimal('6.00')}
+        )
+        self.assertEqual(self.expense.participants.get(user=self.friend).share_percentage, Decimal('30'))
+
+        data = self.form_data('Taxi', '10.00', self.members[1:])
+        data.update({'split_type': 'exact', f'share_{self.members[1].member_id}': '7.50', f'share_{self.members[2].member_id}': '2.00'})
+        response = self.client.post(f'/expenses/add/{self.group.group_id}/', data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Exact shares must add up to 10.00.', response.context['form'].errors['participants'])
+        data[f'share_{self.members[2].member_id}'] = '2.50'
+        self.assertEqual(self.client.post(f'/expenses/add/{self.group.group_id}/', data).status_code, 302)
+        taxi = Expense.objects.get(group=self.group, description='Taxi')
+        self.assertEqual(
+            dict(taxi.participants.values_list('user_id', 'amount')),
+            {self.friend.user_id: Decimal('7.50'), self.other.user_id: Decimal('2.50')}
+        )
+
+
+class TestSplitEngine(TestCase):
+    """TC40: Split Engine"""
+
+    def test_equal_split_distributes_remainder(self):
+        """TC40.1: Equal shares sum to the amount"""
+        from expenses.splits import split_expense
+        shares = split_expense(Decimal('100.00'), [(1, None), (2, None), (3, None)])
+        self.assertEqual(shares, {1: 3334, 2: 3333, 3: 3333})
+
+    def test_percentage_largest_remainder(self):
+        """TC40.2: Percentage remainders go to the largest fractions"""
+        from expenses.splits import split_expense
+        shares = split_expense(Decimal('0.10'), [(1, '33.33'), (2, '33.33'), (3, '33.34')], 'percentage')
+        self.assertEqual(sum(shares.values()), 10)
+        self.assertEqual(shares, {1: 3, 2: 3, 3: 4})
+
+    def test_invalid_splits_rejected(self):
+        """TC40.3: Percentages must total 100 and exact shares the amount"""
+        from expenses.splits import SplitError, split_expense
+        with self.assertRaises(SplitError):
+            split_expense(Decimal('10.00'), [(1, '50'), (2, '40')], 'percentage')
+        with self.assertRaises(SplitError):
+            split_expense(Decimal('10.00'), [(1, '6.00'), (2, '3.00')], 'exact')
+
+    def test_batch_matches_single(self):
+        """TC40.4: A mixed batch gives the same shares as splitting one by one"""
+        from expenses.splits import split_batch, split_expense
+        amounts = [Decimal('10.00'), Decimal('7.01'), Decimal('9.99')]
+        shares = [[(1, '2.50'), (2, '7.50')], [(1, None), (2, None), (3, None)], [(2, '50'), (3, '50')]]
+        types = ['exact', 'equal', 'percentage']
+        batch = split_batch(amounts, shares, types)
+        self.assertEqual(batch, [split_expense(a, s, t) for a, s, t in zip(amounts, shares, types)])
+        self.assertEqual([sum(split.values()) for split in batch], [1000, 701, 999])
+
+    def test_form_maximum_amounts(self):
+        """TC40.6: Splits at the form's largest amounts do not overflow"""
+        from expenses.splits import split_expense
+        self.assertEqual(
+            split_expense(Decimal('40000000.00'), [(1, Decimal('30000000.00')), (2, Decimal('10000000.00'))], 'exact'),
+            {1: 3000000000, 2: 1000000000}
+        )
+        largest = Decimal('999999999999999.99')
+        shares = split_expense(largest, [(1, '33.33'), (2, '33.33'), (3, '33.34')], 'percentage')
+        self.assertEqual(sum(shares.values()), 99999999999999999)
+        self.assertTrue(all(share > 0 for share in shares.values()))
+        self.assertEqual(sum(split_expense(largest, [(1, None), (2, None), (3, None)]).values()), 99999999999999999)
+
+    def test_build_participants_for_bulk_create(self):
+        """TC40.5: Built participants can be bulk-created as they are"""
+        from expenses.splits import build_participants
+        owner = User.objects.create_user(email='splitter@example.com', password='Pass123', name='Splitter')
+        friend = User.objects.create_user(email='splitfriend@example.com', password='Pass123', name='Split Friend')
+        group = Group.objects.create(name='Split Group', owner=owner)
+        expense = Expense.objects.create(
+            group=group, payer=owner, amount=Decimal('20.00'), description='Split', split_type='percentage'
+        )
+        ExpenseParticipant.objects.bulk_create(
+            build_participants([expense], [[(owner.user_id, Decimal('25')), (friend.user_id, Decimal('75'))]])
+        )
+        self.assertEqual(
+            dict(expense.participants.values_list('user_id', 'amount')),
+            {owner.user_id: Decimal('5.00'), friend.user_id: Decimal('15.00')}
+        )
+
+
+class TestRecurringExpenses(TestCase):
+    """TC41: Recurring Expenses"""
+
+    def setUp(self):
+        from groups.models import GroupMember
+        from expenses.models import RecurringExpense, RecurringParticipant
+        self.owner = User.objects.create_user(email='rentpayer@example.com', password='Pass123', name='Rent Payer')
+        self.flatmate = User.objects.create_user(email='flatmate@example.com', password='Pass123', name='Flatmate')
+        self.group = Group.objects.create(name='Flat', owner=self.owner)
+        for user in (self.owner, self.flatmate):
+            GroupMember.objects.create(group=self.group, user=user)
+        self.category = Category.objects.create(name='Rent')
+        self.template = RecurringExpense.objects.create(
+            group=self.group,
+            payer=self.owner,
+            amount=Decimal('1000.01'),
+            description='Rent',
+            category=self.category,
+            frequency='monthly',
+            start_date=date(2025, 1, 31)
+        )
+        for user in (self.owner, self.flatmate):
+            RecurringParticipant.objects.create(template=self.template, user=user)
+
+    def test_monthly_dates_keep_day_of_month(self):
+        """TC41.1: Month-end templates clamp to short months without drifting"""
+        from expenses.recurring import due_occurrences
+        dates, next_date = due_occurrences(self.template, date(2025, 4, 30))
+        self.assertEqual(dates, [date(2025, 1, 31), date(2025, 2, 28), date(2025, 3, 31), date(2025, 4, 30)])
+        self.assertEqual(next_date, date(2025, 5, 31))
+
+    def test_materialize_creates_rows_and_side_effects(self):
+        """TC41.2: Due occurrences become expenses with shares, rollups, counters and ledger"""
+        from expenses.recurring import materialize_due
+        from settlements.ledger import group_net_balances
+        from settlements.models import Balance
+        created, invalid = materialize_due(date(2025, 3, 15))
+        self.assertEqual((created, invalid), (2, []))
+        expenses = Expense.objects.filter(recurring=self.template).order_by('date')
+        self.assertEqual([e.occurrence_date for e in expenses], [date(2025, 1, 31), date(2025, 2, 28)])
+        self.assertEqual(sorted(expenses[0].participants.values_list('amount', flat=True)), [Decimal('500.00'), Decimal('500.01')])
+        self.assertEqual(SpendingRollup.objects.filter(group=self.group).count(), 2)
+        self.group.refresh_from_db()
+        self.assertEqual((self.group.expense_count, self.group.total_spent), (2, Decimal('2000.02')))
+        self.assertEqual(sum(group_net_balances(self.group.group_id).values()), 0)
+        self.assertTrue(Balance.objects.filter(group=self.group, user1=self.flatmate).exists())
+        self.template.refresh_from_db()
+        self.assertEqual(self.template.next_date, date(2025, 3, 31))
+
+    def test_idempotent(self):
+        """TC41.3: Re-running, even with a stale next_date, creates nothing twice"""
+        from expenses.recurring import materialize_due
+        from expenses.models import RecurringExpense
+        materialize_due(date(2025, 2, 28))
+        RecurringExpense.objects.filter(pk=self.template.pk).update(next_date=date(2025, 1, 31))
+        created, _ = materialize_due(date(2025, 2, 28))
+        self.assertEqual(created, 0)
+        self.assertEqual(Expense.objects.filter(recurring=self.template).count(), 2)
+
+    def test_invalid_template_skipped(self):
+        """TC41.4: Templates whose shares don't add up are reported, not materialised"""
+        from expenses.recurring import materialize_due
+        from expenses.models import RecurringExpense
+        RecurringExpense.objects.filter(pk=self.template.pk).update(split_type='percentage')
+        created, invalid = materialize_due(date(2025, 2, 28))
+        self.assertEqual((created, invalid), (0, [self.template.template_id]))
+
+    def test_percentage_template_keeps_split_metadata(self):
+        """TC41.5: Materialised percentage splits keep each share's percentage"""
+        from expenses.recurring import materialize_due
+        from expenses.models import RecurringExpense
+        RecurringExpense.objects.filter(pk=self.template.pk).update(split_type='percentage')
+        self.template.participants.filter(user=self.owner).update(value=Decimal('25'))
+        self.template.participants.filter(user=self.flatmate).update(value=Decimal('75'))
+        self.assertEqual(materialize_due(date(2025, 1, 31)), (1, []))
+        expense = Expense.objects.get(recurring=self.template)
+        self.assertEqual(expense.split_type, 'percentage')
+        self.assertEqual(
+            sorted(expense.participants.values_list('user_id', 'amount', 'share_percentage')),
+            [(self.owner.user_id, Decimal('250.00'), Decimal('25.00')), (self.flatmate.user_id, Decimal('750.01'), Decimal('75.00'))]
+        )
+
+
+class TestMultiCurrencyExpenses(TestCase):
+    """TC42: Multi-currency Expenses"""
+
+    def setUp(self):
+        import os
+        import tempfile
+        from groups.models import GroupMember
+        from expenses.fx import import_rates
+        self.payer = User.objects.create_user(email='traveller@example.com', password='Pass123', name='Traveller')
+        self.friend = User.objects.create_user(email='companion@example.com', password='Pass123', name='Companion')
+        self.group = Group.objects.create(name='Trip', owner=self.payer, currency='GBP')
+        for user in (self.payer, self.friend):
+            GroupMember.objects.create(group=self.group, user=user)
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as rates:
+            rates.write('date,currency,rate\n2025-06-01,EUR,1.10\n2025-06-01,GBP,1.25\n2025-06-10,EUR,1.20\n')
+        self.addCleanup(os.remove, path)
+        self.assertEqual(import_rates(path), 3)
+
+    def _expense(self, amount, currency, day, category=None):
+        from expenses.splits import equal_shares
+        from settlements.ledger import post_expense
+        expense = Expense.objects.create(
+            group=self.group, payer=self.payer, amount=Decimal(amount), currency=currency,
+            description='Dinner', date=day, category=category
+        )
+        for user_id, share in equal_shares(expense.amount, [self.payer.user_id, self.friend.user_id]).items():
+            ExpenseParticipant.objects.create(expense=expense, user_id=user_id, amount=share)
+        post_expense(expense)
+        return expense
+
+    def test_ledger_is_kept_in_group_currency(self):
+        """TC42.1: Shares convert at the latest rate on or before the expense date"""
+        from settlements.ledger import group_net_balances
+        self._expense('50.00', 'EUR', date(2025, 6, 5))   # 25 EUR * 1.10 / 1.25 = 22.00 GBP
+        self._expense('50.00', 'EUR', date(2025, 6, 12))  # 25 EUR * 1.20 / 1.25 = 24.00 GBP
+        self._expense('10.00', '', date(2025, 6, 12))     # Blank means the group's currency
+        balances = group_net_balances(self.group.group_id)
+        self.assertEqual(balances, {self.payer.user_id: 5100, self.friend.user_id: -5100})
+
+    def test_rates_are_cached_per_currency_and_date(self):
+        """TC42.2: Converting again for a seen (currency, date) doesn't query the rates table"""
+        from expenses.fx import convert_cents
+        day = date(2025, 6, 5)
+        self.assertEqual(convert_cents([1000, -1000], ['EUR', 'EUR'], [day, day], ['GBP', 'GBP']).tolist(), [880, -880])
+        with self.assertNumQueries(0):
+            convert_cents([3333], ['EUR'], [day], ['GBP'])
+        # Exact beyond float precision
+        self.assertEqual(convert_cents([2 ** 53 + 1], ['EUR'], [day], ['GBP']).tolist(), [((2 ** 53 + 1) * 88 + 50) // 100])
+
+    def test_derived_totals_use_group_currency(self):
+        """TC42.4: Rollups, group counters and budget spending add the converted amount"""
+        from budgets.models import BudgetPlan, BudgetItem
+        from groups.counters import reconcile_group_counters
+        category = Category.objects.create(name='Trip food')
+        budget = BudgetPlan.objects.create(
+            group=self.group, name='June', start_date=date(2025, 6, 1), end_date=date(2025, 6, 30)
+        )
+        item = BudgetItem.objects.create(budget=budget, category=category, budget_amount=Decimal('100.00'))
+        expense = self._expense('50.00', 'EUR', date(2025, 6, 5), category)
+        self.assertEqual(expense.group_amount, Decimal('44.00'))
+        self.assertEqual(SpendingRollup.objects.get(group=self.group, category=category).total_cents, 4400)
+        item.refresh_from_db()
+        self.assertEqual(item.spent_amount, Decimal('44.00'))
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.total_spent, Decimal('44.00'))
+        self.assertEqual(reconcile_group_counters([self.group.pk]), 0)
+
+        expense.currency = 'GBP'
+        expense.save()
+        item.refresh_from_db()
+        self.assertEqual((item.spent_amount, SpendingRollup.objects.get(group=self.group).total_cents), (Decimal('50.00'), 5000))
+
+    def test_missing_rate_is_rejected_by_form(self):
+        """TC42.3: A currency without a rate for the date cannot be entered"""
+        from expenses.forms import ExpenseForm
+        member_ids = list(self.group.members.values_list('member_id', flat=True))
+        data = {'amount': '20.00', 'description': 'Taxi', 'date': '2025-05-01', 'split_type': 'equal', 'participants': member_ids}
+        form = ExpenseForm({**data, 'currency': 'eur'}, group=self.group)
+        self.assertIn('currency', form.errors)
+        form = ExpenseForm({**data, 'date': '2025-06-02', 'currency': 'eur'}, group=self.group)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['currency'], 'EUR')
+
+
+    def test_rate_import_does_not_move_unchanged_expenses(self):
+        """TC42.6: Only edits to money fields reconvert an expense at the current rate"""
+        from expenses.fx import invalidate_rates
+        from expenses.models import FxRate
+        expense = self._expense('50.00', 'EUR', date(2025, 6, 5))
+        FxRate.objects.filter(currency='EUR', date=date(2025, 6, 1)).update(rate=Decimal('1.50'))
+        invalidate_rates()
+        expense.description = 'Renamed dinner'
+        expense.save()
+        expense.refresh_from_db()
+        self.assertEqual(expense.group_amount, Decimal('44.00'))
+        self.assertEqual(SpendingRollup.objects.get(group=self.group).total_cents, 4400)
+        expense.amount = Decimal('25.00')
+        expense.save()
+        expense.refresh_from_db()
+        self.assertEqual(expense.group_amount, Decimal('30.00'))
+
+class TestIntegerCentsMoney(TestCase):
+    """TC43: Integer-cents Money"""
+
+    def setUp(self):
+        self.payer = User.objects.create_user(email='centpayer@example.com', password='Pass123', name='Cent Payer')
+        self.group = Group.objects.create(name='Cents', owner=self.payer)
+
+    def test_money_arithmetic(self):
+        """TC43.1: Money adds on cents, renders like a two-place Decimal and compares with numbers"""
+        from expenses.money import Money, sum_money
+        self.assertEqual(str(Money.of('10.005')), '10.01')
+        self.assertEqual(Money(1050) + Decimal('0.50'), Money(1100))
+        self.assertEqual(sum([Money(1), Money(2)]), Money(3))
+        self.assertEqual(sum_money([]), 0)
+        self.assertEqual(Money(1000) / 3, Money(333))
+        self.assertEqual(Money(250) / Money(1000), Decimal('0.25'))
+        self.assertTrue(Decimal('0.01') <= Money(1) < 1)
+        self.assertEqual(f'{Money(-5):.2f}', '-0.05')
+
+    def test_money_field_stores_cents(self):
+        """TC43.2: Amounts are stored as integer cents and read back as Money"""
+        from django.db import connection
+        from django.db.models import Sum
+        from expenses.money import Money
+        for amount in ('12.34', '0.66'):
+            Expense.objects.create(group=self.group, payer=self.payer, amount=Decimal(amount), description='Snack')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT amount FROM expenses ORDER BY amount')
+            self.assertEqual([row[0] for row in cursor.fetchall()], [66, 1234])
+        total = Expense.objects.aggregate(total=Sum('amount'))['total']
+        self.assertIsInstance(total, Money)
+        self.assertEqual(total, Decimal('13.00'))
+        self.assertEqual(Expense.objects.filter(amount__gt=Decimal('1')).count(), 1)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.total_spent, Money(1300))
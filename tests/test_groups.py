@@ -1,8 +1,16 @@
 from django.test import TestCase
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from users.models import User
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
 from groups.models import Group, GroupMember
+from spliteaseproject.caching import LOCAL_CACHE_TIMEOUT, cache_timeout
+from expenses.models import Expense
 
 
 class TestGroupCreation(TestCase):
@@ -214,4 +222,382 @@ class TestGroupDeletion(TestCase):
         group_id = group.group_id
         group.delete()
         
-        self.assertFalse(GroupMember.objects.filter(group_id=group_id).exists())
\ No newline at end of file
+        self.assertFalse(GroupMember.objects.filter(group_id=group_id).exists())
+
+
+class TestMembershipResolver(TestCase):
+    """TC33: Membership Resolver"""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(
+            email='resolver@example.com',
+            password='Pass123',
+            name='Resolver Owner'
+        )
+        self.outsider = User.objects.create_user(
+            email='outsider@example.com',
+            password='Pass123',
+            name='Outsider'
+        )
+        self.group = Group.objects.create(name='Resolver Group', owner=self.owner)
+        GroupMember.objects.create(group=self.group, user=self.owner, is_admin=True)
+
+    def membership_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        lookups = [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith('SELECT "group_members"."group_id" AS "group_id", "group_members"."is_admin"')
+        ]
+        return response, len(lookups)
+
+    def test_warm_cache_needs_no_membership_query(self):
+        """TC33.1: Membership is queried once, then served from cache"""
+        self.client.force_login(self.owner)
+        url = f'/chat/online/{self.group.group_id}/'
+        response, lookups = self.membership_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookups, 1)
+        response, lookups = self.membership_queries(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookups, 0)
+
+    def test_non_member_rejected(self):
+        """TC33.2: Non-members get a 403 from JSON endpoints"""
+        self.client.force_login(self.outsider)
+        response = self.client.get(f'/chat/online/{self.group.group_id}/')
+        self.assertEqual(response.status_code, 403)
+
+    def test_joining_invalidates_cache(self):
+        """TC33.3: Adding a member drops their cached memberships"""
+        self.client.force_login(self.outsider)
+        url = f'/chat/online/{self.group.group_id}/'
+        self.assertEqual(self.client.get(url).status_code, 403)
+        member = GroupMember.objects.create(group=self.group, user=self.outsider)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        member.delete()
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_admin_role_required(self):
+        """TC33.4: Only admins reach admin-only views"""
+        GroupMember.objects.create(group=self.group, user=self.outsider)
+        self.client.force_login(self.outsider)
+        response = self.client.get(f'/groups/{self.group.group_id}/add-member/')
+        self.assertRedirects(response, f'/groups/{self.group.group_id}/', fetch_redirect_response=False)
+        self.client.force_login(self.owner)
+        response = self.client.get(f'/groups/{self.group.group_id}/add-member/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_process_local_cache_keeps_memberships_briefly(self):
+        """TC33.5: Invalidated caches keep entries for seconds in a per-process cache, their full timeout in a shared one"""
+        self.assertEqual(cache_timeout(3600), LOCAL_CACHE_TIMEOUT)
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+        with self.settings(CACHES=shared):
+            self.assertEqual(cache_timeout(3600), 3600)
+
+
+class TestGroupCounters(TestCase):
+    """TC34: Denormalised Group Counters"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            email='counter@example.com',
+            password='Pass123',
+            name='Counter Owner'
+        )
+        self.friend = User.objects.create_user(
+            email='counterfriend@example.com',
+            password='Pass123',
+            name='Counter Friend'
+        )
+        self.group = Group.objects.create(name='Counter Group', owner=self.owner)
+        GroupMember.objects.create(group=self.group, user=self.owner, is_admin=True)
+
+    def add_expense(self, amount):
+        return Expense.objects.create(
+            group=self.group,
+            payer=self.owner,
+            amount=Decimal(amount),
+            description='Counter expense'
+        )
+
+    def test_membership_changes_counted(self):
+        """TC34.1: Adding and removing members updates member_count"""
+        member = GroupMember.objects.create(group=self.group, user=self.friend)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.get_total_members(), 2)
+        member.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.member_count, 1)
+
+    def test_expense_writes_counted(self):
+        """TC34.2: Expense create, edit and delete keep count and total in step"""
+        expense = self.add_expense('40.00')
+        self.add_expense('10.50')
+        expense.amount = Decimal('25.00')
+        expense.save()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.expense_count, 2)
+        self.assertEqual(self.group.total_spent, Decimal('35.50'))
+        expense.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.expense_count, 1)
+        self.assertEqual(self.group.total_spent, Decimal('10.50'))
+
+    def test_reconcile_fixes_drift(self):
+        """TC34.3: Reconciliation recomputes counters that bypassed signals"""
+        self.add_expense('12.00')
+        Group.objects.filter(pk=self.group.pk).update(member_count=7, expense_count=0, total_spent=0)
+        call_command('reconcile_group_counters', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertEqual(
+            (self.group.member_count, self.group.expense_count, self.group.total_spent),
+            (1, 1, Decimal('12.00'))
+        )
+
+    def test_group_list_has_no_per_row_queries(self):
+        """TC34.4: Group list query count does not grow with groups"""
+        self.client.force_login(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get('/groups/list/')
+        baseline = len(ctx.captured_queries)
+        for i in range(3):
+            group = Group.objects.create(name=f'Extra {i}', owner=self.owner)
+            GroupMember.objects.create(group=group, user=self.owner, is_admin=True)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/groups/list/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(ctx.captured_queries), baseline)
+
+
+class TestGroupListSummaries(TestCase):
+    """TC35: Group List Summaries"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='lister@example.com',
+            password='Pass123',
+            name='Group Lister'
+        )
+        self.friend = User.objects.create_user(
+            email='listfriend@example.com',
+            password='Pass123',
+            name='List Friend'
+        )
+        self.client.force_login(self.user)
+
+    def add_group(self, name):
+        group = Group.objects.create(name=name, owner=self.user)
+        GroupMember.objects.create(group=group, user=self.user, is_admin=True)
+        GroupMember.objects.create(group=group, user=self.friend)
+        return group
+
+    def list_page(self, page=1):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(f'/groups/list/?page={page}')
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_net_balance_and_last_activity(self):
+        """TC35.1: Each membership carries the user's net balance and last activity"""
+        from settlements.models import Balance
+        from activities.services import log_activity
+        group = self.add_group('Balance Group')
+        Balance.objects.create(group=group, user1=self.friend, user2=self.user, amount=Decimal('30.00'))
+        log_activity(self.user, group, 'group_created', 'Created the group')
+        response, _ = self.list_page()
+        membership = response.context['groups'][0]
+        self.assertEqual(membership.net_balance, Decimal('30.00'))
+        self.assertIsNotNone(membership.last_activity)
+        self.assertEqual(len(membership.group.roster), 2)
+
+    def test_query_count_fixed(self):
+        """TC35.2: Query count does not grow with the number of groups"""
+        self.add_group('Fixed 0')
+        _, baseline = self.list_page()
+        for i in range(1, 6):
+            self.add_group(f'Fixed {i}')
+        _, queries = self.list_page()
+        self.assertEqual(queries, baseline)
+
+    def test_paginated(self):
+        """TC35.3: Groups are split across pages"""
+        from groups.views import GROUPS_PER_PAGE
+        for i in range(GROUPS_PER_PAGE + 2):
+            self.add_group(f'Paged {i}')
+        response, _ = self.list_page(2)
+        self.assertEqual(len(response.context['groups']), 2)
+        self.assertEqual(response.context['page_obj'].paginator.num_pages, 2)
+
+
+class TestGroupArchival(TestCase):
+    """TC36: Group Archival"""
+
+    def setUp(self):
+        from expenses.models import ExpenseParticipant
+        from activities.services import log_activity
+        self.owner = User.objects.create_user(
+            email='archiver@example.com',
+            password='Pass123',
+            name='Archiver'
+        )
+        self.friend = User.objects.create_user(
+            email='archfriend@example.com',
+            password='Pass123',
+            name='Archive Friend'
+        )
+        self.group = Group.objects.create(name='Finished Trip', owner=self.owner)
+        GroupMember.objects.create(group=self.group, user=self.owner, is_admin=True)
+        GroupMember.objects.create(group=self.group, user=self.friend)
+        self.expense = Expense.objects.create(
+            group=self.group,
+            payer=self.owner,
+            amount=Decimal('90.00'),
+            description='Hotel'
+        )
+        for user in (self.owner, self.friend):
+            ExpenseParticipant.objects.create(expense=self.expense, user=user, amount=Decimal('45.00'))
+        log_activity(self.owner, self.group, 'expense_added', 'Added Hotel')
+
+    def test_archive_moves_rows_out(self):
+        """TC36.1: Archiving deletes hot rows and keeps totals on the group"""
+        from groups.archive import archive_group
+        from expenses.models import ExpenseParticipant, SpendingRollup
+        from activities.models import Activity
+        archive = archive_group(self.group)
+        self.assertEqual(archive.expense_count, 1)
+        self.assertEqual(archive.total_spent, Decimal('90.00'))
+        self.assertLess(len(archive.data), archive.raw_size)
+        self.assertFalse(Expense.objects.filter(group=self.group).exists())
+        self.assertFalse(ExpenseParticipant.objects.filter(expense__group=self.group).exists())
+        self.assertFalse(Activity.objects.filter(group=self.group).exists())
+        self.assertFalse(SpendingRollup.objects.filter(group=self.group).exists())
+        self.group.refresh_from_db()
+        self.assertTrue(self.group.is_archived)
+        self.assertEqual(self.group.total_spent, Decimal('90.00'))
+
+    def test_restore_round_trip(self):
+        """TC36.2: Restoring brings back rows with their original ids and timestamps"""
+        from groups.archive import archive_group, restore_group
+        from expenses.models import SpendingRollup
+        from activities.models import Activity
+        created_at = self.expense.created_at
+        activity_time = Activity.objects.get(group=self.group).timestamp
+        archive_group(self.group)
+        restored = restore_group(self.group)
+        self.assertEqual(restored['participants'], 2)
+        expense = Expense.objects.get(pk=self.expense.pk)
+        self.assertEqual(expense.amount, Decimal('90.00'))
+        self.assertEqual(expense.created_at, created_at)
+        self.assertEqual(expense.participants.count(), 2)
+        self.assertEqual(Activity.objects.get(group=self.group).timestamp, activity_time)
+        self.assertTrue(SpendingRollup.objects.filter(group=self.group).exists())
+        self.group.refresh_from_db()
+        self.assertFalse(self.group.is_archived)
+        self.assertEqual(self.group.expense_count, 1)
+
+    def test_unsettled_group_not_archived(self):
+        """TC36.3: Groups with outstanding balances cannot be archived"""
+        from groups.archive import ArchiveError, archive_group
+        from settlements.models import Balance
+        Balance.objects.create(group=self.group, user1=self.friend, user2=self.owner, amount=Decimal('45.00'))
+        with self.assertRaises(ArchiveError):
+            archive_group(self.group)
+        self.assertTrue(Expense.objects.filter(group=self.group).exists())
+
+    def test_command_archives_only_inactive(self):
+        """TC36.4: The command archives groups idle past the cutoff"""
+        from datetime import timedelta
+        from django.utils import timezone
+        from activities.models import Activity
+        call_command('archive_groups', '--days', '30', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertFalse(self.group.is_archived)
+        old = timezone.now() - timedelta(days=60)
+        Group.objects.filter(pk=self.group.pk).update(created_at=old)
+        Expense.objects.filter(pk=self.expense.pk).update(created_at=old)
+        Activity.objects.filter(group=self.group).update(timestamp=old)
+        call_command('archive_groups', '--days', '30', stdout=StringIO())
+        self.group.refresh_from_db()
+        self.assertTrue(self.group.is_archived)
+
+    def test_archived_group_rejects_writes(self):
+        """TC36.5: Views that write into a group turn archived groups away"""
+        from groups.archive import archive_group
+        from chat.models import Message
+        from settlements.models import Settlement
+        archive_group(self.group)
+        self.client.force_login(self.owner)
+        group_id = self.group.group_id
+        response = self.client.post(f'/chat/send/{group_id}/', {'message': 'Still here?'})
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(Message.objects.filter(group=self.group).exists())
+        outsider = User.objects.create_user(email='latecomer@example.com', password='Pass123', name='Latecomer')
+        for url, data in (
+            (f'/groups/{group_id}/add-member/', {'email': outsider.email}),
+            (f'/settlements/optimize/{group_id}/', {'confirm': '1'}),
+            (f'/expenses/add/{group_id}/', {}),
+        ):
+            self.assertRedirects(self.client.post(url, data), f'/groups/{group_id}/', fetch_redirect_response=False)
+        self.assertEqual(self.group.members.count(), 2)
+        self.assertFalse(Settlement.objects.filter(group=self.group).exists())
+
+
+    def test_reconcilers_skip_archived_and_restore_recomputes(self):
+        """TC36.6: Archived totals survive reconciliation and restore recomputes counters and budgets"""
+        from datetime import date
+        from groups.archive import archive_group, restore_group
+        from groups.counters import reconcile_group_counters
+        from budgets.models import BudgetPlan, BudgetItem
+        from budgets.spending import reconcile_budget_spending
+        from expenses.models import Category
+        category = Category.objects.create(name='Archive Lodging')
+        Expense.objects.filter(pk=self.expense.pk).update(category=category, date=date(2025, 5, 2))
+        budget = BudgetPlan.objects.create(
+            group=self.group, name='May', start_date=date(2025, 5, 1), end_date=date(2025, 5, 31)
+        )
+        item = BudgetItem.objects.create(budget=budget, category=category, budget_amount=Decimal('200.00'))
+        reconcile_budget_spending([self.group.pk])
+        archive_group(self.group)
+        self.assertEqual(reconcile_group_counters(), 0)
+        self.assertEqual(reconcile_budget_spending(), 0)
+        self.group.refresh_from_db()
+        self.assertEqual((self.group.expense_count, self.group.total_spent), (1, Decimal('90.00')))
+
+        # Drift while archived is repaired on restore
+        Group.objects.filter(pk=self.group.pk).update(expense_count=7, total_spent=0)
+        BudgetItem.objects.filter(pk=item.pk).update(spent_amount=0)
+        restore_group(self.group)
+        self.group.refresh_from_db()
+        item.refresh_from_db()
+        self.assertEqual((self.group.expense_count, self.group.total_spent), (1, Decimal('90.00')))
+        self.assertEqual(item.spent_amount, Decimal('90.00'))
+
+    def test_restore_skips_deleted_references(self):
+        """TC36.7: Rows of deleted users are dropped and deleted categories nulled on restore"""
+        from groups.archive import archive_group, restore_group
+        from expenses.models import Category
+        category = Category.objects.create(name='Archive Hotel')
+        Expense.objects.filter(pk=self.expense.pk).update(category=category)
+        archive_group(self.group)
+        category.delete()
+        self.friend.delete()
+        restored = restore_group(self.group)
+        self.assertEqual(restored['participants'], 1)
+        expense = Expense.objects.get(pk=self.expense.pk)
+        self.assertIsNone(expense.category_id)
+        self.assertEqual(list(expense.participants.values_list('user_id', flat=True)), [self.owner.user_id])
+
+    def test_restore_refills_timelines(self):
+        """TC36.8: Restored activities are back in every member's timeline"""
+        from groups.archive import archive_group, restore_group
+        from activities.models import Activity
+        from activities.services import get_user_timeline
+        activity = Activity.objects.get(group=self.group)
+        archive_group(self.group)
+        self.assertEqual(get_user_timeline(self.friend)[0], [])
+        restore_group(self.group)
+        for user in (self.owner, self.friend):
+            entries, _ = get_user_timeline(user)
+            self.assertEqual([entry.activity_id for entry in entries], [activity.pk])
@@ -0,0 +1,89 @@
+from io import StringIO
+from decimal import Decimal
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from users.models import User
+from groups.models import Group, GroupMember
+from expenses.models import Expense
+from settlements.models import Balance
+from jobs.models import Job
+from jobs.queue import HANDLERS, HIGH, LOW, claim, enqueue, handler, run_jobs, run_pending
+
+
+@override_settings(JOB_QUEUE_EAGER=False)
+class TestJobQueue(TestCase):
+    """TC45: Background Job Queue"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='jobowner@example.com', password='Pass123', name='Job Owner')
+        self.friend = User.objects.create_user(email='jobfriend@example.com', password='Pass123', name='Job Friend')
+        self.group = Group.objects.create(name='Job Group', owner=self.owner)
+        self.other = Group.objects.create(name='Other Job Group', owner=self.owner)
+        for user in (self.owner, self.friend):
+            GroupMember.objects.create(group=self.group, user=user)
+        self.client.force_login(self.owner)
+
+    def test_jobs_coalesce_per_group(self):
+        """TC45.1: One queued job per group and kind; re-enqueueing only raises its priority"""
+        self.assertIsNotNone(enqueue('recalculate_balances', self.group, priority=LOW))
+        self.assertIsNone(enqueue('recalculate_balances', self.group, priority=HIGH))
+        self.assertIsNotNone(enqueue('recalculate_balances', self.other))
+        jobs = Job.objects.filter(kind='recalculate_balances').order_by('priority')
+        self.assertEqual([(job.group_id, job.priority) for job in jobs], [(self.group.pk, HIGH), (self.other.pk, 5)])
+        # Once running, a new change queues a fresh job
+        claim()
+        self.assertIsNotNone(enqueue('recalculate_balances', self.group))
+
+    def test_view_enqueues_and_worker_rebuilds(self):
+        """TC45.2: Adding an expense returns without rebuilding; the worker does it by priority"""
+        members = GroupMember.objects.filter(group=self.group)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(f'/expenses/add/{self.group.group_id}/', {
+                'amount': '20.00', 'description': 'Groceries', 'date': '2025-03-01', 'split_type': 'equal',
+                'participants': [member.member_id for member in members],
+            })
+        self.assertEqual(response.status_code, 302)
+        # Nothing is queued until the request's writes commit
+        self.assertFalse(Job.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertFalse(Balance.objects.filter(group=self.group).exists())
+        self.assertEqual(
+            list(Job.objects.order_by('priority', 'job_id').values_list('kind', flat=True)),
+            ['recalculate_balances', 'expense_notification', 'refresh_forecasts']
+        )
+        call_command('run_jobs', '--once', stdout=StringIO())
+        self.assertEqual(Balance.objects.get(group=self.group).amount, Decimal('10.00'))
+        self.assertFalse(Job.objects.exclude(status='done').exists())
+
+    def test_failures_retry_then_fail(self):
+        """TC45.3: A failing job is retried with backoff and kept as failed after the last attempt"""
+        calls = []
+
+        @handler('test_flaky')
+        def flaky(group_id):
+            calls.append(group_id)
+            raise RuntimeError('boom')
+        self.addCleanup(HANDLERS.pop, 'test_flaky')
+
+        job = enqueue('test_flaky', self.group)
+        self.assertEqual(run_jobs(claim()), 0)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), ('queued', 1, 'RuntimeError: boom'))
+        self.assertEqual(claim(), [])  # Backing off
+        Job.objects.filter(pk=job.pk).update(attempts=4, run_after=job.created_at)
+        run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, len(calls)), ('failed', 2))
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        """TC45.4: With JOB_QUEUE_EAGER jobs run as they are queued"""
+        expense = Expense.objects.create(group=self.group, payer=self.owner, amount=Decimal('8.00'), description='Cab')
+        expense.participants.create(user=self.friend, amount=Decimal('8.00'))
+        from settlements.ledger import post_expense
+        post_expense(expense)
+        job = enqueue('recalculate_balances', self.group)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(Balance.objects.get(group=self.group).amount, Decimal('8.00'))
@@ -1,10 +1,16 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.core.exceptions import ValidationError
+from datetime import date, timedelta
 from decimal import Decimal
 from users.models import User
-from groups.models import Group
+from groups.models import Group, GroupMember
 from expenses.models import Expense, ExpenseParticipant
-from settlements.models import Settlement
+from settlements.models import Settlement, Balance, LedgerEntry, LedgerSnapshot
+from settlements.ledger import (
+    LedgerError, _post, group_net_balances, post_expense, post_settlement,
+    repost_expense, reverse_source, snapshot_ledgers, source_position, take_snapshot
+)
+from jobs.queue import run_pending
 
 
 class TestBalanceCalculation(TestCase):
@@ -253,4 +259,368 @@ class TestSettlementCompletion(TestCase):
         s2.save()
         
         total = Settlement.objects.filter(group=self.group).count()
-        self.assertEqual(total, 2)
\ No newline at end of file
+        self.assertEqual(total, 2)
+
+
+class TestLedger(TestCase):
+    """TC37: Append-only Ledger"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(email='ledgeralice@example.com', password='Pass123', name='Alice')
+        self.bob = User.objects.create_user(email='ledgerbob@example.com', password='Pass123', name='Bob')
+        self.carol = User.objects.create_user(email='ledgercarol@example.com', password='Pass123', name='Carol')
+        self.group = Group.objects.create(name='Ledger Group', owner=self.alice)
+        for user in (self.alice, self.bob, self.carol):
+            GroupMember.objects.create(group=self.group, user=user, is_admin=user == self.alice)
+
+    def add_expense(self, amount, payer, shares):
+        expense = Expense.objects.create(
+            group=self.group, payer=payer, amount=Decimal(amount), description='Ledger expense'
+        )
+        for user, share in shares:
+            ExpenseParticipant.objects.create(expense=expense, user=user, amount=Decimal(share))
+        post_expense(expense)
+        return expense
+
+    def test_journals_balance(self):
+        """TC37.1: Each journal sums to zero and nets match the shares"""
+        self.add_expense('90.00', self.alice, [(self.alice, '30.00'), (self.bob, '30.00'), (self.carol, '30.00')])
+        self.assertEqual(
+            group_net_balances(self.group.group_id),
+            {self.alice.user_id: 6000, self.bob.user_id: -3000, self.carol.user_id: -3000}
+        )
+        with self.assertRaises(LedgerError):
+            _post(self.group.group_id, 'expense', 0, {self.alice.user_id: 100})
+
+    def test_edit_and_delete_append(self):
+        """TC37.2: Edits and deletions post reversals instead of rewriting rows"""
+        expense = self.add_expense('40.00', self.alice, [(self.alice, '20.00'), (self.bob, '20.00')])
+        original = set(LedgerEntry.objects.values_list('entry_id', 'amount_cents'))
+        ExpenseParticipant.objects.filter(expense=expense, user=self.bob).update(amount=Decimal('30.00'))
+        ExpenseParticipant.objects.filter(expense=expense, user=self.alice).update(amount=Decimal('10.00'))
+        repost_expense(expense)
+        self.assertTrue(original <= set(LedgerEntry.objects.values_list('entry_id', 'amount_cents')))
+        self.assertEqual(group_net_balances(self.group.group_id)[self.bob.user_id], -3000)
+        reverse_source(self.group.group_id, 'expense', expense.expense_id)
+        self.assertEqual(group_net_balances(self.group.group_id), {})
+
+    def test_settlement_reduces_debt(self):
+        """TC37.3: Completed settlements move money between members"""
+        self.add_expense('50.00', self.alice, [(self.alice, '25.00'), (self.bob, '25.00')])
+        settlement = Settlement.objects.create(
+            group=self.group, payer=self.bob, payee=self.alice, amount=Decimal('25.00'), is_completed=True
+        )
+        post_settlement(settlement)
+        self.assertEqual(group_net_balances(self.group.group_id), {})
+
+    def test_snapshot_plus_tail(self):
+        """TC37.4: Snapshots fold the tail and reads only aggregate entries after them"""
+        self.add_expense('30.00', self.alice, [(self.bob, '30.00')])
+        snapshot = take_snapshot(self.group.group_id)
+        self.assertEqual(snapshot.balances, {str(self.alice.user_id): 3000, str(self.bob.user_id): -3000})
+        self.assertIsNone(take_snapshot(self.group.group_id))
+        self.add_expense('10.00', self.carol, [(self.alice, '10.00')])
+        self.assertEqual(
+            group_net_balances(self.group.group_id),
+            {self.alice.user_id: 2000, self.bob.user_id: -3000, self.carol.user_id: 1000}
+        )
+        self.assertEqual(len(snapshot_ledgers(min_tail=2)), 1)
+        self.assertEqual(len(snapshot_ledgers(min_tail=1)), 0)
+        self.assertEqual(LedgerSnapshot.objects.filter(group=self.group).count(), 2)
+
+    @override_settings(JOB_QUEUE_EAGER=False)
+    def test_balances_rebuilt_from_ledger(self):
+        """TC37.5: Adding an expense through the view posts a journal and pairwise balances"""
+        self.client.force_login(self.alice)
+        members = GroupMember.objects.filter(group=self.group).order_by('member_id')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/expenses/add/{self.group.group_id}/', {
+                'amount': '30.00',
+                'description': 'Taxi',
+                'date': '2025-03-01',
+                'split_type': 'equal',
+                'participants': [member.member_id for member in members],
+            })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(LedgerEntry.objects.filter(group=self.group).count(), 3)
+        # Balances are rebuilt by the job worker
+        self.assertFalse(Balance.objects.filter(group=self.group).exists())
+        run_pending()
+        self.assertEqual(
+            sorted(Balance.objects.filter(group=self.group).values_list('user1__name', 'user2__name', 'amount')),
+            [('Bob', 'Alice', Decimal('10.00')), ('Carol', 'Alice', Decimal('10.00'))]
+        )
+
+    def test_migrate_backfills_dated_journals(self):
+        """TC37.6: migrate posts pre-ledger rows, dated when they were recorded or completed"""
+        from django.apps import apps
+        from django.utils import timezone
+        from settlements.signals import backfill_ledger_after_migrate
+        recorded = timezone.now() - timedelta(days=40)
+        completed = timezone.now() - timedelta(days=20)
+        expense = Expense.objects.create(
+            group=self.group, payer=self.alice, amount=Decimal('20.00'), description='Old dinner', created_at=recorded
+        )
+        ExpenseParticipant.objects.create(expense=expense, user=self.bob, amount=Decimal('20.00'))
+        Settlement.objects.create(
+            group=self.group, payer=self.bob, payee=self.alice, amount=Decimal('5.00'),
+            is_completed=True, completed_at=completed
+        )
+        config = apps.get_app_config('settlements')
+        backfill_ledger_after_migrate(sender=config, app_config=config)
+        self.assertEqual(
+            set(LedgerEntry.objects.values_list('source_type', 'created_at')),
+            {('expense', recorded), ('settlement', completed)}
+        )
+        self.assertEqual(group_net_balances(self.group.group_id), {self.alice.user_id: 1500, self.bob.user_id: -1500})
+        self.assertEqual(group_net_balances(self.group.group_id, at=recorded - timedelta(days=1)), {})
+
+
+    def test_admin_cannot_change_ledger_fields(self):
+        """TC37.7: The admin leaves money fields alone and reverses deletes"""
+        from expenses.models import FxRate
+        from expenses.fx import invalidate_rates
+        admin = User.objects.create_superuser(email='ledgeradmin@example.com', password='Pass123', name='Admin')
+        self.client.force_login(admin)
+        expense = self.add_expense('30.00', self.alice, [(self.bob, '30.00')])
+        participant = expense.participants.get()
+        url = f'/admin/expenses/expense/{expense.expense_id}/change/'
+        data = {
+            'description': 'Renamed', 'amount': '99.00', 'currency': expense.currency,
+            'participants-TOTAL_FORMS': '1', 'participants-INITIAL_FORMS': '1',
+            'participants-MIN_NUM_FORMS': '0', 'participants-MAX_NUM_FORMS': '1000',
+            'participants-0-participant_id': participant.participant_id,
+            'participants-0-expense': expense.expense_id,
+            'participants-0-amount': '99.00',
+        }
+        self.assertEqual(self.client.post(url, data).status_code, 302)
+        expense.refresh_from_db()
+        self.assertEqual((expense.description, expense.amount), ('Renamed', Decimal('30.00')))
+        self.assertEqual(expense.participants.get().amount, Decimal('30.00'))
+
+        # Money fields are read-only, so an edit never reconverts and needs no rate
+        other = self.add_expense('10.00', self.alice, [(self.bob, '10.00')])
+        FxRate.objects.create(currency='EUR', date=other.date, rate=Decimal('1.10'))
+        invalidate_rates()
+        Expense.objects.filter(pk=other.pk).update(currency='EUR')
+        FxRate.objects.all().delete()
+        response = self.client.post(f'/admin/expenses/expense/{other.expense_id}/change/', {
+            **data, 'participants-TOTAL_FORMS': '0', 'participants-INITIAL_FORMS': '0'
+        })
+        self.assertEqual(response.status_code, 302)
+        other.refresh_from_db()
+        self.assertEqual((other.description, other.group_amount), ('Renamed', Decimal('10.00')))
+
+        response = self.client.post(f'/admin/expenses/expense/{expense.expense_id}/delete/', {'post': 'yes'})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Expense.objects.filter(pk=expense.pk).exists())
+        self.assertFalse(any(source_position('expense', expense.expense_id).values()))
+
+class TestBalanceHistory(TestCase):
+    """TC38: Point-in-time Balance Snapshots"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(email='histalice@example.com', password='Pass123', name='Alice')
+        self.bob = User.objects.create_user(email='histbob@example.com', password='Pass123', name='Bob')
+        self.group = Group.objects.create(name='History Group', owner=self.alice)
+        for user in (self.alice, self.bob):
+            GroupMember.objects.create(group=self.group, user=user)
+
+    def add_expense(self, amount, day):
+        from settlements.history import period_bounds
+        expense = Expense.objects.create(
+            group=self.group, payer=self.alice, amount=Decimal(amount), description='History expense'
+        )
+        ExpenseParticipant.objects.create(expense=expense, user=self.bob, amount=Decimal(amount))
+        post_expense(expense)
+        # Backdate the journal to noon on `day`
+        noon = period_bounds(day)[0] + timedelta(hours=12)
+        LedgerEntry.objects.filter(source_id=expense.expense_id).update(created_at=noon)
+
+    def test_close_period_is_idempotent(self):
+        """TC38.1: Closing a day snapshots moved groups once"""
+        from settlements.history import close_period
+        self.add_expense('10.00', date(2025, 3, 1))
+        self.assertEqual(len(close_period(date(2025, 3, 1))), 1)
+        self.assertEqual(close_period(date(2025, 3, 1)), [])
+        self.assertEqual(close_period(date(2025, 3, 2)), [])
+
+    def test_balances_on_day(self):
+        """TC38.2: Balances on a date ignore later entries"""
+        from settlements.history import balances_on, close_period
+        self.add_expense('10.00', date(2025, 3, 1))
+        self.add_expense('5.00', date(2025, 3, 3))
+        close_period(date(2025, 3, 1))
+        self.assertEqual(balances_on(self.group.group_id, date(2025, 3, 2)), {self.alice.user_id: 1000, self.bob.user_id: -1000})
+        self.assertEqual(balances_on(self.group.group_id, date(2025, 3, 3))[self.bob.user_id], -1500)
+        self.assertEqual(balances_on(self.group.group_id, date(2025, 2, 28)), {})
+
+    def test_history_reads_snapshots(self):
+        """TC38.3: Only days without a closing snapshot query the ledger"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from settlements.history import balance_history, close_period
+        days = [date(2025, 3, 1), date(2025, 3, 2), date(2025, 3, 3)]
+        self.add_expense('10.00', days[0])
+        self.add_expense('5.00', days[2])
+        for day in days:
+            close_period(day)
+        with CaptureQueriesContext(connection) as ctx:
+            history = balance_history(self.group.group_id, days)
+        self.assertEqual([balances.get(self.bob.user_id) for _, balances in history], [-1000, -1000, -1500])
+        # Day two had no movement, so it is the only point folding a (empty) tail
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "ledger_entries"' in q['sql']]), 1)
+
+    def test_history_after_backfill(self):
+        """TC38.6: Backfilled journals dated out of id order still fold into later closes"""
+        from settlements.history import balances_on, close_period, period_bounds
+        from settlements.ledger import backfill_ledger
+        days = [date(2025, 3, 1), date(2025, 3, 2), date(2025, 3, 3)]
+        close_period(days[2])
+        for amount, day in (('10.00', days[0]), ('30.00', days[2])):
+            expense = Expense.objects.create(
+                group=self.group, payer=self.alice, amount=Decimal(amount), description='Old expense',
+                created_at=period_bounds(day)[0] + timedelta(hours=12)
+            )
+            ExpenseParticipant.objects.create(expense=expense, user=self.bob, amount=Decimal(amount))
+        Settlement.objects.create(
+            group=self.group, payer=self.bob, payee=self.alice, amount=Decimal('5.00'),
+            is_completed=True, completed_at=period_bounds(days[1])[0] + timedelta(hours=12)
+        )
+        self.add_expense('1.00', days[0])
+        close_period(days[0])
+        backfill_ledger()
+        # The earlier close no longer covers the backfilled entries, so it is dropped
+        self.assertFalse(LedgerSnapshot.objects.filter(group=self.group).exists())
+        for day in days:
+            close_period(day)
+        self.assertEqual(
+            [balances_on(self.group.group_id, day)[self.bob.user_id] for day in days],
+            [-1100, -600, -3600]
+        )
+        self.assertEqual(group_net_balances(self.group.group_id), {self.alice.user_id: 3600, self.bob.user_id: -3600})
+
+    def test_monthly_command(self):
+        """TC38.4: The command closes months"""
+        from io import StringIO
+        from django.core.management import call_command
+        self.add_expense('10.00', date(2025, 3, 10))
+        call_command('snapshot_balances', '--period', 'month', '--date', '2025-03-31', '--days', '2', stdout=StringIO())
+        snapshot = LedgerSnapshot.objects.get(group=self.group, period='month')
+        self.assertEqual(snapshot.as_of.date(), date(2025, 3, 31))
+        self.assertEqual(snapshot.balances[str(self.bob.user_id)], -1000)
+
+    def test_history_endpoint(self):
+        """TC38.5: Members can fetch a JSON balance series"""
+        self.add_expense('10.00', date.today())
+        self.client.force_login(self.bob)
+        response = self.client.get(f'/settlements/balance/{self.group.group_id}/history/?days=3')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['dates']), 3)
+        self.assertEqual(data['members'][str(self.bob.user_id)][-1], -10.0)
+        self.assertEqual(data['names'][str(self.bob.user_id)], 'Bob')
+        # Members sharing a name keep separate series
+        User.objects.filter(pk=self.alice.pk).update(name='Bob')
+        data = self.client.get(f'/settlements/balance/{self.group.group_id}/history/?days=3').json()
+        self.assertEqual(len(data['members']), 2)
+        self.assertEqual(set(data['names'].values()), {'Bob'})
+
+
+class TestDebtGraph(TestCase):
+    """TC44: Pairwise Debt Graph"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.ann = User.objects.create_user(email='graphann@example.com', password='Pass123', name='Ann')
+        self.ben = User.objects.create_user(email='graphben@example.com', password='Pass123', name='Ben')
+        self.cat = User.objects.create_user(email='graphcat@example.com', password='Pass123', name='Cat')
+        self.group = Group.objects.create(name='Graph Group', owner=self.ann, simplify_debts='none')
+        for user in (self.ann, self.ben, self.cat):
+            GroupMember.objects.create(group=self.group, user=user)
+
+    def lend(self, payer, borrower, amount):
+        expense = Expense.objects.create(group=self.group, payer=payer, amount=Decimal(amount), description='Loan')
+        ExpenseParticipant.objects.create(expense=expense, user=borrower, amount=Decimal(amount))
+        post_expense(expense)
+
+    def pairs(self):
+        return {(b.user1_id, b.user2_id): b.amount for b in Balance.objects.filter(group=self.group)}
+
+    def test_cycles_cancel_and_full_netting(self):
+        """TC44.1: Cycle cancellation keeps real pairs; full netting pays largest to largest"""
+        from settlements.debts import DebtGraph
+        a, b, c = 1, 2, 3
+        graph = DebtGraph()
+        graph.add(a, b, 1000)
+        graph.add(b, c, 1000)
+        graph.add(c, a, 500)
+        graph.add(b, a, 200)  # Nets against a -> b
+        self.assertEqual(graph.edges(), [(a, b, 800), (b, c, 1000), (c, a, 500)])
+        cycles = graph.simplified('cycles')
+        self.assertEqual(cycles.edges(), [(a, b, 300), (b, c, 500)])
+        self.assertEqual(cycles.nets(), graph.nets())
+        self.assertEqual(graph.simplified('full').edges(), [(a, c, 300), (b, c, 200)])
+        self.assertEqual(len(graph.edges()), 3)  # Simplifying works on a copy
+
+    def test_balances_follow_group_setting(self):
+        """TC44.2: A debt cycle stays pairwise when unsimplified and vanishes otherwise"""
+        from settlements.algorithms import calculate_group_balances
+        self.lend(self.ann, self.ben, '10.00')
+        self.lend(self.ben, self.cat, '10.00')
+        self.lend(self.cat, self.ann, '4.00')
+        calculate_group_balances(self.group)
+        self.assertEqual(self.pairs(), {
+            (self.ben.user_id, self.ann.user_id): Decimal('10.00'),
+            (self.cat.user_id, self.ben.user_id): Decimal('10.00'),
+            (self.ann.user_id, self.cat.user_id): Decimal('4.00'),
+        })
+        self.group.simplify_debts = 'cycles'
+        calculate_group_balances(self.group)
+        self.assertEqual(self.pairs(), {
+            (self.ben.user_id, self.ann.user_id): Decimal('6.00'),
+            (self.cat.user_id, self.ben.user_id): Decimal('6.00'),
+        })
+        self.group.simplify_debts = 'full'
+        calculate_group_balances(self.group)
+        self.assertEqual(self.pairs(), {(self.cat.user_id, self.ann.user_id): Decimal('6.00')})
+
+    def test_graph_is_updated_incrementally(self):
+        """TC44.3: Later calls apply only new entries and repair a stale cache"""
+        from django.core.cache import cache
+        from settlements.debts import DebtGraph, group_debt_graph
+        self.lend(self.ann, self.ben, '10.00')
+        group_debt_graph(self.group.group_id)
+        self.lend(self.ben, self.ann, '3.00')
+        graph = group_debt_graph(self.group.group_id)
+        self.assertEqual(graph.edges(), [(self.ben.user_id, self.ann.user_id, 700)])
+        cached, cursor = cache.get(f'debt_graph:{self.group.group_id}')
+        self.assertEqual(cursor, LedgerEntry.objects.order_by('-entry_id').first().entry_id)
+        cache.set(f'debt_graph:{self.group.group_id}', (DebtGraph(), cursor))
+        self.assertEqual(group_debt_graph(self.group.group_id).edges(), graph.edges())
+
+
+class TestAsyncBalanceHistory(TestCase):
+    """TC46: Async Chat and Balance JSON Endpoints"""
+
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.owner = User.objects.create_user(email='asyncowner@example.com', password='Pass123', name='Async Owner')
+        self.outsider = User.objects.create_user(email='asyncout@example.com', password='Pass123', name='Async Outsider')
+        self.group = Group.objects.create(name='Async Group', owner=self.owner)
+        GroupMember.objects.create(group=self.group, user=self.owner, is_admin=True)
+
+    async def test_balance_history_json(self):
+        """TC46.3: Balance history is served by the async view"""
+        await self.async_client.aforce_login(self.owner)
+        response = await self.async_client.get(f'/settlements/balance/{self.group.group_id}/history/', {'days': 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['dates']), 3)
+
+    async def test_balance_history_checks_membership(self):
+        """TC46.4: Non-members are turned away from the async balance history"""
+        await self.async_client.aforce_login(self.outsider)
+        response = await self.async_client.get(f'/settlements/balance/{self.group.group_id}/history/')
+        self.assertEqual(response.status_code, 403)
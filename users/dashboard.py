@@ -0,0 +1,144 @@
+"""
+Dashboard analytics and their per-user cache.
+
+The dashboard context is cached per user together with a fingerprint of
+the current month and the ledger version and last edit of every group the
+user belongs to. Expense, settlement and membership writes bump their
+group's ledger_version and renames touch updated_at, so the next
+dashboard hit sees a different fingerprint and rebuilds. While
+one request rebuilds, concurrent requests are served the stale copy.
+"""
+import json
+from collections import defaultdict
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils.timezone import now
+from groups.models import GroupMember
+from expenses.models import SpendingRollup
+from expenses.money import Money
+
+DASHBOARD_CACHE_TIMEOUT = 60 * 60 * 24
+DASHBOARD_REBUILD_LOCK_TIMEOUT = 30
+
+
+def _month_starts(today, count):
+    """First day of the current month and the `count - 1` months before it, oldest first"""
+    starts = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        starts.append(today.replace(year=year, month=month, day=1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(starts))
+
+
+def _cache_key(user):
+    return f'dashboard:{user.pk}'
+
+
+def _lock_key(user):
+    return f'dashboard_rebuild:{user.pk}'
+
+
+def ledger_fingerprint(user):
+    """
+    The current month (the charts are labelled by month) and
+    (group_id, ledger_version, updated_at) for each of the user's groups,
+    in one query
+    """
+    return (now().date().replace(day=1), tuple(
+        GroupMember.objects.filter(user=user)
+        .order_by('group_id')
+        .values_list('group_id', 'group__ledger_version', 'group__updated_at')
+    ))
+
+
+def build_dashboard_context(user):
+    # Memberships with their groups; member counts are stored on the group (query 1)
+    memberships = list(user.group_memberships.select_related('group'))
+    groups = memberships[:5]
+    group_ids = [membership.group_id for membership in memberships]
+    rollups = SpendingRollup.objects.filter(group_id__in=group_ids)
+    
+    # 1. SPENDING TRENDS (Line Chart) - Last 6 calendar months (query 2)
+    month_starts = _month_starts(now().date(), 6)
+    monthly_totals = {
+        row['month']: row['total']
+        for row in rollups.filter(month__gte=month_starts[0])
+        .values('month')
+        .annotate(total=Sum('total_cents'))
+        .order_by()
+    }
+    months = [month_start.strftime('%b %Y') for month_start in month_starts]
+    spending = [monthly_totals.get(month_start, 0) / 100 for month_start in month_starts]
+    
+    # 2. CATEGORY BREAKDOWN, TOP SPENDERS AND TOTAL from one grouped query (query 3)
+    category_totals = defaultdict(int)
+    # Spenders are keyed by id so members sharing a name keep separate bars
+    spender_totals = defaultdict(int)
+    spender_labels = {}
+    total_cents = 0
+    for row in rollups.values('category__name', 'payer_id', 'payer__name').annotate(total=Sum('total_cents')).order_by():
+        category_totals[row['category__name'] or 'Uncategorized'] += row['total']
+        spender_totals[row['payer_id']] += row['total']
+        spender_labels[row['payer_id']] = row['payer__name']
+        total_cents += row['total']
+    
+    # Pie Chart
+    category_data = sorted(category_totals.items(), key=lambda item: item[1], reverse=True)[:10]
+    categories = [name for name, _ in category_data]
+    category_amounts = [total / 100 for _, total in category_data]
+    
+    # Bar Chart
+    top_spenders = sorted(spender_totals.items(), key=lambda item: item[1], reverse=True)[:5]
+    spender_names = [spender_labels[payer_id] for payer_id, _ in top_spenders]
+    spender_amounts = [total / 100 for _, total in top_spenders]
+    
+    # 3. SUMMARY STATISTICS
+    total_groups = len(group_ids)
+    total_members = sum(membership.group.member_count for membership in groups)
+    
+    return {
+        'groups': groups,
+        # Pie Chart Data
+        'categories': json.dumps(categories),
+        'category_amounts': json.dumps(category_amounts),
+        # Line Chart Data
+        'months': json.dumps(months),
+        'spending': json.dumps(spending),
+        # Bar Chart Data
+        'spender_names': json.dumps(spender_names),
+        'spender_amounts': json.dumps(spender_amounts),
+        # Summary Stats
+        'total_expenses': Money(total_cents),
+        'total_groups': total_groups,
+        'total_members': total_members,
+    }
+
+
+def get_dashboard_context(user):
+    """
+    Return the user's dashboard context, rebuilding it only when the
+    ledger fingerprint has changed. If another request is already
+    rebuilding, the stale context is returned instead of waiting.
+    """
+    fingerprint = ledger_fingerprint(user)
+    cached = cache.get(_cache_key(user))
+    if cached and cached['fingerprint'] == fingerprint:
+        return dict(cached['context'])
+
+    if cached and not cache.add(_lock_key(user), True, DASHBOARD_REBUILD_LOCK_TIMEOUT):
+        return dict(cached['context'])
+
+    try:
+        context = build_dashboard_context(user)
+        cache.set(
+            _cache_key(user),
+            {'fingerprint': fingerprint, 'context': context},
+            DASHBOARD_CACHE_TIMEOUT
+        )
+    finally:
+        if cached:
+            cache.delete(_lock_key(user))
+    return dict(context)
@@ -2,9 +2,8 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, logout as auth_logout, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, Count
+from django.db.models import Sum
 from django.utils.timezone import now
-from datetime import timedelta
 from .forms import UserRegistrationForm, UserLoginForm, UserProfileForm, PasswordChangeForm
 from .models import User, UserPreference
 from groups.models import Group
@@ -17,7 +16,7 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
 from django.template.loader import render_to_string
 from chat.models import UserActivity
-import json
+from .dashboard import get_dashboard_context
 
 
 def register_view(request):
@@ -230,75 +229,8 @@ def delete_account_view(request):
 
 @login_required
 def dashboard_view(request):
-    user = request.user
-    groups = user.group_memberships.all().select_related('group')[:5]
-
-    # Get all group IDs for the user
-    group_ids = [membership.group.group_id for membership in user.group_memberships.all()]
-    
-    # 1. EXPENSE BREAKDOWN BY CATEGORY (Pie Chart)
-    category_data = Expense.objects.filter(group__group_id__in=group_ids) \
-                    .values('category__name') \
-                    .annotate(total=Sum('amount')) \
-                    .order_by('-total')[:10]
-    
-    categories = [item['category__name'] or 'Uncategorized' for item in category_data]
-    category_amounts = [float(item['total']) for item in category_data]
-    
-    # 2. SPENDING TRENDS (Line Chart) - Last 6 months
-    today = now().date()
-    months = []
-    spending = []
-    
-    for i in range(5, -1, -1):
-        # Calculate month start and end
-        if i == 0:
-            month_start = today.replace(day=1)
-        else:
-            month_start = (today.replace(day=1) - timedelta(days=30*i)).replace(day=1)
-        
-        month_end = (month_start.replace(day=1) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        month_label = month_start.strftime('%b %Y')
-        
-        total_spent = Expense.objects.filter(
-            group__group_id__in=group_ids,
-            date__range=[month_start, month_end]
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        months.append(month_label)
-        spending.append(float(total_spent))
-    
-    # 3. TOP SPENDERS (Bar Chart)
-    top_spenders = Expense.objects.filter(group__group_id__in=group_ids) \
-                    .values('payer__name') \
-                    .annotate(total=Sum('amount')) \
-                    .order_by('-total')[:5]
-    
-    spender_names = [item['payer__name'] for item in top_spenders]
-    spender_amounts = [float(item['total']) for item in top_spenders]
-    
-    # 4. SUMMARY STATISTICS
-    total_expenses = Expense.objects.filter(group__group_id__in=group_ids).aggregate(Sum('amount'))['amount__sum'] or 0
-    total_groups = len(group_ids)
-    total_members = sum([g.group.get_total_members() for g in groups])
-    
-    context = {
-        'user': user,
-        'groups': groups,
-        # Pie Chart Data
-        'categories': json.dumps(categories),
-        'category_amounts': json.dumps(category_amounts),
-        # Line Chart Data
-        'months': json.dumps(months),
-        'spending': json.dumps(spending),
-        # Bar Chart Data
-        'spender_names': json.dumps(spender_names),
-        'spender_amounts': json.dumps(spender_amounts),
-        # Summary Stats
-        'total_expenses': total_expenses,
-        'total_groups': total_groups,
-        'total_members': total_members,
-    }
+    context = get_dashboard_context(request.user)
+    context['user'] = request.user
     return render(request, 'dashboard.html', context)
 
 @login_required